@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+""" Vectorized backtests of signal-driven strategies over candles.
+
+A strategy is any function that turns a CandleFrame into a signal array:
+the position (e.g. 1 long, 0 flat, -1 short, or any fraction) wanted from
+the close of each candle on. `backtest` fills that position at the next
+candle's open or at the same candle's close, charges a fee on every
+change of position and derives the equity curve, drawdown and per-trade
+statistics without a Python loop over candles.
+
+`sweep` runs one strategy over a grid of parameters on every core. The
+candles are placed in a SharedCandles segment once, so the worker
+processes read them without a copy, and only parameters and statistics
+cross process boundaries.
+"""
+import itertools
+import logging
+import math
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from api.coinbase.constants import CBConst
+from api.coinbase.exceptions import InvalidArgument
+from data.frame import CandleFrame
+from data.sharedmem import SharedCandles
+from . import indicators
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+# Coinbase Pro's base taker fee, used when a product carries no fee rate
+DEFAULT_FEE = 0.005
+FILLS = ('next_open', 'close')
+YEAR = 365 * 86400
+
+
+def fee_rate(product=None, fee=None) -> float:
+    """The fee as a fraction of traded value.
+
+    Keyword arguments:
+    product -- optional product or fee metadata carrying `taker_fee_rate`
+    fee -- optional explicit rate, which takes precedence
+    """
+    if fee is not None:
+        return float(fee)
+    if product and product.get(CBConst.taker_fee_rate) is not None:
+        return float(product[CBConst.taker_fee_rate])
+    return DEFAULT_FEE
+
+
+class BacktestResult:
+    """Per-candle arrays and summary statistics of one backtest.
+
+    Attributes:
+    time -- the candle times
+    position -- the position held during each candle
+    returns -- the strategy return of each candle, after fees
+    equity -- the equity curve, starting from `initial`
+    drawdown -- the fraction below the running equity peak (<= 0)
+    fees -- the fee paid in each candle, as a fraction of equity
+    trade_returns -- the compounded return of every trade
+    stats -- a dict of summary statistics
+    """
+    def __init__(self, time, position, returns, equity, drawdown, fees,
+                 trade_returns, stats):
+        self.time = time
+        self.position = position
+        self.returns = returns
+        self.equity = equity
+        self.drawdown = drawdown
+        self.fees = fees
+        self.trade_returns = trade_returns
+        self.stats = stats
+
+    def __str__(self):
+        return 'BacktestResult({})'.format(', '.join(
+            '{}={:.4g}'.format(k, v) for k, v in self.stats.items()))
+
+
+def backtest(candles, signal, fill='next_open', fee=None, product=None,
+             initial=1.0) -> BacktestResult:
+    """Backtests a signal against candles.
+
+    Keyword arguments:
+    candles -- a CandleFrame, candle dicts or raw rows, oldest first
+    signal -- the wanted position after each candle's close; NaN is flat
+    fill -- 'next_open' trades at the following open, 'close' trades at
+            the signal candle's close
+    fee -- fee per unit of position change, see `fee_rate`
+    product -- optional product metadata for `fee_rate`
+    initial -- starting equity
+
+    Returns:
+    BacktestResult
+    """
+    if fill not in FILLS:
+        raise InvalidArgument('fill must be one of {}'.format(FILLS))
+    frame = CandleFrame.coerce(candles)
+    signal = np.nan_to_num(np.asarray(signal, dtype=np.float64))
+    if len(signal) != len(frame):
+        raise InvalidArgument('{} signals for {} candles'.format(
+            len(signal), len(frame)))
+    rate = fee_rate(product, fee)
+    close, _open = frame.close, frame.open
+    n = len(frame)
+
+    # The position held during candle t was decided at the close of t - 1
+    position = np.r_[0.0, signal[:-1]] if n else signal.copy()
+    previous = np.r_[0.0, position[:-1]] if n else position.copy()
+    last_close = np.r_[close[:1], close[:-1]]
+    # Growth of each candle earned by the position held before it (exit)
+    # and by the position held during it (entry)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if fill == 'close':
+            exiting = np.ones(n)
+            entering = 1.0 + position * np.nan_to_num(close / last_close - 1.0)
+        else:
+            # The gap to the open is still held with the old position
+            exiting = 1.0 + previous * np.nan_to_num(_open / last_close - 1.0)
+            entering = 1.0 + position * np.nan_to_num(close / _open - 1.0)
+    fees = rate * np.abs(position - previous)
+    # A fee is paid by the trade being opened, or closed when going flat
+    closing = position == 0
+    exiting[closing] *= 1.0 - fees[closing]
+    entering[~closing] *= 1.0 - fees[~closing]
+    returns = exiting * entering - 1.0
+
+    equity = initial * np.cumprod(1.0 + returns)
+    peak = np.maximum.accumulate(np.r_[initial, equity])[1:]
+    drawdown = equity / peak - 1.0
+    trade_returns = _trade_returns(position, exiting, entering)
+    stats = _stats(frame.time, position, returns, equity, drawdown, fees,
+                   trade_returns, initial)
+    return BacktestResult(frame.time, position, returns, equity, drawdown,
+                          fees, trade_returns, stats)
+
+
+def _trade_returns(position, exiting, entering):
+    """Compounded returns of every run of a constant, non-zero position,
+    including the exit growth of the candle that ends the run
+    """
+    if not len(position):
+        return np.empty(0)
+    starts = np.flatnonzero(np.r_[True, position[1:] != position[:-1]])
+    held = position[starts] != 0
+    with np.errstate(divide='ignore'):
+        growth = np.add.reduceat(np.log(entering), starts)
+        growth[:-1] += np.log(exiting[starts[1:]])
+    return np.expm1(growth[held])
+
+
+def _stats(time, position, returns, equity, drawdown, fees, trade_returns,
+           initial):
+    n = len(returns)
+    step = float(np.median(np.diff(time))) if n > 1 else 0.0
+    periods = YEAR / step if step else 0.0
+    std = returns.std()
+    years = n * step / YEAR
+    final = equity[-1] if n else initial
+    return {
+        'total_return': float(final / initial - 1.0),
+        'annual_return': _annualize(final / initial, years),
+        'sharpe': float(returns.mean() / std * math.sqrt(periods))
+        if std and periods else 0.0,
+        'max_drawdown': float(drawdown.min()) if n else 0.0,
+        'exposure': float(np.mean(position != 0)) if n else 0.0,
+        'fees': float(fees.sum()),
+        'trades': len(trade_returns),
+        'win_rate': float(np.mean(trade_returns > 0))
+        if len(trade_returns) else 0.0,
+        'average_trade': float(trade_returns.mean())
+        if len(trade_returns) else 0.0,
+    }
+
+
+def _annualize(growth, years):
+    if not years or growth <= 0:
+        return 0.0
+    with np.errstate(over='ignore'):
+        return float(np.expm1(np.log(growth) / years))
+
+
+def sma_crossover(frame, fast=10, slow=30):
+    """Long while the fast SMA is above the slow SMA, flat otherwise"""
+    return (indicators.sma(frame.close, fast) >
+            indicators.sma(frame.close, slow)).astype(np.float64)
+
+
+def rsi_reversion(frame, n=14, low=30, high=70):
+    """Long once RSI drops below `low` until it rises above `high`"""
+    rsi = indicators.rsi(frame.close, n)
+    signal = np.full(len(rsi), np.nan)
+    signal[rsi < low] = 1.0
+    signal[rsi > high] = 0.0
+    # Carry the last entry or exit forward
+    index = np.where(np.isnan(signal), 0, np.arange(len(signal)))
+    np.maximum.accumulate(index, out=index)
+    return np.nan_to_num(signal[index])
+
+
+def grid(**parameters) -> list:
+    """Expands lists of values into every combination of parameters"""
+    names = list(parameters)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(parameters[n] for n in names))
+    ]
+
+
+# Candles of the current sweep, attached once per worker process
+_worker = {}
+
+
+def _attach(name, key):
+    shared = SharedCandles.attach(name)
+    _worker['shared'] = shared
+    _worker['frame'] = shared.frame(*key)
+
+
+def _evaluate(job):
+    strategy, params, fill, fee = job
+    frame = _worker['frame']
+    result = backtest(frame, strategy(frame, **params), fill, fee)
+    return params, result.stats
+
+
+def sweep(candles, strategy, parameters, fill='next_open', fee=None,
+          workers=None, sort_by='sharpe') -> list:
+    """Backtests `strategy` for every parameter set, in parallel.
+
+    Keyword arguments:
+    candles -- a CandleFrame, candle dicts or raw rows, oldest first
+    strategy -- a module level function (frame, **params) -> signal
+    parameters -- a list of parameter dicts, e.g. from `grid`
+    fill -- see `backtest`
+    fee -- see `fee_rate`
+    workers -- processes to use, defaults to every core; 1 runs inline
+    sort_by -- the statistic to sort the results by, best first
+
+    Returns:
+    [(params, stats), ...]
+    """
+    frame = CandleFrame.coerce(candles)
+    jobs = [(strategy, params, fill, fee) for params in parameters]
+    if workers == 1:
+        results = [(p, backtest(frame, strategy(frame, **p), fill, f).stats)
+                   for _, p, _, f in jobs]
+    else:
+        key = ('sweep', 0)
+        cpus = os.cpu_count() or 1
+        with SharedCandles.create({key: frame}) as shared:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_attach,
+                                     initargs=(shared.name, key)) as pool:
+                chunksize = max(1, len(jobs) // (4 * (workers or cpus)))
+                results = list(pool.map(_evaluate, jobs,
+                                        chunksize=chunksize))
+    event_log.debug('swept %i parameter sets', len(results))
+    return sorted(results, key=lambda item: item[1][sort_by], reverse=True)
@@ -0,0 +1,118 @@
+import unittest
+
+import numpy as np
+
+from analysis import backtest
+from analysis import benchmark
+from api.coinbase.constants import CBConst
+from api.coinbase.exceptions import InvalidArgument
+from data.frame import CandleFrame
+
+
+def random_frame(count, seed=0):
+    high, low, close, volume = benchmark.random_candles(count, seed)
+    _open = np.r_[close[0], close[:-1]] + np.random.default_rng(seed).normal(
+        0, 2, count)
+    high = np.maximum(high, _open)
+    low = np.minimum(low, _open)
+    time = np.arange(count, dtype=np.int64) * 3600
+    return CandleFrame.from_columns(time, low, high, _open, close, volume)
+
+
+def naive_equity(frame, signal, fill, fee):
+    """Steps through the candles, trading one signal at a time"""
+    _open, close = frame.open.tolist(), frame.close.tolist()
+    equity, held, wanted = 1.0, 0.0, 0.0
+    curve = []
+    for i in range(len(close)):
+        if i:
+            if fill == 'next_open':
+                equity *= 1 + held * (_open[i] / close[i - 1] - 1)
+                equity *= 1 - fee * abs(wanted - held)
+                held = wanted
+                equity *= 1 + held * (close[i] / _open[i] - 1)
+            else:
+                equity *= 1 - fee * abs(wanted - held)
+                held = wanted
+                equity *= 1 + held * (close[i] / close[i - 1] - 1)
+        wanted = signal[i]
+        curve.append(equity)
+    return curve
+
+
+class TestBacktest(unittest.TestCase):
+    def setUp(self):
+        self.frame = random_frame(2000)
+        rng = np.random.default_rng(1)
+        self.signal = rng.choice([-1.0, 0.0, 0.5, 1.0], len(self.frame))
+
+    def test_matches_event_loop(self):
+        for fill in backtest.FILLS:
+            result = backtest.backtest(self.frame, self.signal, fill, 0.002)
+            np.testing.assert_allclose(
+                result.equity,
+                naive_equity(self.frame, self.signal, fill, 0.002),
+                rtol=1e-9)
+            self.assertAlmostEqual(result.stats['total_return'],
+                                   result.equity[-1] - 1.0)
+
+    def test_drawdown(self):
+        result = backtest.backtest(self.frame, self.signal, fee=0)
+        peak = np.maximum.accumulate(np.r_[1.0, result.equity])[1:]
+        np.testing.assert_allclose(result.drawdown,
+                                   result.equity / peak - 1.0)
+        self.assertEqual(result.stats['max_drawdown'], result.drawdown.min())
+        self.assertLessEqual(result.drawdown.max(), 0.0)
+
+    def test_trades(self):
+        close = np.array([10.0, 10, 11, 12, 12, 11, 10, 10])
+        frame = CandleFrame.from_columns(np.arange(8) * 60, close, close,
+                                         close, close, np.ones(8))
+        signal = [0, 1, 1, 0, 0, 1, 0, 0]
+        result = backtest.backtest(frame, signal, 'close', fee=0.01)
+        self.assertEqual(result.stats['trades'], 2)
+        np.testing.assert_allclose(
+            result.trade_returns,
+            [1.2 * 0.99 * 0.99 - 1, 10 / 11 * 0.99 * 0.99 - 1])
+        self.assertEqual(result.stats['win_rate'], 0.5)
+        self.assertAlmostEqual(result.stats['fees'], 0.04)
+        self.assertAlmostEqual(
+            np.prod(1 + result.trade_returns) - 1,
+            result.stats['total_return'])
+
+    def test_fee_rate(self):
+        self.assertEqual(backtest.fee_rate(), backtest.DEFAULT_FEE)
+        self.assertEqual(
+            backtest.fee_rate({CBConst.taker_fee_rate: '0.0025'}), 0.0025)
+        self.assertEqual(
+            backtest.fee_rate({CBConst.taker_fee_rate: '0.0025'}, 0), 0.0)
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidArgument):
+            backtest.backtest(self.frame, self.signal[1:])
+        with self.assertRaises(InvalidArgument):
+            backtest.backtest(self.frame, self.signal, fill='vwap')
+
+    def test_sweep(self):
+        parameters = backtest.grid(fast=[5, 10, 20], slow=[30, 50])
+        self.assertEqual(len(parameters), 6)
+        serial = backtest.sweep(self.frame, backtest.sma_crossover,
+                                parameters, workers=1)
+        parallel = backtest.sweep(self.frame, backtest.sma_crossover,
+                                  parameters, workers=2)
+        self.assertEqual(serial, parallel)
+        sharpes = [stats['sharpe'] for _, stats in serial]
+        self.assertEqual(sharpes, sorted(sharpes, reverse=True))
+        params, stats = serial[0]
+        expected = backtest.backtest(
+            self.frame, backtest.sma_crossover(self.frame, **params))
+        self.assertEqual(stats, expected.stats)
+
+    def test_rsi_reversion(self):
+        signal = backtest.rsi_reversion(self.frame, 14, 30, 70)
+        self.assertTrue(set(np.unique(signal)) <= {0.0, 1.0})
+        self.assertFalse(signal[:14].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+""" Per-candle reference loops for the indicators, and a benchmark.
+
+The loops below are the straightforward implementations people write
+over `MarketData.candles` dicts. The tests check `analysis.indicators`
+against them, and `python -m analysis.benchmark [candles]` times both.
+"""
+import math
+import time
+
+import numpy as np
+
+from . import indicators
+
+
+def naive_sma(x, n):
+    out = []
+    for i in range(len(x)):
+        out.append(sum(x[i - n + 1:i + 1]) / n if i >= n - 1 else math.nan)
+    return out
+
+
+def naive_ema(x, n):
+    alpha = 2.0 / (n + 1)
+    out = []
+    for i, value in enumerate(x):
+        out.append(value if i == 0 else alpha * value +
+                   (1 - alpha) * out[-1])
+    return out
+
+
+def naive_wma(x, n):
+    total = n * (n + 1) / 2.0
+    out = []
+    for i in range(len(x)):
+        if i < n - 1:
+            out.append(math.nan)
+            continue
+        out.append(
+            sum((j + 1) * x[i - n + 1 + j] for j in range(n)) / total)
+    return out
+
+
+def naive_rsi(close, n=14):
+    out = [math.nan] * len(close)
+    gain = loss = 0.0
+    for i in range(1, len(close)):
+        change = close[i] - close[i - 1]
+        up, down = max(change, 0.0), max(-change, 0.0)
+        if i <= n:
+            gain += up / n
+            loss += down / n
+            if i < n:
+                continue
+        else:
+            gain = (gain * (n - 1) + up) / n
+            loss = (loss * (n - 1) + down) / n
+        if loss == 0:
+            out[i] = 50.0 if gain == 0 else 100.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + gain / loss)
+    return out
+
+
+def naive_bollinger(close, n=20, k=2.0):
+    lower, middle, upper = [], [], []
+    for i in range(len(close)):
+        if i < n - 1:
+            for band in (lower, middle, upper):
+                band.append(math.nan)
+            continue
+        window = close[i - n + 1:i + 1]
+        mean = sum(window) / n
+        std = math.sqrt(sum((v - mean)**2 for v in window) / n)
+        lower.append(mean - k * std)
+        middle.append(mean)
+        upper.append(mean + k * std)
+    return lower, middle, upper
+
+
+def naive_atr(high, low, close, n=14):
+    out = [math.nan] * len(close)
+    average = 0.0
+    for i in range(len(close)):
+        previous = close[i - 1] if i else close[0]
+        tr = max(high[i], previous) - min(low[i], previous)
+        if i < n:
+            average += tr / n
+            if i == n - 1:
+                out[i] = average
+        else:
+            average = (average * (n - 1) + tr) / n
+            out[i] = average
+    return out
+
+
+def naive_vwap(high, low, close, volume):
+    out = []
+    value = shares = 0.0
+    for h, l, c, v in zip(high, low, close, volume):
+        if math.isnan((h + l + c) * v):
+            out.append(value / shares if shares else math.nan)
+            continue
+        value += (h + l + c) / 3.0 * v
+        shares += v
+        out.append(value / shares if shares else math.nan)
+    return out
+
+
+def naive_obv(close, volume):
+    out = [0.0]
+    for i in range(1, len(close)):
+        if close[i] > close[i - 1]:
+            out.append(out[-1] + volume[i])
+        elif close[i] < close[i - 1]:
+            out.append(out[-1] - volume[i])
+        else:
+            out.append(out[-1])
+    return out
+
+
+def naive_stochastic(high, low, close, k=14):
+    out = []
+    for i in range(len(close)):
+        if i < k - 1:
+            out.append(math.nan)
+            continue
+        highest = max(high[i - k + 1:i + 1])
+        lowest = min(low[i - k + 1:i + 1])
+        if highest == lowest:
+            out.append(50.0)
+            continue
+        out.append(100.0 * (close[i] - lowest) / (highest - lowest))
+    return out
+
+
+def random_candles(count, seed=0):
+    """A random walk as (high, low, close, volume) arrays"""
+    rng = np.random.default_rng(seed)
+    close = 10000 + np.cumsum(rng.normal(0, 5, count))
+    high = close + rng.exponential(3, count)
+    low = close - rng.exponential(3, count)
+    volume = rng.exponential(2, count)
+    return high, low, close, volume
+
+
+def benchmark(count=200000) -> list:
+    """Times every indicator against its loop.
+
+    Returns:
+    [(name, vectorized seconds, loop seconds), ...]
+    """
+    high, low, close, volume = random_candles(count)
+    lists = [v.tolist() for v in (high, low, close, volume)]
+    h, l, c, v = lists
+    cases = [
+        ('sma(20)', lambda: indicators.sma(close, 20),
+         lambda: naive_sma(c, 20)),
+        ('ema(20)', lambda: indicators.ema(close, 20),
+         lambda: naive_ema(c, 20)),
+        ('wma(20)', lambda: indicators.wma(close, 20),
+         lambda: naive_wma(c, 20)),
+        ('rsi(14)', lambda: indicators.rsi(close), lambda: naive_rsi(c)),
+        ('bollinger(20)', lambda: indicators.bollinger(close),
+         lambda: naive_bollinger(c)),
+        ('atr(14)', lambda: indicators.atr(high, low, close),
+         lambda: naive_atr(h, l, c)),
+        ('vwap', lambda: indicators.vwap(high, low, close, volume),
+         lambda: naive_vwap(h, l, c, v)),
+        ('obv', lambda: indicators.obv(close, volume),
+         lambda: naive_obv(c, v)),
+        ('stochastic(14)', lambda: indicators.stochastic(high, low, close),
+         lambda: naive_stochastic(h, l, c)),
+    ]
+    results = []
+    for name, vectorized, loop in cases:
+        started = time.perf_counter()
+        vectorized()
+        middle = time.perf_counter()
+        loop()
+        results.append((name, middle - started,
+                        time.perf_counter() - middle))
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print('{} candles'.format(count))
+    print('{:>16} {:>12} {:>12} {:>9}'.format('indicator', 'vectorized',
+                                              'loop', 'speedup'))
+    for name, fast, slow in benchmark(count):
+        print('{:>16} {:>11.4f}s {:>11.4f}s {:>8.0f}x'.format(
+            name, fast, slow, slow / fast))
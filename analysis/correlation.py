@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+""" Correlation and covariance matrices of returns across many products.
+
+The closes of N products are aligned onto one time axis with
+`data.densify.align`, and each product's log return is counted only on
+buckets that held a real candle. A return after a gap spans the whole
+gap. Pairs are compared over the buckets where both products traded
+(pairwise-complete observations).
+
+Everything is built from four N x N sums over time: the pair count, the
+sum of x_i, the sum of x_i squared and the sum of x_i * x_j. They come
+from matrix products over blocks of time, so a full matrix is a few
+BLAS calls. A rolling window adds the bar that enters and subtracts the
+bar that leaves, which costs O(N^2) per bar rather than O(N^2 * T).
+"""
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from collections import deque
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from api.exchange.timeslice import TimeSlice
+from data.densify import align
+from data.resample import parse_granularity
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+# Buckets per matrix product, bounding the temporaries to N x BLOCK
+BLOCK = 4096
+
+
+def returns(aligned):
+    """Log returns of the aligned closes.
+
+    Keyword arguments:
+    aligned -- AlignedCandles, ideally aligned with fill='ffill'
+
+    Returns:
+    (returns, valid) float64 and bool arrays (products, buckets). Returns
+    are 0 wherever `valid` is False: in buckets without a candle and
+    before each product's first candle.
+    """
+    close = aligned.close
+    previous = np.empty_like(close)
+    previous[:, 0] = np.nan
+    previous[:, 1:] = close[:, :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.log(close / previous)
+    valid = aligned.mask & np.isfinite(values)
+    values[~valid] = 0.0
+    return values, valid
+
+
+class PairStats:
+    """Pairwise-complete sums of N return series, over any set of buckets.
+
+    Every x_i is taken relative to a fixed per-series offset, the mean of
+    the first buckets added. Covariance and correlation do not change
+    with the offset, but the one-pass sums below stay accurate when a
+    series' mean is large next to its spread.
+
+    Attributes:
+    count -- (N, N) buckets where both i and j are valid
+    sum -- (N, N) sum of x_i over those buckets
+    squares -- (N, N) sum of x_i ** 2 over those buckets
+    products -- (N, N) sum of x_i * x_j
+    offset -- (N,) subtracted from every x_i, set by the first add
+    """
+    def __init__(self, size):
+        self.count = np.zeros((size, size))
+        self.sum = np.zeros((size, size))
+        self.squares = np.zeros((size, size))
+        self.products = np.zeros((size, size))
+        self.offset = None
+
+    @classmethod
+    def from_returns(cls, values, valid):
+        stats = cls(len(values))
+        stats.add(values, valid)
+        return stats
+
+    def add(self, values, valid, sign=1.0):
+        """Adds (or with sign=-1 removes) buckets of returns.
+
+        Keyword arguments:
+        values -- (N, B) returns, 0 where not valid
+        valid -- (N, B) bool
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self.offset is None:
+            count = valid.sum(1)
+            total = np.where(valid, values, 0.0).sum(1)
+            self.offset = np.divide(total, count, out=np.zeros(len(values)),
+                                    where=count > 0)
+        for lo in range(0, values.shape[1], BLOCK):
+            w = valid[:, lo:lo + BLOCK].astype(np.float64)
+            x = (values[:, lo:lo + BLOCK] - self.offset[:, None]) * w
+            self.count += sign * (w @ w.T)
+            self.sum += sign * (x @ w.T)
+            self.squares += sign * ((x * x) @ w.T)
+            self.products += sign * (x @ x.T)
+
+    def add_bar(self, x, w, sign=1.0):
+        """Adds (or removes) one bucket with outer products, O(N^2)"""
+        if self.offset is None:
+            self.offset = np.where(w > 0, x, 0.0)
+        x = (x - self.offset) * w
+        self.count += sign * np.outer(w, w)
+        self.sum += sign * np.outer(x, w)
+        self.squares += sign * np.outer(x * x, w)
+        self.products += sign * np.outer(x, x)
+
+    def covariance(self, ddof=1, min_periods=2) -> np.ndarray:
+        """Covariance matrix, NaN for pairs with fewer than `min_periods`
+        shared buckets
+        """
+        n = self.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross = self.products - self.sum * self.sum.T / n
+            cov = cross / (n - ddof)
+        cov[n < max(min_periods, ddof + 1)] = np.nan
+        return cov
+
+    def correlation(self, min_periods=2) -> np.ndarray:
+        """Pearson correlation matrix, NaN for pairs with fewer than
+        `min_periods` shared buckets or without variance
+        """
+        n = self.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross = self.products - self.sum * self.sum.T / n
+            spread = np.maximum(self.squares - self.sum**2 / n, 0.0)
+            corr = cross / np.sqrt(spread * spread.T)
+        corr[(n < min_periods) | ~np.isfinite(corr)] = np.nan
+        np.clip(corr, -1.0, 1.0, out=corr)
+        return corr
+
+
+def covariance(aligned, ddof=1, min_periods=2) -> np.ndarray:
+    """Covariance matrix of the log returns, rows in `aligned.products`
+    order
+    """
+    return PairStats.from_returns(*returns(aligned)).covariance(
+        ddof, min_periods)
+
+
+def correlation(aligned, min_periods=2) -> np.ndarray:
+    """Correlation matrix of the log returns, rows in `aligned.products`
+    order
+    """
+    return PairStats.from_returns(*returns(aligned)).correlation(
+        min_periods)
+
+
+def rolling_correlation(aligned, window, step=1, min_periods=2,
+                        covariance=False):
+    """Correlation (or covariance) matrices over a sliding window.
+
+    The window moves `step` buckets at a time. Each move adds the entering
+    buckets and subtracts the leaving ones with one matrix product each.
+
+    Keyword arguments:
+    aligned -- AlignedCandles
+    window -- window length in buckets
+    step -- buckets between consecutive matrices
+    min_periods -- fewer shared buckets in a window give NaN
+    covariance -- return covariance instead of correlation matrices
+
+    Returns:
+    (time, matrices) with time the last bucket of each window and
+    matrices of shape (windows, N, N)
+    """
+    if window < 2 or step < 1:
+        raise InvalidArgument('window must be at least 2 and step 1')
+    values, valid = returns(aligned)
+    ends = np.arange(window, values.shape[1] + 1, step)
+    out = np.full((len(ends), len(values), len(values)), np.nan)
+    stats = PairStats(len(values))
+    added = 0
+    for k, end in enumerate(ends):
+        start = end - window
+        if start >= added:
+            stats = PairStats.from_returns(values[:, start:end],
+                                           valid[:, start:end])
+        else:
+            stats.add(values[:, added:end], valid[:, added:end])
+            removed = end - step - window
+            if removed < start:
+                lo = max(removed, 0)
+                stats.add(values[:, lo:start], valid[:, lo:start], -1.0)
+        added = end
+        out[k] = stats.covariance(min_periods=min_periods) if covariance \
+            else stats.correlation(min_periods)
+    return aligned.time[ends - 1], out
+
+
+class RollingCorrelation:
+    """Correlation and covariance of the last `window` bars, updated one
+    bar at a time in O(N^2).
+    """
+    def __init__(self, products, window, closes=None):
+        """Correlation and covariance of the last `window` bars
+
+        Keyword arguments:
+        products -- the product_ids, in matrix order
+        window -- bars in the window
+        closes -- optional latest close per product to compute the next
+                  returns from
+        """
+        if window < 2:
+            raise InvalidArgument('window must be at least 2')
+        self.products = list(products)
+        self.window = window
+        self.stats = PairStats(len(self.products))
+        self.bars = deque()
+        self.last = np.full(len(self.products), np.nan) if closes is None \
+            else np.asarray(closes, dtype=np.float64).copy()
+
+    @classmethod
+    def from_aligned(cls, aligned, window):
+        """Seeds the window with the latest `window` buckets of history"""
+        values, valid = returns(aligned)
+        rolling = cls(aligned.products, window)
+        for t in range(max(0, values.shape[1] - window), values.shape[1]):
+            rolling.bars.append((values[:, t], valid[:, t]))
+        rolling.stats.add(values[:, -window:], valid[:, -window:])
+        # The latest real close of every product
+        close = np.where(aligned.mask, aligned.close, np.nan)
+        seen = np.where(aligned.mask, np.arange(len(aligned)), -1).max(1)
+        rolling.last = np.where(
+            seen >= 0, close[np.arange(len(close)), np.maximum(seen, 0)],
+            np.nan)
+        return rolling
+
+    def update(self, closes):
+        """Folds in one bar.
+
+        Keyword arguments:
+        closes -- {product_id: close} or an array in `products` order;
+                  missing products or NaN mean no candle in this bar
+        """
+        if isinstance(closes, dict):
+            closes = [closes.get(p, np.nan) for p in self.products]
+        closes = np.asarray(closes, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.log(closes / self.last)
+        w = np.isfinite(x)
+        x[~w] = 0.0
+        self.last = np.where(np.isnan(closes), self.last, closes)
+
+        self.bars.append((x, w))
+        self.stats.add_bar(x, w.astype(np.float64))
+        if len(self.bars) > self.window:
+            old_x, old_w = self.bars.popleft()
+            self.stats.add_bar(old_x, old_w.astype(np.float64), -1.0)
+
+    def correlation(self, min_periods=2) -> np.ndarray:
+        return self.stats.correlation(min_periods)
+
+    def covariance(self, ddof=1, min_periods=2) -> np.ndarray:
+        return self.stats.covariance(ddof, min_periods)
+
+
+class CorrelationEngine:
+    """Correlation and covariance matrices of many products through a
+    MarketData, with the pair sums of every requested range cached.
+    Ranges that reach into the open bucket are still changing and are
+    computed on every call instead.
+
+    Safe to share between threads.
+    """
+    def __init__(self, md, granularity, products=None, max_entries=32):
+        """Correlation and covariance matrices through a MarketData
+
+        Keyword arguments:
+        md -- a MarketData, or anything with `frame(product_id, start,
+              end, granularity)`
+        granularity -- the bar size in seconds, or a string like '1h'
+        products -- product_ids, defaults to `md.available_trade_pairs()`,
+                    which for a MarketData is the exchange's
+                    `valid_product_ids()`
+        max_entries -- ranges kept in the least recently used cache
+        """
+        self.md = md
+        self.granularity = parse_granularity(granularity)
+        self.products = list(products or md.available_trade_pairs())
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def aligned(self, start, end):
+        frames = {
+            p: self.md.frame(p, start, end, self.granularity)
+            for p in self.products
+        }
+        return align(frames, self.granularity, self.__epoch(start),
+                     self.__epoch(end))
+
+    def stats(self, start, end) -> PairStats:
+        """The pair sums of [start, end), from the cache if possible"""
+        key = (self.__epoch(start), self.__epoch(end))
+        if key[1] > self.__epoch(time.time()):
+            return PairStats.from_returns(*returns(self.aligned(*key)))
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        stats = PairStats.from_returns(*returns(self.aligned(*key)))
+        with self._lock:
+            self._entries[key] = stats
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        event_log.debug('%i x %i pair sums for %s', len(self.products),
+                        len(self.products), key)
+        return stats
+
+    def correlation(self, start, end, min_periods=2) -> np.ndarray:
+        return self.stats(start, end).correlation(min_periods)
+
+    def covariance(self, start, end, ddof=1, min_periods=2) -> np.ndarray:
+        return self.stats(start, end).covariance(ddof, min_periods)
+
+    def rolling(self, start, end, window, step=1, min_periods=2,
+                covariance=False):
+        """See `rolling_correlation`"""
+        return rolling_correlation(self.aligned(start, end), window, step,
+                                   min_periods, covariance)
+
+    def stream(self, end, window) -> RollingCorrelation:
+        """A RollingCorrelation seeded with the `window` bars before `end`
+        """
+        end = self.__epoch(end)
+        # One more bar, for the return into the first bar of the window
+        start = end - (window + 1) * self.granularity
+        return RollingCorrelation.from_aligned(self.aligned(start, end),
+                                               window)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cache_info(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+    def __epoch(self, value) -> int:
+        value = TimeSlice.to_epoch(value)
+        return value - value % self.granularity
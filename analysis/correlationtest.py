@@ -0,0 +1,179 @@
+import time
+import unittest
+
+import numpy as np
+
+from analysis import correlation
+from api.coinbase.exceptions import InvalidArgument
+from data.densify import align
+from data.frame import CandleFrame
+
+PRODUCTS = ['BTC-USD', 'ETH-USD', 'LTC-USD', 'BCH-USD']
+
+
+def random_frames(count=600, granularity=60, seed=0):
+    """Correlated random walks; every product skips some candles"""
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0, 0.01, count)
+    frames = {}
+    for i, product_id in enumerate(PRODUCTS):
+        close = 100 * np.exp(np.cumsum(common * i / 2 +
+                                       rng.normal(0, 0.01, count)))
+        keep = rng.random(count) > 0.1 * i
+        time = np.arange(count, dtype=np.int64)[keep] * granularity
+        close = close[keep]
+        frames[product_id] = CandleFrame.from_columns(
+            time, close, close, close, close, np.ones(len(time)))
+    return frames
+
+
+def naive(aligned, covariance=False):
+    """Pairwise-complete statistics, one pair at a time"""
+    values, valid = correlation.returns(aligned)
+    size = len(values)
+    out = np.full((size, size), np.nan)
+    for i in range(size):
+        for j in range(size):
+            both = valid[i] & valid[j]
+            x, y = values[i][both], values[j][both]
+            if covariance:
+                out[i, j] = np.cov(x, y)[0, 1]
+            elif x.std() and y.std():
+                out[i, j] = np.corrcoef(x, y)[0, 1]
+    return out
+
+
+class FakeMarketData:
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = 0
+
+    def available_trade_pairs(self):
+        return list(self.frames)
+
+    def frame(self, product_id, start, end, granularity):
+        self.calls += 1
+        return self.frames[product_id].between(start, end)
+
+
+class TestCorrelation(unittest.TestCase):
+    def setUp(self):
+        self.frames = random_frames()
+        self.aligned = align(self.frames, 60)
+
+    def test_returns_skip_gaps(self):
+        values, valid = correlation.returns(self.aligned)
+        self.assertFalse(valid[:, 0].any())
+        np.testing.assert_array_equal(valid[:, 1:], self.aligned.mask[:, 1:])
+        mask, close = self.aligned.mask[3], self.aligned.close[3]
+        # A return after a gap spans the gap
+        t = np.flatnonzero(mask[1:] & ~mask[:-1])[0] + 1
+        last = np.flatnonzero(mask[:t])[-1]
+        self.assertAlmostEqual(values[3, t], np.log(close[t] / close[last]))
+
+    def test_full_matrices(self):
+        np.testing.assert_allclose(correlation.correlation(self.aligned),
+                                   naive(self.aligned), atol=1e-12)
+        np.testing.assert_allclose(correlation.covariance(self.aligned),
+                                   naive(self.aligned, True), atol=1e-15)
+        corr = correlation.correlation(self.aligned)
+        np.testing.assert_allclose(np.diag(corr), 1.0)
+        self.assertGreater(corr[2, 3], 0.3)
+
+    def test_large_mean(self):
+        rng = np.random.default_rng(3)
+        values = 1e6 + rng.normal(0, 1e-3, (3, 5000))
+        valid = np.ones(values.shape, dtype=bool)
+        stats = correlation.PairStats.from_returns(values, valid)
+        np.testing.assert_allclose(stats.correlation(), np.corrcoef(values),
+                                   atol=1e-6)
+        np.testing.assert_allclose(stats.covariance(), np.cov(values),
+                                   rtol=1e-6)
+
+        rolling = correlation.RollingCorrelation(['a', 'b', 'c'], 100)
+        for t in range(200):
+            rolling.stats.add_bar(values[:, t], np.ones(3), 1.0)
+            if t >= 100:
+                rolling.stats.add_bar(values[:, t - 100], np.ones(3), -1.0)
+        np.testing.assert_allclose(rolling.correlation(),
+                                   np.corrcoef(values[:, 100:200]),
+                                   atol=1e-6)
+
+    def test_blocks(self):
+        block = correlation.BLOCK
+        try:
+            correlation.BLOCK = 7
+            blocked = correlation.correlation(self.aligned)
+        finally:
+            correlation.BLOCK = block
+        np.testing.assert_allclose(blocked,
+                                   correlation.correlation(self.aligned))
+
+    def test_rolling(self):
+        for step in (1, 7, 50, 120):
+            time, matrices = correlation.rolling_correlation(
+                self.aligned, 100, step)
+            self.assertEqual(len(time), len(matrices))
+            values, valid = correlation.returns(self.aligned)
+            for k in (0, len(time) // 2, len(time) - 1):
+                end = int((time[k] - self.aligned.time[0]) // 60) + 1
+                stats = correlation.PairStats.from_returns(
+                    values[:, end - 100:end], valid[:, end - 100:end])
+                np.testing.assert_allclose(matrices[k], stats.correlation(),
+                                           atol=1e-9)
+        with self.assertRaises(InvalidArgument):
+            correlation.rolling_correlation(self.aligned, 1)
+
+    def test_streaming_matches_batch(self):
+        history = align(self.frames, 60, 0, 400 * 60)
+        rolling = correlation.RollingCorrelation.from_aligned(history, 100)
+        for t in range(400, 600):
+            rolling.update({
+                p: f.close[f.time == t * 60][0]
+                for p, f in self.frames.items() if (f.time == t * 60).any()
+            })
+        _, matrices = correlation.rolling_correlation(self.aligned, 100)
+        np.testing.assert_allclose(rolling.correlation(), matrices[-1],
+                                   atol=1e-9)
+        _, matrices = correlation.rolling_correlation(self.aligned, 100,
+                                                      covariance=True)
+        np.testing.assert_allclose(rolling.covariance(), matrices[-1],
+                                   atol=1e-12)
+
+    def test_engine_caches_ranges(self):
+        md = FakeMarketData(self.frames)
+        engine = correlation.CorrelationEngine(md, '1m')
+        self.assertEqual(engine.products, PRODUCTS)
+        corr = engine.correlation(0, 600 * 60)
+        np.testing.assert_allclose(corr, correlation.correlation(
+            self.aligned))
+        calls = md.calls
+        engine.covariance(0, 600 * 60)
+        self.assertEqual(md.calls, calls)
+        self.assertEqual(engine.cache_info()['hits'], 1)
+        engine.correlation(60, 600 * 60)
+        self.assertEqual(engine.cache_info()['misses'], 2)
+
+        _, matrices = engine.rolling(0, 600 * 60, 100, min_periods=100)
+        _, expected = correlation.rolling_correlation(self.aligned, 100,
+                                                      min_periods=100)
+        np.testing.assert_array_equal(np.isnan(matrices), np.isnan(expected))
+        self.assertTrue(np.isnan(matrices[:, 0, 3]).all())
+
+        stream = engine.stream(600 * 60, 100)
+        _, matrices = correlation.rolling_correlation(self.aligned, 100)
+        np.testing.assert_allclose(stream.correlation(), matrices[-1],
+                                   atol=1e-9)
+
+    def test_engine_skips_open_ranges(self):
+        md = FakeMarketData(self.frames)
+        engine = correlation.CorrelationEngine(md, '1m')
+        now = time.time()
+        engine.correlation(now - 600, now + 60)
+        engine.correlation(now - 600, now + 60)
+        self.assertEqual(engine.cache_info()['entries'], 0)
+        self.assertEqual(engine.cache_info()['hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+""" Vectorized technical indicators over columnar OHLCV arrays.
+
+Every indicator takes NumPy arrays (for example the columns of a
+CandleFrame, oldest first) and returns arrays of the same length, with
+NaN where the lookback window is not yet full. Nothing loops per candle in
+Python:
+
+- moving sums and VWAP use cumulative sums,
+- EMA and Wilder smoothing (RSI, ATR) use a blocked recursive filter that
+  solves each block of the recursion in closed form and only carries the
+  last value from block to block,
+- rolling extremes and deviations use strided window views.
+
+Run `python -m analysis.benchmark` to compare them with per-candle loops.
+"""
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+
+# Rows per chunk when a rolling window is materialized
+CHUNK = 1 << 16
+
+
+def _as_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _check_window(n, size):
+    if n < 1:
+        raise InvalidArgument('window must be at least 1, not {}'.format(n))
+    return n <= size
+
+
+def recursive_filter(x, alpha, seed=None) -> np.ndarray:
+    """Solves y[t] = alpha * x[t] + (1 - alpha) * y[t - 1] for every t.
+
+    The recursion is cut into blocks. Inside a block
+    y[k] = d^(k+1) * y_prev + alpha * d^k * cumsum(x[j] / d^j) with
+    d = 1 - alpha, and the blocks are short enough that d^-k never
+    overflows, so each block is a handful of vectorized operations.
+
+    Keyword arguments:
+    x -- the input series
+    alpha -- the smoothing factor, 0 < alpha <= 1
+    seed -- y[-1]; defaults to x[0], so that y[0] == x[0]
+    """
+    x = _as_array(x)
+    if not 0 < alpha <= 1:
+        raise InvalidArgument('alpha must be in (0, 1], not {}'.format(alpha))
+    y = np.empty_like(x)
+    if not len(x):
+        return y
+    previous = x[0] if seed is None else float(seed)
+    decay = 1.0 - alpha
+    if decay == 0.0:
+        return x.copy()
+
+    block = max(1, min(len(x), int(200 * np.log(10) / -np.log(decay))))
+    powers = decay**np.arange(block + 1)
+    for lo in range(0, len(x), block):
+        chunk = x[lo:lo + block]
+        k = len(chunk)
+        scaled = np.cumsum(chunk / powers[:k])
+        y[lo:lo + k] = powers[1:k + 1] * previous + alpha * powers[:k] * scaled
+        previous = y[lo + k - 1]
+    return y
+
+
+def _window_sums(x, n):
+    """Sums and counts of the finite values in every window of `n`.
+
+    NaN is summed as zero and left out of the count, so one NaN only
+    affects the windows that contain it instead of every later sum.
+    """
+    finite = np.isfinite(x)
+    sums = np.cumsum(np.r_[0.0, np.where(finite, x, 0.0)])
+    counts = np.cumsum(np.r_[0, finite])
+    return sums[n:] - sums[:-n], counts[n:] - counts[:-n]
+
+
+def sma(x, n) -> np.ndarray:
+    """Simple moving average over `n` values, NaN for windows holding a
+    NaN
+    """
+    x = _as_array(x)
+    out = np.full(len(x), np.nan)
+    if not _check_window(n, len(x)):
+        return out
+    sums, counts = _window_sums(x, n)
+    out[n - 1:] = np.where(counts == n, sums / n, np.nan)
+    return out
+
+
+def ema(x, n=None, alpha=None) -> np.ndarray:
+    """Exponential moving average with alpha = 2 / (n + 1), seeded with
+    the first value
+    """
+    if alpha is None:
+        if n is None:
+            raise InvalidArgument('ema needs a span n or an alpha')
+        alpha = 2.0 / (n + 1)
+    return recursive_filter(x, alpha)
+
+
+def wilder(x, n) -> np.ndarray:
+    """Wilder's smoothing (alpha = 1 / n) seeded with the mean of the first
+    `n` values, as used by RSI and ATR. NaN before index n - 1.
+    """
+    x = _as_array(x)
+    out = np.full(len(x), np.nan)
+    if not _check_window(n, len(x)):
+        return out
+    seed = x[:n].mean()
+    out[n - 1] = seed
+    out[n:] = recursive_filter(x[n:], 1.0 / n, seed)
+    return out
+
+
+def wma(x, n) -> np.ndarray:
+    """Linearly weighted moving average, the latest value weighing `n`"""
+    x = _as_array(x)
+    out = np.full(len(x), np.nan)
+    if not _check_window(n, len(x)):
+        return out
+    weights = np.arange(n, 0, -1, dtype=np.float64)
+    out[n - 1:] = np.convolve(x, weights, mode='valid') / weights.sum()
+    return out
+
+
+def rolling_std(x, n, ddof=0) -> np.ndarray:
+    """Rolling standard deviation over `n` values"""
+    x = _as_array(x)
+    out = np.full(len(x), np.nan)
+    if not _check_window(n, len(x)):
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(x, n)
+    for lo in range(0, len(windows), CHUNK):
+        out[n - 1 + lo:n - 1 + lo + CHUNK] = windows[lo:lo + CHUNK].std(
+            axis=1, ddof=ddof)
+    return out
+
+
+def rolling_max(x, n) -> np.ndarray:
+    x = _as_array(x)
+    out = np.full(len(x), np.nan)
+    if _check_window(n, len(x)):
+        out[n - 1:] = np.lib.stride_tricks.sliding_window_view(x, n).max(1)
+    return out
+
+
+def rolling_min(x, n) -> np.ndarray:
+    x = _as_array(x)
+    out = np.full(len(x), np.nan)
+    if _check_window(n, len(x)):
+        out[n - 1:] = np.lib.stride_tricks.sliding_window_view(x, n).min(1)
+    return out
+
+
+def rsi(close, n=14) -> np.ndarray:
+    """Relative Strength Index with Wilder's smoothing.
+
+    The first value is at index n, once `n` changes have been seen.
+    """
+    close = _as_array(close)
+    out = np.full(len(close), np.nan)
+    if len(close) <= n:
+        return out
+    change = np.diff(close)
+    gains = wilder(np.maximum(change, 0.0), n)
+    losses = wilder(np.maximum(-change, 0.0), n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = 100.0 - 100.0 / (1.0 + gains / losses)
+    out[1:][losses == 0] = 100.0
+    out[1:][(losses == 0) & (gains == 0)] = 50.0
+    out[:n] = np.nan
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """Moving Average Convergence Divergence.
+
+    Returns:
+    (macd, signal, histogram)
+    """
+    line = ema(close, fast) - ema(close, slow)
+    trigger = ema(line, signal)
+    return line, trigger, line - trigger
+
+
+def bollinger(close, n=20, k=2.0):
+    """Bollinger bands using the population standard deviation.
+
+    Returns:
+    (lower, middle, upper)
+    """
+    middle = sma(close, n)
+    width = k * rolling_std(close, n)
+    return middle - width, middle, middle + width
+
+
+def true_range(high, low, close) -> np.ndarray:
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    previous = np.r_[close[:1], close[:-1]]
+    return np.maximum(high, previous) - np.minimum(low, previous)
+
+
+def atr(high, low, close, n=14) -> np.ndarray:
+    """Average True Range with Wilder's smoothing"""
+    return wilder(true_range(high, low, close), n)
+
+
+def vwap(high, low, close, volume, time=None, session=None) -> np.ndarray:
+    """Volume weighted average price of the typical price. Candles with a
+    NaN price or volume are left out.
+
+    Keyword arguments:
+    high, low, close, volume -- the candle columns
+    time -- candle times, needed with `session`
+    session -- optional session length in seconds (e.g. 86400); the
+               average restarts at every session boundary
+    """
+    volume = _as_array(volume)
+    typical = (_as_array(high) + _as_array(low) + _as_array(close)) / 3.0
+    traded = typical * volume
+    finite = np.isfinite(traded)
+    value = np.cumsum(np.where(finite, traded, 0.0))
+    shares = np.cumsum(np.where(finite, volume, 0.0))
+    if session:
+        if time is None:
+            raise InvalidArgument('a session vwap needs candle times')
+        sessions = np.asarray(time) // session
+        starts = np.flatnonzero(np.r_[True, sessions[1:] != sessions[:-1]])
+        counts = np.diff(np.r_[starts, len(volume)])
+        value -= np.repeat(np.r_[0.0, value][starts], counts)
+        shares -= np.repeat(np.r_[0.0, shares][starts], counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return value / shares
+
+
+def obv(close, volume) -> np.ndarray:
+    """On-Balance Volume, starting at zero"""
+    direction = np.sign(np.diff(_as_array(close)))
+    return np.r_[0.0, np.cumsum(direction * _as_array(volume)[1:])]
+
+
+def stochastic(high, low, close, k=14, d=3):
+    """The stochastic oscillator.
+
+    A flat window (highest == lowest, e.g. forward-filled gaps) has no
+    range to place the close in, and gives %K = 50.
+
+    Returns:
+    (%K, %D) where %D is the `d` period SMA of %K
+    """
+    highest = rolling_max(high, k)
+    lowest = rolling_min(low, k)
+    spread = highest - lowest
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fast = 100.0 * (_as_array(close) - lowest) / spread
+    fast[spread == 0] = 50.0
+    slow = np.full(len(fast), np.nan)
+    if len(fast) >= k:
+        slow[k - 1:] = sma(fast[k - 1:], d)
+    return fast, slow
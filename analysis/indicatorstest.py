@@ -0,0 +1,121 @@
+import unittest
+
+import numpy as np
+
+from analysis import benchmark
+from analysis import indicators
+from api.coinbase.exceptions import InvalidArgument
+
+
+class TestIndicators(unittest.TestCase):
+    def setUp(self):
+        self.high, self.low, self.close, self.volume = \
+            benchmark.random_candles(3000)
+        self.lists = [v.tolist() for v in (self.high, self.low, self.close,
+                                           self.volume)]
+
+    def assertSeries(self, actual, expected):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9,
+                                   equal_nan=True)
+
+    def test_sma_wma(self):
+        close = self.lists[2]
+        self.assertSeries(indicators.sma(self.close, 20),
+                          benchmark.naive_sma(close, 20))
+        self.assertSeries(indicators.wma(self.close, 10),
+                          benchmark.naive_wma(close, 10))
+
+    def test_ema(self):
+        for n in (2, 12, 200, 2000):
+            self.assertSeries(indicators.ema(self.close, n),
+                              benchmark.naive_ema(self.lists[2], n))
+
+    def test_recursive_filter_long_blocks(self):
+        # Slow decay gives blocks of thousands of values
+        x = np.tile(self.close, 30)
+        expected = benchmark.naive_ema(x.tolist(), 20000)
+        self.assertSeries(indicators.ema(x, 20000), expected)
+        with self.assertRaises(InvalidArgument):
+            indicators.recursive_filter(x, 0)
+
+    def test_rsi(self):
+        self.assertSeries(indicators.rsi(self.close),
+                          benchmark.naive_rsi(self.lists[2]))
+        flat = np.r_[np.ones(20), np.arange(2.0, 12.0)]
+        result = indicators.rsi(flat)
+        self.assertEqual(result[14], 50.0)
+        self.assertEqual(result[-1], 100.0)
+
+    def test_macd(self):
+        line, signal, histogram = indicators.macd(self.close)
+        fast = benchmark.naive_ema(self.lists[2], 12)
+        slow = benchmark.naive_ema(self.lists[2], 26)
+        self.assertSeries(line, np.subtract(fast, slow))
+        self.assertSeries(signal,
+                          benchmark.naive_ema(line.tolist(), 9))
+        self.assertSeries(histogram, line - signal)
+
+    def test_bollinger(self):
+        for actual, expected in zip(
+                indicators.bollinger(self.close),
+                benchmark.naive_bollinger(self.lists[2])):
+            self.assertSeries(actual, expected)
+
+    def test_atr_vwap_obv_stochastic(self):
+        h, l, c, v = self.lists
+        self.assertSeries(indicators.atr(self.high, self.low, self.close),
+                          benchmark.naive_atr(h, l, c))
+        self.assertSeries(
+            indicators.vwap(self.high, self.low, self.close, self.volume),
+            benchmark.naive_vwap(h, l, c, v))
+        self.assertSeries(indicators.obv(self.close, self.volume),
+                          benchmark.naive_obv(c, v))
+        fast, slow = indicators.stochastic(self.high, self.low, self.close)
+        self.assertSeries(fast, benchmark.naive_stochastic(h, l, c))
+        self.assertSeries(slow[15:], benchmark.naive_sma(fast[13:].tolist(),
+                                                         3)[2:])
+
+    def test_session_vwap(self):
+        time = np.arange(3000) * 60
+        result = indicators.vwap(self.high, self.low, self.close, self.volume,
+                                 time, 86400)
+        day = slice(1440, 2880)
+        h, l, c, v = (x[day].tolist() for x in (self.high, self.low,
+                                                  self.close, self.volume))
+        self.assertSeries(result[day], benchmark.naive_vwap(h, l, c, v))
+
+    def test_short_input(self):
+        self.assertTrue(np.isnan(indicators.sma([1.0, 2.0], 5)).all())
+        self.assertTrue(np.isnan(indicators.rsi([1.0, 2.0])).all())
+        self.assertEqual(len(indicators.ema([], 5)), 0)
+
+    def test_nan_input(self):
+        close = self.close[:200].copy()
+        close[50] = np.nan
+        result = indicators.sma(close, 10)
+        self.assertSeries(result, benchmark.naive_sma(close.tolist(), 10))
+        self.assertTrue(np.isnan(result[50:60]).all())
+        self.assertFalse(np.isnan(result[60:]).any())
+
+        volume = self.volume[:200].copy()
+        volume[20] = np.nan
+        h, l, c = (v[:200].tolist() for v in (self.high, self.low,
+                                               self.close))
+        result = indicators.vwap(self.high[:200], self.low[:200],
+                                 self.close[:200], volume)
+        self.assertFalse(np.isnan(result).any())
+        self.assertSeries(result, benchmark.naive_vwap(h, l, c,
+                                                       volume.tolist()))
+
+    def test_flat_stochastic(self):
+        # Forward-filled gaps: nothing moves for a while
+        close = np.r_[np.arange(1.0, 21.0), np.full(40, 20.0)]
+        fast, slow = indicators.stochastic(close, close, close)
+        self.assertSeries(fast, benchmark.naive_stochastic(
+            close.tolist(), close.tolist(), close.tolist()))
+        self.assertTrue((fast[33:] == 50.0).all())
+        self.assertFalse(np.isnan(slow[15:]).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+""" Online indicators that update in constant time per candle.
+
+Each indicator keeps just enough state to fold in one more candle, so a
+live feed never recomputes the history. The values match the batch
+functions of `analysis.indicators` at every step (NaN during warm-up).
+
+Every indicator accepts a Candle, a `MarketData.candles` dict, a raw
+`[time, low, high, open, close, volume]` row or a plain number, and can
+`snapshot()` its state into a JSON-friendly dict and `restore()` it, for
+example to survive a restart without replaying history.
+"""
+import math
+
+from collections import deque
+
+from api.coinbase.exceptions import InvalidArgument
+
+NAN = float('nan')
+
+
+def field(candle, name='close') -> float:
+    """Reads one field from any supported candle representation"""
+    if isinstance(candle, (int, float)):
+        return float(candle)
+    if isinstance(candle, dict):
+        return float(candle[name])
+    if hasattr(candle, name):
+        return float(getattr(candle, name))
+    labels = ['time', 'low', 'high', 'open', 'close', 'volume']
+    return float(candle[labels.index(name)])
+
+
+class StreamingIndicator:
+    """Base class handling snapshot and restore of plain attributes"""
+    # Attributes held in deques, which snapshots store as lists
+    _deques = ()
+
+    def snapshot(self) -> dict:
+        state = {}
+        for key, value in vars(self).items():
+            state[key] = list(value) if isinstance(value, deque) else value
+        state['type'] = self.__class__.__name__
+        return state
+
+    @classmethod
+    def restore(cls, state):
+        if state.get('type') != cls.__name__:
+            raise InvalidArgument('cannot restore {} from {}'.format(
+                cls.__name__, state.get('type')))
+        indicator = cls.__new__(cls)
+        for key, value in state.items():
+            if key == 'type':
+                continue
+            if key in cls._deques:
+                value = deque(
+                    tuple(v) if isinstance(v, list) else v for v in value)
+            elif isinstance(value, dict) and 'type' in value:
+                value = INDICATORS[value['type']].restore(value)
+            setattr(indicator, key, value)
+        return indicator
+
+    def snapshot_nested(self, state, *names):
+        for name in names:
+            state[name] = getattr(self, name).snapshot()
+        return state
+
+
+class StreamingEMA(StreamingIndicator):
+    """Exponential moving average seeded with the first value, see
+    `indicators.ema`
+    """
+    def __init__(self, n=None, alpha=None):
+        if alpha is None:
+            if n is None:
+                raise InvalidArgument('ema needs a span n or an alpha')
+            alpha = 2.0 / (n + 1)
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, candle) -> float:
+        x = field(candle)
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class StreamingWilder(StreamingIndicator):
+    """Wilder's smoothing seeded with the mean of the first `n` values,
+    see `indicators.wilder`
+    """
+    def __init__(self, n):
+        self.n = n
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, x) -> float:
+        self.count += 1
+        if self.count <= self.n:
+            self.value += (x - self.value) / self.count
+            return self.value if self.count == self.n else NAN
+        self.value += (x - self.value) / self.n
+        return self.value
+
+
+class StreamingRSI(StreamingIndicator):
+    """Relative Strength Index, see `indicators.rsi`"""
+    def __init__(self, n=14):
+        self.previous = None
+        self.gains = StreamingWilder(n)
+        self.losses = StreamingWilder(n)
+        self.value = NAN
+
+    def update(self, candle) -> float:
+        x = field(candle)
+        if self.previous is None:
+            self.previous = x
+            return NAN
+        change = x - self.previous
+        self.previous = x
+        gain = self.gains.update(max(change, 0.0))
+        loss = self.losses.update(max(-change, 0.0))
+        if math.isnan(gain):
+            self.value = NAN
+        elif loss == 0:
+            self.value = 50.0 if gain == 0 else 100.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + gain / loss)
+        return self.value
+
+    def snapshot(self) -> dict:
+        return self.snapshot_nested(super().snapshot(), 'gains', 'losses')
+
+
+class StreamingMACD(StreamingIndicator):
+    """MACD line, signal and histogram, see `indicators.macd`"""
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def update(self, candle) -> tuple:
+        x = field(candle)
+        line = self.fast.update(x) - self.slow.update(x)
+        trigger = self.signal.update(line)
+        return line, trigger, line - trigger
+
+    def snapshot(self) -> dict:
+        return self.snapshot_nested(super().snapshot(), 'fast', 'slow',
+                                    'signal')
+
+
+class StreamingATR(StreamingIndicator):
+    """Average True Range, see `indicators.atr`"""
+    def __init__(self, n=14):
+        self.previous = None
+        self.average = StreamingWilder(n)
+
+    def update(self, candle) -> float:
+        high, low = field(candle, 'high'), field(candle, 'low')
+        close = field(candle, 'close')
+        previous = close if self.previous is None else self.previous
+        self.previous = close
+        return self.average.update(
+            max(high, previous) - min(low, previous))
+
+    def snapshot(self) -> dict:
+        return self.snapshot_nested(super().snapshot(), 'average')
+
+
+class RollingStats(StreamingIndicator):
+    """Rolling mean and population standard deviation over `n` values.
+
+    Uses Welford's update, extended to remove the value leaving the
+    window, so there is no sum of squares to lose precision in.
+    """
+    _deques = ('window', )
+
+    def __init__(self, n):
+        if n < 1:
+            raise InvalidArgument('window must be at least 1')
+        self.n = n
+        self.window = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, candle) -> tuple:
+        """Returns (mean, std), NaN until the window is full"""
+        x = field(candle)
+        self.window.append(x)
+        if len(self.window) > self.n:
+            old = self.window.popleft()
+            mean = self.mean + (x - old) / self.n
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+        else:
+            delta = x - self.mean
+            self.mean += delta / len(self.window)
+            self.m2 += delta * (x - self.mean)
+        if len(self.window) < self.n:
+            return NAN, NAN
+        return self.mean, math.sqrt(max(self.m2, 0.0) / self.n)
+
+    def bollinger(self, k=2.0) -> tuple:
+        """(lower, middle, upper) bands of the current window"""
+        if len(self.window) < self.n:
+            return NAN, NAN, NAN
+        std = math.sqrt(max(self.m2, 0.0) / self.n)
+        return self.mean - k * std, self.mean, self.mean + k * std
+
+
+class RollingExtremum(StreamingIndicator):
+    """Rolling maximum (or minimum) over `n` values.
+
+    A monotonic deque of (index, value) keeps only candidates that can
+    still become the extremum, so each update is amortized O(1).
+    """
+    _deques = ('candidates', )
+
+    def __init__(self, n, maximum=True, name=None):
+        """Rolling maximum (or minimum) over `n` values
+
+        Keyword arguments:
+        n -- window length
+        maximum -- False for a rolling minimum
+        name -- the candle field to read, defaults to high or low
+        """
+        if n < 1:
+            raise InvalidArgument('window must be at least 1')
+        self.n = n
+        self.maximum = maximum
+        self.name = name or ('high' if maximum else 'low')
+        self.count = 0
+        self.candidates = deque()
+
+    def update(self, candle) -> float:
+        x = field(candle, self.name)
+        candidates = self.candidates
+        if self.maximum:
+            while candidates and candidates[-1][1] <= x:
+                candidates.pop()
+        else:
+            while candidates and candidates[-1][1] >= x:
+                candidates.pop()
+        candidates.append((self.count, x))
+        if candidates[0][0] <= self.count - self.n:
+            candidates.popleft()
+        self.count += 1
+        return candidates[0][1] if self.count >= self.n else NAN
+
+
+INDICATORS = {
+    cls.__name__: cls
+    for cls in (StreamingEMA, StreamingWilder, StreamingRSI, StreamingMACD,
+                StreamingATR, RollingStats, RollingExtremum)
+}
@@ -0,0 +1,106 @@
+import json
+import math
+import unittest
+
+import numpy as np
+
+from analysis import indicators
+from analysis.benchmark import random_candles
+from analysis.streaming import RollingExtremum
+from analysis.streaming import RollingStats
+from analysis.streaming import StreamingATR
+from analysis.streaming import StreamingEMA
+from analysis.streaming import StreamingMACD
+from analysis.streaming import StreamingRSI
+from analysis.streaming import field
+from api.coinbase.exceptions import InvalidArgument
+from api.exchange.candle import Candle
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.high, self.low, self.close, self.volume = random_candles(2000)
+        self.candles = [
+            Candle(t * 60, l, h, c, c, v) for t, (h, l, c, v) in enumerate(
+                zip(self.high.tolist(), self.low.tolist(),
+                    self.close.tolist(), self.volume.tolist()))
+        ]
+
+    def run_with_restore(self, indicator, candles):
+        """Feeds candles, snapshotting and restoring through JSON halfway"""
+        values = [indicator.update(c) for c in candles[:len(candles) // 2]]
+        state = json.loads(json.dumps(indicator.snapshot()))
+        indicator = type(indicator).restore(state)
+        values.extend(indicator.update(c) for c in candles[len(candles) // 2:])
+        return np.array(values, dtype=np.float64)
+
+    def assertSeries(self, actual, expected):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9,
+                                   equal_nan=True)
+
+    def test_field(self):
+        candle = self.candles[3]
+        self.assertEqual(field(candle), candle.close)
+        self.assertEqual(field({'close': 2}), 2.0)
+        self.assertEqual(field([0, 1, 2, 3, 4, 5], 'high'), 2.0)
+        self.assertEqual(field(7), 7.0)
+
+    def test_ema(self):
+        self.assertSeries(self.run_with_restore(StreamingEMA(20),
+                                                self.candles),
+                          indicators.ema(self.close, 20))
+
+    def test_rsi(self):
+        self.assertSeries(self.run_with_restore(StreamingRSI(14),
+                                                self.candles),
+                          indicators.rsi(self.close, 14))
+
+    def test_macd(self):
+        values = self.run_with_restore(StreamingMACD(), self.candles)
+        for actual, expected in zip(values.T, indicators.macd(self.close)):
+            self.assertSeries(actual, expected)
+
+    def test_atr(self):
+        self.assertSeries(
+            self.run_with_restore(StreamingATR(14), self.candles),
+            indicators.atr(self.high, self.low, self.close, 14))
+
+    def test_rolling_stats(self):
+        values = self.run_with_restore(RollingStats(20), self.candles)
+        self.assertSeries(values[:, 0], indicators.sma(self.close, 20))
+        self.assertSeries(values[:, 1], indicators.rolling_std(self.close, 20))
+
+        stats = RollingStats(20)
+        for candle in self.candles:
+            stats.update(candle)
+        lower, middle, upper = indicators.bollinger(self.close)
+        self.assertSeries(stats.bollinger(), (lower[-1], middle[-1],
+                                              upper[-1]))
+
+    def test_rolling_extrema(self):
+        self.assertSeries(
+            self.run_with_restore(RollingExtremum(14), self.candles),
+            indicators.rolling_max(self.high, 14))
+        self.assertSeries(
+            self.run_with_restore(RollingExtremum(14, maximum=False),
+                                  self.candles),
+            indicators.rolling_min(self.low, 14))
+
+    def test_constant_memory(self):
+        extremum, stats = RollingExtremum(50), RollingStats(50)
+        for candle in self.candles:
+            extremum.update(candle)
+            stats.update(candle)
+        self.assertLessEqual(len(extremum.candidates), 50)
+        self.assertEqual(len(stats.window), 50)
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidArgument):
+            StreamingEMA()
+        with self.assertRaises(InvalidArgument):
+            StreamingRSI.restore(StreamingEMA(3).snapshot())
+        self.assertTrue(math.isnan(StreamingRSI().update(1.0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
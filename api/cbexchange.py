@@ -14,6 +14,7 @@ from .coinbase import exceptions as cbex
 from .coinbase.keys import Keys
 from .exchange.base import Exchange
 from .exchange.granularity import Granularity
+from .exchange.ratelimit import RateLimiter
 from .logs.setuplogger import logger
 
 event_log = logging.getLogger('root.{}'.format(__name__))
@@ -55,6 +56,8 @@ class Coinbase(Exchange):
         self.__last_call = time.time()
         self.__call_count = 0
         self.__timeout = 0.5
+        self.rate_limiter = RateLimiter(self._rate_limits['public'],
+                                        self._rate_limits['public_burst'])
 
     def accounts(self, account_id=None):
         """Get a list of trading accounts.
@@ -328,19 +331,19 @@ class Coinbase(Exchange):
             raise cbex.InvalidOrder(order_id)
         raise cbex.ExchangeError(message)
 
-    def candles(self, product_id, start, end, granularity):
+    def candles(self, product_id, start, end, granularity, raw=False):
         """Candle data for a product.
         This is effectively a wrapper around historic_rates
         It conforms to the `Exchange.candles` protocol required by the `MarketData` module
+
+        Calls are throttled by `rate_limiter`, which is thread-safe, so one
+        Coinbase object can be shared by a pool of workers.
+        If `raw` is True the undecoded response body is returned.
         """
         try:
-            if self.__call_count < self._rate_limits['public']:
-                self.__call_count = self.__call_count + 1
-                return self.historic_rates(product_id, start, end, granularity)
-            else:
-                time.sleep(self.__timeout)
-                self.__call_count = 1
-                return self.historic_rates(product_id, start, end, granularity)
+            self.__enforce_rate_limit()
+            return self.historic_rates(product_id, start, end, granularity,
+                                       raw)
         except cbex.ExchangeError as err:
             raise err
 
@@ -370,7 +373,9 @@ class Coinbase(Exchange):
         raise cbex.ExchangeError(message)
 
     def __enforce_rate_limit(self):
-        pass
+        self.__call_count = self.__call_count + 1
+        self.__last_call = time.time()
+        self.rate_limiter.acquire()
 
     def __find_valid_product_ids(self):
         products = self.products()
@@ -385,7 +390,8 @@ class Coinbase(Exchange):
                        product_id,
                        start=False,
                        end=False,
-                       granularity=3600):
+                       granularity=3600,
+                       raw=False):
         """Historic rates for a product.
         Rates are returned in grouped buckets based on requested granularity.
         Historic rates DO NOT exist for `Sandbox` mode.
@@ -394,6 +400,8 @@ class Coinbase(Exchange):
         start - Start time in ISO 8601
         end - End time in ISO 8601
         granularity - Desired timeslice in seconds (see below)
+        raw - If True return the response body as bytes, leaving the JSON
+              decoding to the caller (see `data.transform`)
 
         Historical rate data may be incomplete.
         No data is published for intervals where there are no ticks.
@@ -466,7 +474,7 @@ class Coinbase(Exchange):
             raise
 
         if rates.status_code == CBConst.Status.success:
-            return rates.json()
+            return rates.content if raw else rates.json()
         message = rates.json()['message']
         errors = [
             CBConst.Errors.granularity_too_small in message,
@@ -543,6 +551,12 @@ class Coinbase(Exchange):
 
         return account_holds
 
+    def max_candles(self):
+        """Coinbase documents a hard limit of 350 data points, but rejects
+        any request whose range spans more than 300 buckets.
+        """
+        return 300
+
     def order_book(self, product_id, level=None):
         """Returns a list of all active orders on the Coinbase order books
         for a given product_id.
@@ -0,0 +1,763 @@
+#!/usr/bin/env python
+""" An in-process paper trading simulator of the Coinbase order API.
+
+PaperCoinbase exposes the same order and account methods as Coinbase
+(`buy`, `sell`, `cancel_order`, `cancel_all_orders`, `orders`,
+`accounts`, `balance`, `holds`, `order_book`, `ticker`, ...) without
+sending a request anywhere, so strategies can be load tested locally.
+
+Market data comes from Coinbase websocket style messages passed to
+`feed`, recorded or live:
+
+- `snapshot` and `l2update` set the resting liquidity of other traders
+  at each price level,
+- `match` (and `last_match`) is a trade by another trader, which fills
+  any of our orders it reaches in price-time priority.
+
+Each book keeps a heap of prices per side and a FIFO queue of live orders
+per price, so placing and matching an order cost O(log levels), and a
+cancel only touches the queue of its own price level.
+Orders and cancels reach the book `latency` seconds after they are sent,
+and every fill charges the maker or taker fee. Quote funds (buys) and
+base funds (sells) are held while an order is open, as on Coinbase.
+
+Time is simulated: it advances with the `time` of fed messages or with
+`advance`, unless a `clock` such as `time.time` is given for live use.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import uuid
+
+from collections import deque
+from datetime import datetime
+from datetime import timezone
+
+from .coinbase.constants import CBConst
+from .coinbase import exceptions as cbex
+from .exchange.base import Exchange
+from .exchange.granularity import Granularity
+from .exchange.timeslice import TimeSlice
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+# Sizes below this are treated as fully filled
+EPSILON = 1e-12
+_FRACTION = re.compile(r'\.(\d+)')
+
+
+def _seconds(value) -> float:
+    """Epoch seconds of a number or an ISO 8601 string, keeping fractions"""
+    if not isinstance(value, str):
+        return float(value)
+    fraction = _FRACTION.search(value[19:])
+    return TimeSlice.to_epoch(value) + (
+        float('0.' + fraction.group(1)) if fraction else 0.0)
+
+
+def _iso(seconds) -> str:
+    return datetime.fromtimestamp(
+        seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class Order:
+    """One resting or in-flight order. Orders of other traders (from the
+    market data feed) have no owner and are never reported.
+    """
+    __slots__ = ('id', 'product_id', 'side', 'price', 'size', 'remaining',
+                 'owned', 'created_at', 'status', 'done_reason',
+                 'filled_size', 'executed_value', 'fill_fees', 'hold')
+
+    def __init__(self, product_id, side, price, size, owned, created_at):
+        self.id = str(uuid.uuid4()) if owned else None
+        self.product_id = product_id
+        self.side = side
+        self.price = price
+        self.size = size
+        self.remaining = size
+        self.owned = owned
+        self.created_at = created_at
+        self.status = CBConst.pending
+        self.done_reason = None
+        self.filled_size = 0.0
+        self.executed_value = 0.0
+        self.fill_fees = 0.0
+        self.hold = 0.0
+
+    @property
+    def live(self) -> bool:
+        return self.remaining > EPSILON and self.status != CBConst.done
+
+    def receipt(self) -> dict:
+        """The order as Coinbase reports it"""
+        receipt = {
+            CBConst.id_: self.id,
+            CBConst.price: '{:.8f}'.format(self.price),
+            CBConst.size: '{:.8f}'.format(self.size),
+            CBConst.product_id: self.product_id,
+            CBConst.side: self.side,
+            CBConst.stp: CBConst.cancel_oldest,
+            CBConst.type_: CBConst.limit,
+            CBConst.time_in_force: 'GTC',
+            CBConst.post_only: False,
+            CBConst.created_at: _iso(self.created_at),
+            CBConst.fill_fees: '{:.16f}'.format(self.fill_fees),
+            CBConst.filled_size: '{:.8f}'.format(self.filled_size),
+            CBConst.executed_value: '{:.16f}'.format(self.executed_value),
+            CBConst.status: self.status,
+            CBConst.settled: self.status == CBConst.done,
+        }
+        if self.done_reason:
+            receipt[CBConst.done_reason] = self.done_reason
+        return receipt
+
+
+class OrderBook:
+    """Price-time priority limit order book of one product.
+
+    Only live orders are queued: filled, canceled and emptied orders are
+    removed from their level, and empty levels are dropped. Prices of
+    dropped levels may linger in the heap until they reach the top, and
+    the heap is rebuilt once such stale prices outnumber the live ones.
+    """
+    def __init__(self, product_id):
+        self.product_id = product_id
+        # {side: {price: deque of orders}}, and a heap of prices per side
+        # keyed so that the best price is on top (bids are negated)
+        self.levels = {CBConst.buy: {}, CBConst.sell: {}}
+        self.heaps = {CBConst.buy: [], CBConst.sell: []}
+        # {side: prices in the heap}, so a level is never pushed twice
+        self.heaped = {CBConst.buy: set(), CBConst.sell: set()}
+        # {side: {price: the resting order of other traders}}
+        self.external = {CBConst.buy: {}, CBConst.sell: {}}
+
+    def best(self, side):
+        """The best live price on `side`"""
+        levels, heap = self.levels[side], self.heaps[side]
+        while heap:
+            price = heap[0] if side == CBConst.sell else -heap[0]
+            queue = levels.get(price)
+            while queue and not queue[0].live:
+                queue.popleft()
+            if queue:
+                return price
+            heapq.heappop(heap)
+            self.heaped[side].discard(price)
+            levels.pop(price, None)
+        return None
+
+    def add(self, order):
+        side, price = order.side, order.price
+        levels = self.levels[side]
+        queue = levels.get(price)
+        if queue is None:
+            queue = levels[price] = deque()
+            if price not in self.heaped[side]:
+                self.heaped[side].add(price)
+                heapq.heappush(self.heaps[side],
+                               price if side == CBConst.sell else -price)
+                if len(self.heaps[side]) > 2 * len(levels) + 64:
+                    self.__rebuild(side)
+        queue.append(order)
+        order.status = CBConst.open_
+
+    def remove(self, order):
+        """Takes an order out of its level, dropping the level if empty"""
+        levels = self.levels[order.side]
+        queue = levels.get(order.price)
+        if queue is None:
+            return
+        if queue and queue[0] is order:
+            queue.popleft()
+        else:
+            try:
+                queue.remove(order)
+            except ValueError:
+                pass
+        if not queue:
+            del levels[order.price]
+        external = self.external[order.side]
+        if not order.owned and external.get(order.price) is order:
+            del external[order.price]
+
+    def set_external(self, side, price, size, now):
+        """Sets the liquidity of other traders at one level. An existing
+        level keeps its place in the queue as it grows or shrinks.
+        """
+        order = self.external[side].get(price)
+        if order is not None and size > EPSILON:
+            order.remaining = size
+        elif order is not None:
+            order.remaining = 0.0
+            self.remove(order)
+        elif size > EPSILON:
+            order = self.external[side][price] = Order(
+                self.product_id, side, price, size, False, now)
+            self.add(order)
+
+    def clear_external(self):
+        for side in self.external:
+            for order in list(self.external[side].values()):
+                order.remaining = 0.0
+                self.remove(order)
+
+    def crosses(self, side, limit, price) -> bool:
+        return price <= limit if side == CBConst.buy else price >= limit
+
+    def depth(self, side, count=None) -> list:
+        """[[price, size, orders], ...] aggregated by level, best first"""
+        if count == 1:
+            best = self.best(side)
+            prices = [] if best is None else [best]
+        elif count:
+            pick = heapq.nlargest if side == CBConst.buy else \
+                heapq.nsmallest
+            prices = pick(count, self.levels[side])
+        else:
+            prices = sorted(self.levels[side], reverse=side == CBConst.buy)
+        result = []
+        for price in prices:
+            live = [o for o in self.levels[side][price] if o.live]
+            if live:
+                result.append([
+                    '{:.8f}'.format(price),
+                    '{:.8f}'.format(sum(o.remaining for o in live)),
+                    len(live)
+                ])
+        return result
+
+    def __len__(self):
+        return sum(
+            len(queue) for levels in self.levels.values()
+            for queue in levels.values())
+
+    def __rebuild(self, side):
+        """Drops the prices of removed levels from the heap"""
+        levels = self.levels[side]
+        self.heaps[side] = [p if side == CBConst.sell else -p for p in levels]
+        heapq.heapify(self.heaps[side])
+        self.heaped[side] = set(levels)
+
+
+class PaperCoinbase(Exchange):
+    """An Exchange subclass simulating Coinbase orders and accounts locally
+    """
+    def __init__(self,
+                 auth=None,
+                 balances=None,
+                 product_ids=(CBConst.btc_usd, CBConst.eth_usd,
+                              CBConst.ltc_usd),
+                 maker_fee=0.005,
+                 taker_fee=0.005,
+                 latency=0.0,
+                 clock=None):
+        """An Exchange subclass simulating Coinbase orders and accounts
+        locally
+
+        Keyword arguments:
+        auth -- ignored, accepted for compatibility with Coinbase
+        balances -- starting funds, e.g. {'USD': 10000}
+        product_ids -- the tradeable products as BASE-QUOTE pairs
+        maker_fee -- fee rate of fills that rest on the book first
+        taker_fee -- fee rate of fills that take from the book
+        latency -- seconds before an order or cancel reaches the book
+        clock -- optional callable returning epoch seconds, e.g.
+                 `time.time`; without it time only moves with `feed`
+                 and `advance`
+        """
+        self._event_log = event_log
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.latency = latency
+        self.__clock = clock
+        self.__time = clock() if clock else 0.0
+        self.__valid_product_ids = tuple(product_ids)
+        self.__available_granularity = Granularity(
+            (60, 300, 900, 3600, 21600, 86400))
+        self.__books = {p: OrderBook(p) for p in self.__valid_product_ids}
+        self.__orders = {}
+        self.__open = {}
+        self.__events = []
+        self.__sequence = itertools.count()
+        self.__trade_ids = itertools.count(1)
+        # The simulated clock never goes back, so trades stay time-ordered
+        self.__trades = {p: [] for p in self.__valid_product_ids}
+        self.__trade_times = {p: [] for p in self.__valid_product_ids}
+        self.__volume = {p: 0.0 for p in self.__valid_product_ids}
+        self.__fills = []
+        self.__accounts = {}
+        for product_id in self.__valid_product_ids:
+            for currency in product_id.split('-'):
+                self.__account(currency)
+        for currency, amount in (balances or {}).items():
+            self.__account(currency)[CBConst.balance] = float(amount)
+
+    # Market data
+
+    def feed(self, message):
+        """Applies one Coinbase websocket message (snapshot, l2update,
+        match or last_match) to the simulated market. Messages of other
+        types are ignored.
+        """
+        kind = message.get(CBConst.type_)
+        if CBConst.time in message:
+            self.__set_time(_seconds(message[CBConst.time]))
+        self.__process()
+        product_id = message.get(CBConst.product_id)
+        if kind == CBConst.snapshot:
+            book = self.__book(product_id)
+            book.clear_external()
+            for side, key in ((CBConst.buy, CBConst.bids),
+                              (CBConst.sell, CBConst.asks)):
+                for level in message[key]:
+                    book.set_external(side, float(level[0]),
+                                      float(level[1]), self.now())
+        elif kind == CBConst.l2update:
+            book = self.__book(product_id)
+            for side, price, size in message[CBConst.changes]:
+                book.set_external(side, float(price), float(size),
+                                  self.now())
+        elif kind in (CBConst.match, CBConst.last_match):
+            # `side` is the maker's side, the taker trades against it
+            taker = CBConst.buy if message[CBConst.side] == CBConst.sell \
+                else CBConst.sell
+            price, size = float(message[CBConst.price]), float(
+                message[CBConst.size])
+            self.__take(product_id, taker, price, size, None)
+            self.__trade(product_id, price, size)
+
+    def replay(self, messages) -> int:
+        """Feeds a sequence of recorded messages, returns how many"""
+        count = 0
+        for message in messages:
+            self.feed(message)
+            count += 1
+        return count
+
+    def advance(self, seconds):
+        """Moves simulated time forward, delivering due orders and cancels
+        """
+        self.__set_time(self.__time + seconds)
+        self.__process()
+
+    def now(self) -> float:
+        if self.__clock:
+            self.__set_time(self.__clock())
+        return self.__time
+
+    # Exchange protocol
+
+    def available_granularity(self):
+        return self.__available_granularity
+
+    def valid_product_ids(self):
+        return self.__valid_product_ids
+
+    def candles(self, product_id, start, end, granularity):
+        """Candles of the simulated trades, newest first, in the
+        `[time, low, high, open, close, volume]` format of Coinbase
+        """
+        self.__book(product_id)
+        start, end = TimeSlice.to_epoch(start), TimeSlice.to_epoch(end)
+        start -= start % granularity
+        times = self.__trade_times[product_id]
+        lo = bisect.bisect_left(times, start)
+        hi = bisect.bisect_left(times, end + granularity)
+        buckets = {}
+        for when, price, size in self.__trades[product_id][lo:hi]:
+            bucket = int(when // granularity * granularity)
+            candle = buckets.get(bucket)
+            if candle is None:
+                buckets[bucket] = [bucket, price, price, price, price, size]
+                continue
+            candle[1] = min(candle[1], price)
+            candle[2] = max(candle[2], price)
+            candle[4] = price
+            candle[5] += size
+        return [buckets[t] for t in sorted(buckets, reverse=True)
+                if start <= t <= end]
+
+    def ticker(self, symbol):
+        book = self.__book(symbol)
+        self.__process()
+        bid, ask = book.best(CBConst.buy), book.best(CBConst.sell)
+        trades = self.__trades[symbol]
+        last = trades[-1] if trades else (self.now(), None, 0.0)
+        return {
+            CBConst.trade_id: len(trades),
+            CBConst.price: None if last[1] is None else str(last[1]),
+            CBConst.size: str(last[2]),
+            'bid': None if bid is None else str(bid),
+            'ask': None if ask is None else str(ask),
+            CBConst.volume: str(self.__volume[symbol]),
+            CBConst.time: _iso(last[0])
+        }
+
+    def book(self, product_id) -> OrderBook:
+        """The simulated OrderBook of a product, for inspection"""
+        self.__process()
+        return self.__book(product_id)
+
+    def order_book(self, product_id, level=None):
+        """Aggregated book including our own orders. Level 1 is the best
+        bid and ask, level 2 the top 50 levels, level 3 every level.
+        """
+        if level not in (None, 1, 2, 3):
+            raise cbex.InvalidArgument(level)
+        book = self.__book(product_id)
+        self.__process()
+        count = {None: 1, 1: 1, 2: 50, 3: None}[level]
+        return {
+            CBConst.sequence: next(self.__sequence),
+            CBConst.bids: book.depth(CBConst.buy, count),
+            CBConst.asks: book.depth(CBConst.sell, count)
+        }
+
+    def products(self):
+        return [{
+            CBConst.id_: p,
+            CBConst.base_currency: p.split('-')[0],
+            CBConst.quote_currency: p.split('-')[1],
+            CBConst.maker_fee_rate: str(self.maker_fee),
+            CBConst.taker_fee_rate: str(self.taker_fee),
+        } for p in self.__valid_product_ids]
+
+    def trades(self, product_id):
+        """The latest simulated trades, newest first"""
+        self.__book(product_id)
+        return [{
+            CBConst.time: _iso(when),
+            CBConst.price: str(price),
+            CBConst.size: str(size)
+        } for when, price, size in reversed(self.__trades[product_id][-100:])]
+
+    # Orders
+
+    def buy(self, size, product_id, price):
+        """Places a limit order on the 'buy' side, holding its quote funds
+        including the taker fee. The receipt is returned immediately; the
+        order reaches the book after `latency` seconds.
+        """
+        return self.__place(CBConst.buy, size, product_id, price)
+
+    def sell(self, size, product_id, price):
+        """Places a limit order on the 'sell' side, holding its size of the
+        base currency
+        """
+        return self.__place(CBConst.sell, size, product_id, price)
+
+    def cancel_order(self, order_id):
+        """Cancels an open or pending order once the cancel reaches the
+        book; it may still fill in the meantime.
+        """
+        self.__process()
+        order = self.__orders.get(order_id)
+        if order is None or order.status == CBConst.done:
+            raise cbex.InvalidOrder(order_id)
+        self.__schedule(self.__cancel, order)
+        return order_id
+
+    def cancel_all_orders(self, product_id=None):
+        if product_id and product_id not in self.__valid_product_ids:
+            raise cbex.InvalidSymbol(product_id)
+        self.__process()
+        canceled = [
+            o for o in self.__open.values()
+            if not product_id or o.product_id == product_id
+        ]
+        if not canceled and product_id:
+            raise cbex.EmptyResponse
+        for order in canceled:
+            self.__schedule(self.__cancel, order)
+        return [o.id for o in canceled]
+
+    def orders(self, status=None, product_id=None):
+        """Orders by status: 'open', 'pending', 'active', 'done' or 'all'.
+        By default open, pending and active orders are listed, newest
+        first.
+        """
+        self.__process()
+        if status is None:
+            status = [CBConst.open_, CBConst.pending, CBConst.active]
+        elif isinstance(status, str):
+            status = [status]
+        elif not isinstance(status, (list, tuple)):
+            raise cbex.InvalidArgument(status)
+        if product_id and product_id not in self.__valid_product_ids:
+            raise cbex.InvalidArgument(product_id)
+        wanted = set(status)
+        if 'all' in wanted or CBConst.active in wanted:
+            wanted.update((CBConst.open_, CBConst.pending))
+        if 'all' in wanted:
+            wanted.add(CBConst.done)
+        # Orders that are not done are all in `__open`, in placement order
+        source = self.__orders if CBConst.done in wanted else self.__open
+        orders = [
+            o.receipt() for o in source.values()
+            if o.status in wanted and (not product_id
+                                       or o.product_id == product_id)
+        ]
+        return orders[::-1]
+
+    def order(self, order_id):
+        order = self.__orders.get(order_id)
+        if order is None:
+            raise cbex.InvalidOrder(order_id)
+        return order.receipt()
+
+    def fills(self, order_id=None, product_id=None):
+        """Our fills, newest first"""
+        return [
+            f for f in reversed(self.__fills)
+            if (not order_id or f[CBConst.order_id] == order_id) and (
+                not product_id or f[CBConst.product_id] == product_id)
+        ]
+
+    # Accounts
+
+    def accounts(self, account_id=None):
+        self.__process()
+        accounts = [self.__report(a) for a in self.__accounts.values()]
+        if account_id is None:
+            return accounts
+        for account in accounts:
+            if account[CBConst.id_] == account_id:
+                return account
+        raise cbex.InvalidAccount(account_id)
+
+    def balance(self, product_id=None):
+        """Balances by currency, optionally only the currencies in
+        `product_id`
+        """
+        balances = {}
+        for account in self.accounts():
+            if not product_id or account[CBConst.currency] in product_id:
+                balances[account[CBConst.currency]] = account[
+                    CBConst.balance]
+        return balances
+
+    def deposit(self, amount, currency, payment_method_id=None):
+        if float(amount) <= 0:
+            raise cbex.InvalidAmount(amount)
+        self.__account(currency)[CBConst.balance] += float(amount)
+        return {CBConst.amount: str(amount), CBConst.currency: currency}
+
+    def holds(self, account_id=None):
+        """Holds of the open and pending orders, for one or all accounts"""
+        self.__process()
+        currencies = {
+            a[CBConst.id_]: c
+            for c, a in self.__accounts.items()
+        }
+        if account_id is not None and account_id not in currencies:
+            raise cbex.InvalidAccount(account_id)
+        holds = []
+        for order in self.__open.values():
+            base, quote = order.product_id.split('-')
+            currency = quote if order.side == CBConst.buy else base
+            hold_account = self.__accounts[currency][CBConst.id_]
+            if account_id is None or hold_account == account_id:
+                holds.append({
+                    CBConst.id_: order.id,
+                    CBConst.account_id: hold_account,
+                    CBConst.created_at: _iso(order.created_at),
+                    CBConst.amount: '{:.16f}'.format(order.hold),
+                    CBConst.type_: 'order',
+                    CBConst.ref: order.id
+                })
+        return holds
+
+    # Engine
+
+    def __account(self, currency):
+        account = self.__accounts.get(currency)
+        if account is None:
+            account = self.__accounts[currency] = {
+                CBConst.id_: str(uuid.uuid4()),
+                CBConst.currency: currency,
+                CBConst.balance: 0.0,
+                CBConst.hold: 0.0
+            }
+        return account
+
+    @staticmethod
+    def __report(account):
+        balance, hold = account[CBConst.balance], account[CBConst.hold]
+        return {
+            CBConst.id_: account[CBConst.id_],
+            CBConst.currency: account[CBConst.currency],
+            CBConst.balance: '{:.16f}'.format(balance),
+            CBConst.hold: '{:.16f}'.format(hold),
+            CBConst.available: '{:.16f}'.format(balance - hold),
+            CBConst.profile_id: 'paper',
+            CBConst.trading_enabled: True
+        }
+
+    def __book(self, product_id):
+        book = self.__books.get(product_id)
+        if book is None:
+            raise cbex.InvalidSymbol(product_id)
+        return book
+
+    def __set_time(self, seconds):
+        self.__time = max(self.__time, seconds)
+
+    def __schedule(self, action, order):
+        heapq.heappush(self.__events, (self.now() + self.latency,
+                                       next(self.__sequence), action, order))
+        self.__process()
+
+    def __process(self):
+        """Delivers orders and cancels whose latency has elapsed"""
+        now = self.now()
+        events = self.__events
+        while events and events[0][0] <= now:
+            _, _, action, order = heapq.heappop(events)
+            action(order)
+
+    def __place(self, side, size, product_id, price):
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            raise cbex.InvalidPrice(price)
+        try:
+            size = float(size)
+        except (TypeError, ValueError):
+            raise cbex.InvalidSize(size)
+        if product_id not in self.__valid_product_ids:
+            raise cbex.InvalidSymbol(product_id)
+        if not price > 0:
+            raise cbex.InvalidPrice(price)
+        if not size > 0:
+            raise cbex.InvalidSize(size)
+
+        base, quote = product_id.split('-')
+        if side == CBConst.buy:
+            account = self.__accounts[quote]
+            hold = price * size * (1.0 + self.taker_fee)
+        else:
+            account = self.__accounts[base]
+            hold = size
+        if account[CBConst.balance] - account[CBConst.hold] < hold - EPSILON:
+            raise cbex.InsufficientFunds(CBConst.Errors.insufficient_funds)
+        account[CBConst.hold] += hold
+
+        order = Order(product_id, side, price, size, True, self.now())
+        order.hold = hold
+        self.__orders[order.id] = order
+        self.__open[order.id] = order
+        receipt = order.receipt()
+        self.__schedule(self.__arrive, order)
+        return receipt
+
+    def __arrive(self, order):
+        if order.status == CBConst.done:
+            return
+        self.__take(order.product_id, order.side, order.price,
+                    order.remaining, order)
+        if order.live:
+            self.__books[order.product_id].add(order)
+
+    def __cancel(self, order):
+        if order.status != CBConst.done:
+            self.__finish(order, 'canceled')
+
+    def __take(self, product_id, side, limit, size, taker):
+        """Matches an incoming order, ours (`taker`) or another trader's,
+        against the book in price-time priority
+        """
+        book = self.__book(product_id)
+        opposite = CBConst.sell if side == CBConst.buy else CBConst.buy
+        levels = book.levels[opposite]
+        while size > EPSILON:
+            price = book.best(opposite)
+            if price is None or not book.crosses(side, limit, price):
+                return
+            maker = levels[price][0]
+            if taker is not None and maker.owned:
+                # Self-trade prevention: cancel the resting order
+                self.__finish(maker, 'canceled')
+                continue
+            fill = min(size, maker.remaining)
+            size -= fill
+            maker.remaining -= fill
+            if maker.owned:
+                self.__settle(maker, price, fill, self.maker_fee, 'M')
+            elif maker.remaining <= EPSILON:
+                book.remove(maker)
+            if taker is not None:
+                taker.remaining -= fill
+                self.__settle(taker, price, fill, self.taker_fee, 'T')
+            if taker is not None:
+                self.__trade(product_id, price, fill)
+
+    def __trade(self, product_id, price, size):
+        """Appends a print to the trade history and the running volume"""
+        when = self.now()
+        self.__trades[product_id].append((when, price, size))
+        self.__trade_times[product_id].append(when)
+        self.__volume[product_id] += size
+
+    def __settle(self, order, price, size, rate, liquidity):
+        """Books one fill of our order in its accounts and releases the
+        matching part of its hold
+        """
+        base, quote = order.product_id.split('-')
+        value = price * size
+        fee = value * rate
+        base_account = self.__accounts[base]
+        quote_account = self.__accounts[quote]
+        if order.side == CBConst.buy:
+            release = order.price * size * (1.0 + self.taker_fee)
+            quote_account[CBConst.balance] -= value + fee
+            quote_account[CBConst.hold] -= release
+            base_account[CBConst.balance] += size
+        else:
+            release = size
+            base_account[CBConst.balance] -= size
+            base_account[CBConst.hold] -= size
+            quote_account[CBConst.balance] += value - fee
+        order.hold -= release
+        order.filled_size += size
+        order.executed_value += value
+        order.fill_fees += fee
+        self.__fills.append({
+            CBConst.trade_id: next(self.__trade_ids),
+            CBConst.product_id: order.product_id,
+            CBConst.order_id: order.id,
+            CBConst.price: '{:.8f}'.format(price),
+            CBConst.size: '{:.8f}'.format(size),
+            CBConst.fee: '{:.16f}'.format(fee),
+            CBConst.side: order.side,
+            CBConst.liquidity: liquidity,
+            CBConst.created_at: _iso(self.now()),
+            CBConst.settled: True
+        })
+        if order.remaining <= EPSILON:
+            self.__finish(order, 'filled')
+
+    def __finish(self, order, reason):
+        """Marks an order done, takes it off the book and releases whatever
+        it still holds
+        """
+        if order.status == CBConst.open_:
+            self.__books[order.product_id].remove(order)
+        base, quote = order.product_id.split('-')
+        currency = quote if order.side == CBConst.buy else base
+        account = self.__accounts[currency]
+        account[CBConst.hold] -= order.hold
+        if len(self.__open) <= 1:
+            # Nothing else is held, drop the rounding left over
+            account[CBConst.hold] = 0.0
+        order.hold = 0.0
+        order.status = CBConst.done
+        order.done_reason = reason
+        self.__open.pop(order.id, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
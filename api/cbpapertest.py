@@ -0,0 +1,220 @@
+import unittest
+
+from api.cbpaper import PaperCoinbase
+from api.coinbase import exceptions as cbex
+from api.coinbase.constants import CBConst
+
+
+def snapshot(bids, asks, product_id='BTC-USD'):
+    return {
+        'type': 'snapshot',
+        'product_id': product_id,
+        'bids': [[str(p), str(s)] for p, s in bids],
+        'asks': [[str(p), str(s)] for p, s in asks]
+    }
+
+
+def match(price, size, side, when=None, product_id='BTC-USD'):
+    message = {
+        'type': 'match',
+        'product_id': product_id,
+        'price': str(price),
+        'size': str(size),
+        'side': side
+    }
+    if when is not None:
+        message['time'] = when
+    return message
+
+
+class TestPaperCoinbase(unittest.TestCase):
+    def setUp(self):
+        self.ex = PaperCoinbase(balances={'USD': 10000, 'BTC': 10},
+                                maker_fee=0.001,
+                                taker_fee=0.002)
+        self.ex.feed(snapshot([(99, 2), (98, 5)], [(101, 1), (102, 3)]))
+
+    def balances(self):
+        return {k: float(v) for k, v in self.ex.balance().items()}
+
+    def test_taker_walks_book(self):
+        receipt = self.ex.buy(1.5, 'BTC-USD', 102)
+        self.assertEqual(receipt[CBConst.status], CBConst.pending)
+        order = self.ex.order(receipt[CBConst.id_])
+        self.assertEqual(order[CBConst.status], CBConst.done)
+        self.assertEqual(order[CBConst.done_reason], 'filled')
+        value = 101 + 0.5 * 102
+        self.assertAlmostEqual(float(order[CBConst.executed_value]), value)
+        self.assertAlmostEqual(float(order[CBConst.fill_fees]), value * 0.002)
+        balances = self.balances()
+        self.assertAlmostEqual(balances['BTC'], 11.5)
+        self.assertAlmostEqual(balances['USD'], 10000 - value * 1.002)
+        book = self.ex.order_book('BTC-USD', 2)
+        self.assertEqual(book[CBConst.asks][0][:2], ['102.00000000',
+                                                     '2.50000000'])
+        fills = self.ex.fills(receipt[CBConst.id_])
+        self.assertEqual([f[CBConst.liquidity] for f in fills], ['T', 'T'])
+
+    def test_resting_order_holds_and_price_time_priority(self):
+        receipt = self.ex.buy(1, 'BTC-USD', 99)
+        order_id = receipt[CBConst.id_]
+        usd = self.ex.accounts()[1]
+        self.assertEqual(usd[CBConst.currency], 'USD')
+        self.assertAlmostEqual(float(usd[CBConst.hold]), 99 * 1.002)
+        self.assertEqual(len(self.ex.holds()), 1)
+        self.assertEqual([o[CBConst.id_] for o in self.ex.orders()],
+                         [order_id])
+
+        # The 2 resting ahead of us trade first
+        self.ex.feed(match(99, 2, CBConst.buy))
+        self.assertEqual(float(self.ex.order(order_id)[CBConst.filled_size]),
+                         0)
+        self.ex.feed(match(99, 0.4, CBConst.buy))
+        order = self.ex.order(order_id)
+        self.assertAlmostEqual(float(order[CBConst.filled_size]), 0.4)
+        self.assertEqual(order[CBConst.status], CBConst.open_)
+        self.assertEqual(self.ex.fills(order_id)[0][CBConst.liquidity], 'M')
+
+        self.ex.cancel_order(order_id)
+        order = self.ex.order(order_id)
+        self.assertEqual(order[CBConst.done_reason], 'canceled')
+        balances = self.balances()
+        self.assertAlmostEqual(balances['BTC'], 10.4)
+        self.assertAlmostEqual(balances['USD'], 10000 - 0.4 * 99 * 1.001)
+        self.assertEqual(float(self.ex.accounts()[1][CBConst.hold]), 0)
+        self.assertEqual(self.ex.orders(), [])
+        with self.assertRaises(cbex.InvalidOrder):
+            self.ex.cancel_order(order_id)
+
+    def test_l2update_keeps_queue_position(self):
+        receipt = self.ex.sell(1, 'BTC-USD', 101)
+        self.ex.feed({
+            'type': 'l2update',
+            'product_id': 'BTC-USD',
+            'changes': [['sell', '101', '0.5'], ['sell', '102', '0']]
+        })
+        book = self.ex.order_book('BTC-USD', 3)
+        self.assertEqual(book[CBConst.asks], [['101.00000000', '1.50000000',
+                                               2]])
+        self.ex.feed(match(101, 1, CBConst.sell))
+        order = self.ex.order(receipt[CBConst.id_])
+        self.assertAlmostEqual(float(order[CBConst.filled_size]), 0.5)
+
+    def test_latency(self):
+        ex = PaperCoinbase(balances={'USD': 1000}, latency=0.25)
+        ex.feed(snapshot([(99, 1)], [(101, 1)]))
+        ex.feed({'type': 'heartbeat', 'time': '2020-01-01T00:00:00.000Z'})
+        receipt = ex.buy(1, 'BTC-USD', 101)
+        self.assertEqual(ex.orders()[0][CBConst.status], CBConst.pending)
+        # Someone else takes the liquidity before our order arrives
+        ex.feed(match(101, 1, CBConst.sell, '2020-01-01T00:00:00.100Z'))
+        ex.advance(0.2)
+        order = ex.order(receipt[CBConst.id_])
+        self.assertEqual(order[CBConst.status], CBConst.open_)
+        self.assertEqual(float(order[CBConst.filled_size]), 0)
+        self.assertEqual(ex.order_book('BTC-USD')[CBConst.bids][0][0],
+                         '101.00000000')
+
+    def test_self_trade_cancels_resting(self):
+        resting = self.ex.sell(1, 'BTC-USD', 100)[CBConst.id_]
+        self.ex.buy(0.5, 'BTC-USD', 100)
+        self.assertEqual(self.ex.order(resting)[CBConst.done_reason],
+                         'canceled')
+        self.assertEqual(self.ex.fills(), [])
+
+    def test_errors(self):
+        with self.assertRaises(cbex.InsufficientFunds):
+            self.ex.buy(100, 'BTC-USD', 100)
+        with self.assertRaises(cbex.InsufficientFunds):
+            self.ex.sell(11, 'BTC-USD', 100)
+        with self.assertRaises(cbex.InvalidPrice):
+            self.ex.buy(1, 'BTC-USD', 0)
+        with self.assertRaises(cbex.InvalidSize):
+            self.ex.sell(-1, 'BTC-USD', 100)
+        with self.assertRaises(cbex.InvalidSymbol):
+            self.ex.buy(1, 'DOGE-USD', 1)
+        with self.assertRaises(cbex.InvalidOrder):
+            self.ex.cancel_order('missing')
+
+    def test_market_data(self):
+        for i, price in enumerate((101, 102, 101.5)):
+            self.ex.feed(match(price, 0.1, CBConst.sell, 60.0 * i + 5))
+        candles = self.ex.candles('BTC-USD', 0, 120, 60)
+        self.assertEqual([c[0] for c in candles], [120, 60, 0])
+        self.assertEqual(candles[-1], [0, 101.0, 101.0, 101.0, 101.0, 0.1])
+        # An unaligned start keeps the whole bucket it falls in
+        self.assertEqual(self.ex.candles('BTC-USD', 30, 90, 60), candles[1:])
+        self.assertEqual(self.ex.candles('BTC-USD', 1000, 2000, 60), [])
+        ticker = self.ex.ticker('BTC-USD')
+        self.assertEqual(ticker[CBConst.price], '101.5')
+        self.assertEqual(ticker['bid'], '99.0')
+        self.assertAlmostEqual(float(ticker[CBConst.volume]), 0.3)
+        self.ex.buy(0.5, 'BTC-USD', 101)
+        self.assertAlmostEqual(
+            float(self.ex.ticker('BTC-USD')[CBConst.volume]), 0.8)
+        self.assertIn('BTC-USD', self.ex.valid_product_ids())
+        self.assertIn(60, self.ex.available_granularity())
+
+    def test_canceled_and_removed_orders_leave_the_book(self):
+        ex = PaperCoinbase(balances={'USD': 1e9})
+        for i in range(2000):
+            order_id = ex.buy(0.01, 'BTC-USD', 100 - i % 500 * 0.01)[
+                CBConst.id_]
+            ex.cancel_order(order_id)
+        book = ex.book('BTC-USD')
+        self.assertEqual(len(book), 0)
+        self.assertEqual(book.levels[CBConst.buy], {})
+
+        for i in range(20000):
+            price = str(200 + i % 5000 * 0.01)
+            for size in ('1', '0'):
+                ex.feed({
+                    'type': 'l2update',
+                    'product_id': 'BTC-USD',
+                    'changes': [['sell', price, size]]
+                })
+        self.assertEqual(len(book), 0)
+        self.assertLessEqual(len(book.heaps[CBConst.sell]), 64)
+        self.assertEqual(ex.order_book('BTC-USD')[CBConst.asks], [])
+
+    def test_orders_by_status(self):
+        filled = self.ex.buy(0.5, 'BTC-USD', 101)[CBConst.id_]
+        first = self.ex.buy(0.1, 'BTC-USD', 90)[CBConst.id_]
+        second = self.ex.sell(0.1, 'BTC-USD', 110)[CBConst.id_]
+        self.assertEqual([o[CBConst.id_] for o in self.ex.orders()],
+                         [second, first])
+        self.assertEqual(
+            [o[CBConst.id_] for o in self.ex.orders(CBConst.done)], [filled])
+        self.assertEqual(
+            [o[CBConst.id_] for o in self.ex.orders('all', 'BTC-USD')],
+            [second, first, filled])
+
+    def test_order_book_levels(self):
+        self.ex.buy(1, 'BTC-USD', 99)
+        book = self.ex.order_book('BTC-USD', 1)
+        self.assertEqual(book[CBConst.bids], [['99.00000000', '3.00000000',
+                                               2]])
+        self.assertEqual(len(self.ex.order_book('BTC-USD', 2)[CBConst.asks]),
+                         2)
+
+    def test_many_orders(self):
+        ex = PaperCoinbase(balances={'USD': 1e9, 'BTC': 1e6})
+        count = 5000
+        for i in range(count):
+            price = 100 + (i % 50) * 0.01
+            if i % 2:
+                ex.sell(0.01, 'BTC-USD', price + 0.3)
+            else:
+                ex.buy(0.01, 'BTC-USD', price)
+            if i % 3 == 0:
+                ex.feed(match(price + 0.2, 0.05, CBConst.sell))
+        self.assertEqual(len(ex.orders('all')), count)
+        live = ex.orders()
+        # Every live order rests in the book, and nothing else does
+        self.assertEqual(len(ex.book('BTC-USD')), len(live))
+        for account in ex.accounts():
+            self.assertGreaterEqual(float(account[CBConst.available]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,10 +11,12 @@ class CBConst():
         pass
 
     account_address = "account_address"
+    account_id = "account_id"
     account_name = "account_name"
     account_number = "account_number"
     accounts = "accounts"
     activate = "activate"
+    active = "active"
     allow_buy = "allow_buy"
     allow_deposit = "allow_deposit"
     allow_sell = "allow_sell"
@@ -106,6 +108,7 @@ class CBConst():
     iso = "iso"
     key = "key"
     l2update = "l2update"
+    last_match = "last_match"
     last_size = "last_size"
     last_trade_id = "last_trade_id"
     ledger = "ledger"
@@ -119,6 +122,7 @@ class CBConst():
     ltc = "LTC"
     ltc_usd = "LTC-USD"
     margin_call = "margin_call"
+    maker_fee_rate = "maker_fee_rate"
     maker_order_id = "maker_order_id"
     margin_account_id = "margin_account_id"
     margin_product_id = "margin_product_id"
@@ -206,6 +210,7 @@ class CBConst():
     total = "total"
     trade_id = "trade_id"
     trades = "trades"
+    trading_enabled = "trading_enabled"
     two_factor_code = "two_factor_code"
     type_ = "type"
     unsubscribe = "unsubscribe"
@@ -26,3 +26,9 @@ class Exchange(abc.ABC):
     @abc.abstractmethod
     def valid_product_ids(self):
         pass
+
+    def max_candles(self):
+        """The maximum number of candles a single `candles` request may
+        span. Override this for exchanges with a different limit.
+        """
+        return 300
@@ -1,5 +1,5 @@
 import pprint
-from collections import Iterable
+from collections.abc import Iterable
 
 
 class Candle(Iterable):
@@ -0,0 +1,97 @@
+from math import ceil
+
+from .granularity import Granularity
+
+
+class FetchPlan:
+    """How to obtain candles at a target resolution over a time range.
+
+    Attributes:
+    target -- the requested resolution in seconds
+    granularity -- the exchange granularity to download
+    resample -- True if `granularity` must be resampled into `target`
+    start, end -- the range, aligned to the `target` buckets
+    candles -- the number of candles downloaded
+    requests -- the number of `Exchange.candles` calls
+    seconds -- the estimated wall-clock time under the rate limit
+    """
+    def __init__(self, target, granularity, start, end, requests, seconds):
+        self.target = target
+        self.granularity = granularity
+        self.resample = granularity != target
+        self.start = start
+        self.end = end
+        self.candles = (end - start) // granularity
+        self.requests = requests
+        self.seconds = seconds
+
+    def __repr__(self):
+        return 'FetchPlan(target={}, granularity={}, resample={}, ' \
+            'requests={}, seconds={:.1f})'.format(
+                self.target, self.granularity, self.resample, self.requests,
+                self.seconds)
+
+
+def estimate_seconds(requests, rate, burst=0, latency=0.0, workers=1):
+    """Estimates how long `requests` take under a token bucket rate limit.
+
+    Keyword arguments:
+    requests -- number of requests
+    rate -- requests per second allowed by the exchange
+    burst -- requests that may be sent before the rate applies
+    latency -- average round-trip time of a single request
+    workers -- requests in flight at once
+    """
+    limited = max(0.0, (requests - burst) / float(rate))
+    return max(limited, requests * latency / max(1, workers))
+
+
+def plan_fetch(target,
+               start,
+               end,
+               granularity: Granularity,
+               max_candles=300,
+               rate=3.0,
+               burst=0,
+               latency=0.0,
+               workers=1,
+               origin=0) -> list:
+    """Plans the cheapest way to get `target` resolution candles.
+
+    Every supported granularity that evenly divides `target` is a candidate:
+    fetching it directly (when it equals `target`) or resampling it locally.
+    Candidates are returned cheapest first, so the first plan minimises the
+    total number of requests. Nothing is sent to the exchange.
+
+    Keyword arguments:
+    target -- the wanted resolution in seconds
+    start -- seconds since epoch
+    end -- seconds since epoch (exclusive)
+    granularity -- the exchange's Granularity
+    max_candles -- the exchange's candle limit per request
+    rate, burst, latency, workers -- see `estimate_seconds`
+    origin -- `target` buckets start at `origin + k * target`, e.g.
+              `data.resample.default_origin(target)` for Monday weeks
+
+    Returns:
+    [FetchPlan, ...]
+
+    Raises:
+    ValueError -- if no supported granularity divides `target`
+    """
+    target = int(target)
+    candidates = granularity.divisors(target)
+    if not candidates:
+        raise ValueError('no granularity in {} divides {}'.format(
+            granularity, target))
+
+    _start = int(start) - (int(start) - origin) % target
+    _end = int(end) + (origin - int(end)) % target
+    plans = []
+    for _granularity in candidates:
+        buckets = (_end - _start) // _granularity
+        requests = int(ceil(buckets / float(max_candles)))
+        seconds = estimate_seconds(requests, rate, burst, latency, workers)
+        plans.append(
+            FetchPlan(target, _granularity, _start, _end, requests, seconds))
+    return sorted(plans, key=lambda plan: (plan.requests, plan.resample))
@@ -0,0 +1,61 @@
+import unittest
+
+from api.exchange.fetchplan import estimate_seconds
+from api.exchange.fetchplan import plan_fetch
+from api.exchange.granularity import Granularity
+
+DAY = 86400
+YEAR = 365 * DAY
+
+
+class TestFetchPlan(unittest.TestCase):
+    def setUp(self):
+        self.granularity = Granularity((60, 300, 900, 3600, 21600, 86400))
+
+    def test_iteration_restarts(self):
+        self.assertEqual(list(self.granularity), self.granularity.values)
+        self.assertEqual(list(self.granularity), self.granularity.values)
+
+    def test_divisors(self):
+        self.assertEqual(self.granularity.divisors(14400),
+                         [3600, 900, 300, 60])
+        self.assertEqual(self.granularity.divisors(90), [])
+
+    def test_native_granularity_is_cheapest(self):
+        best = plan_fetch(3600, 0, YEAR, self.granularity)[0]
+        self.assertEqual(best.granularity, 3600)
+        self.assertFalse(best.resample)
+        self.assertEqual(best.requests, 30)  # 8760 candles / 300
+
+    def test_resampled_granularity(self):
+        best = plan_fetch(4 * 3600, 0, YEAR, self.granularity)[0]
+        self.assertEqual(best.granularity, 3600)
+        self.assertTrue(best.resample)
+
+        weekly = plan_fetch(7 * DAY, 0, YEAR, self.granularity)[0]
+        self.assertEqual(weekly.granularity, DAY)
+        self.assertEqual(weekly.requests, 2)
+
+    def test_plans_are_sorted_by_requests(self):
+        plans = plan_fetch(3600, 0, YEAR, self.granularity)
+        requests = [p.requests for p in plans]
+        self.assertEqual(requests, sorted(requests))
+        self.assertEqual(len(plans), 4)
+
+    def test_range_is_aligned_to_target(self):
+        best = plan_fetch(3600, 100, 7200, self.granularity)[0]
+        self.assertEqual((best.start, best.end), (0, 7200))
+
+    def test_no_divisor(self):
+        with self.assertRaises(ValueError):
+            plan_fetch(90, 0, DAY, self.granularity)
+
+    def test_estimate_seconds(self):
+        self.assertEqual(estimate_seconds(30, 3, burst=6), 8.0)
+        self.assertEqual(estimate_seconds(3, 3, burst=6), 0.0)
+        self.assertEqual(estimate_seconds(10, 100, latency=0.5, workers=2),
+                         2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
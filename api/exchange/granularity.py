@@ -23,6 +23,13 @@ class Granularity:
     def max(self):
         return max(self.values)
 
+    def divisors(self, target: int) -> list:
+        """Returns the granularities that evenly divide `target`, coarsest
+        first. Any of them can be resampled locally into `target`.
+        """
+        return sorted((g for g in self.values if target % g == 0),
+                      reverse=True)
+
     def __contains__(self, member):
         return member in self.values
 
@@ -30,13 +37,14 @@ class Granularity:
         return len(self.values)
 
     def __iter__(self):
+        self.__index = 0
         return self
 
     def __next__(self):
-        if self.__index == len(self.values):
+        if self.__index >= len(self.values):
             raise StopIteration
         self.__index = self.__index + 1
-        return self.values[self.__index]
+        return self.values[self.__index - 1]
 
     def __str__(self):
         return str(self.values)
@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """A thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `burst`. Every
+    call to acquire() takes one token, blocking until one is available, so
+    any number of threads sharing a RateLimiter stay under the rate limit
+    together.
+    """
+    def __init__(self, rate: float, burst: int = None):
+        """A thread-safe token bucket
+
+        Keyword arguments:
+        rate -- tokens (requests) per second
+        burst -- maximum tokens that can accumulate, defaults to `rate`
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Blocks until `tokens` are available and takes them.
+
+        Returns:
+        the number of seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def estimate(self, requests: int) -> float:
+        """Seconds needed to send `requests` from a full bucket"""
+        return max(0.0, (requests - self.burst) / self.rate)
+
+    def __str__(self):
+        return 'RateLimiter({}/s, burst {})'.format(self.rate, self.burst)
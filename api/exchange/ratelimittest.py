@@ -0,0 +1,53 @@
+import threading
+import time
+import unittest
+
+from api.exchange.ratelimit import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_pacing(self):
+        limiter = RateLimiter(50, burst=5)
+        started = time.monotonic()
+        waits = [limiter.acquire() for _ in range(15)]
+        elapsed = time.monotonic() - started
+        self.assertEqual(waits[:5], [0.0] * 5)
+        self.assertTrue(all(w > 0 for w in waits[5:]))
+        # 10 tokens beyond the burst at 50 per second
+        self.assertGreaterEqual(elapsed, 0.18)
+        self.assertLess(elapsed, 0.5)
+        self.assertAlmostEqual(limiter.waited, sum(waits))
+
+    def test_refills_up_to_burst(self):
+        limiter = RateLimiter(100, burst=2)
+        limiter.acquire(2)
+        time.sleep(0.1)
+        # Ten tokens worth of time passed, but only two are kept
+        self.assertEqual(limiter.acquire(2), 0.0)
+        self.assertGreater(limiter.acquire(), 0.0)
+
+    def test_shared_between_threads(self):
+        limiter = RateLimiter(100, burst=1)
+
+        def work():
+            for _ in range(5):
+                limiter.acquire()
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 20 requests at 100 per second, together
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_estimate(self):
+        limiter = RateLimiter(3, burst=6)
+        self.assertEqual(limiter.estimate(6), 0.0)
+        self.assertEqual(limiter.estimate(36), 10.0)
+        self.assertEqual(RateLimiter(4).burst, 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
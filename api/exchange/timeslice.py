@@ -1,13 +1,84 @@
 import time
+import warnings
+from functools import lru_cache
 from time import mktime
 from datetime import timedelta
 from datetime import datetime
 from math import ceil
 from dateutil import parser
 
+import numpy as np
+
+_DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_DIGITS = frozenset('0123456789')
+
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    """Days since 1970-01-01 of a proleptic Gregorian date"""
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _fast_iso(value: str):
+    """Parses `YYYY-MM-DD[T ]HH:MM[:SS[.ffffff]][Z|+HH:MM|-HH:MM]`.
+
+    Returns:
+    (seconds since epoch of the wall time, utc offset in seconds or None)
+    or None if the string does not have the fixed format
+    """
+    n = len(value)
+    if n < 16 or value[4] != '-' or value[7] != '-' or \
+            value[10] not in 'T ' or value[13] != ':':
+        return None
+    fields = value[0:4] + value[5:7] + value[8:10] + value[11:13] + \
+        value[14:16]
+    if not _DIGITS.issuperset(fields):
+        return None
+    year, month, day = int(value[0:4]), int(value[5:7]), int(value[8:10])
+    hour, minute, second = int(value[11:13]), int(value[14:16]), 0
+
+    i = 16
+    if n > i and value[i] == ':':
+        if n < 19 or not _DIGITS.issuperset(value[17:19]):
+            return None
+        second = int(value[17:19])
+        i = 19
+        if n > i and value[i] == '.':
+            i += 1
+            while i < n and value[i] in _DIGITS:
+                i += 1
+
+    offset = None
+    if i < n:
+        tz = value[i:]
+        if tz == 'Z':
+            offset = 0
+        elif len(tz) == 6 and tz[0] in '+-' and tz[3] == ':' and \
+                _DIGITS.issuperset(tz[1:3] + tz[4:6]):
+            offset = (int(tz[1:3]) * 3600 + int(tz[4:6]) * 60) * \
+                (1 if tz[0] == '+' else -1)
+        else:
+            return None
+
+    leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    errors = [(not 1 <= month <= 12), (day < 1),
+              (month in range(1, 13) and day > _DAYS_IN_MONTH[month]),
+              (month == 2 and day == 29 and not leap), (hour > 23),
+              (minute > 59), (second > 59)]
+    if any(errors):
+        return None
+    wall = _days_from_civil(year, month, day) * 86400 + \
+        hour * 3600 + minute * 60 + second
+    return wall, offset
+
 
 class TimeSlice:
-    """TimeSlice is a utility for standardizing timestamps accross the codebase.
+    """TimeSlice is a utility for standardizing timestamps accross the
+    codebase.
 
     The end goal is to work exclusively with datetime objects, but to be
     able to convert back and forth with ISO 8601 and seconds seamlessly.
@@ -54,11 +125,11 @@ class TimeSlice:
         """
         if end:
             try:
-                _start = parser.parse(start)
-                _end = parser.parse(end)
+                _start = TimeSlice.__parse_datetime(start)
+                _end = TimeSlice.__parse_datetime(end)
             except Exception as err:
                 msg = 'attempting to parse {} and {}\n{}'.format(
-                    _start, _end, err)
+                    start, end, err)
                 raise Exception(msg)
 
             if seconds:
@@ -66,8 +137,21 @@ class TimeSlice:
             return _start, _end
 
         if seconds:
-            return mktime(parser.parse(start).timetuple())
-        return parser.parse(start)
+            return mktime(TimeSlice.__parse_datetime(start).timetuple())
+        return TimeSlice.__parse_datetime(start)
+
+    @staticmethod
+    def __parse_datetime(value: str) -> datetime:
+        """Parses naive fixed-format ISO 8601 strings without dateutil.
+        Fractional seconds and utc offsets go through dateutil, which
+        keeps them.
+        """
+        if not isinstance(value, str):
+            raise TypeError('expected str, got {}'.format(type(value)))
+        parsed = _fast_iso(value)
+        if parsed is None or parsed[1] is not None or '.' in value:
+            return parser.parse(value)
+        return datetime.utcfromtimestamp(parsed[0])
 
     @staticmethod
     def convert_seconds(start: float,
@@ -101,7 +185,8 @@ class TimeSlice:
     def time_slice(start: datetime,
                    end: datetime,
                    granularity: int,
-                   iso8601: bool = False) -> list:
+                   iso8601: bool = False,
+                   max_candles: int = 300) -> list:
         """Returns a list whose elements are pairs (slices) of datetime deltas.
         Ex: `[[datetime1, datetime2], [datetime3, datetime4], ...]`
 
@@ -119,6 +204,7 @@ class TimeSlice:
         end -- a datetime.datetime object
         granularity -- an integer representing granularity in seconds
         iso8601 -- True to return iso8601 formated string rather than datetime
+        max_candles -- the Exchange's candle limit, see `Exchange.max_candles`
 
         Returns:
         [[datetime,datetime], ...]  or...
@@ -131,7 +217,7 @@ class TimeSlice:
                 start, end, granularity))
 
         delta = (end - start)
-        slice_size = granularity * 300
+        slice_size = granularity * max_candles
         slice_count = int(ceil(delta.total_seconds() / slice_size))
         slice_delta = timedelta(seconds=slice_size)
         slices = []
@@ -149,3 +235,133 @@ class TimeSlice:
             _start = _end
 
         return slices
+
+    @staticmethod
+    def iter_slices(start: datetime,
+                    end: datetime,
+                    granularity: int,
+                    iso8601: bool = False,
+                    max_candles: int = 300):
+        """Lazily yields request windows aligned to granularity boundaries.
+
+        Unlike `time_slice`, nothing is built up front, and every window is
+        an inclusive pair `(first, last)` of bucket start times: `first` is
+        a multiple of `granularity` and `last` is at most
+        `first + (max_candles - 1) * granularity`. The next window starts
+        one bucket after `last`, so windows never overlap and no candle is
+        returned twice. Naive datetimes are treated as UTC.
+
+        Keyword arguments:
+        start -- a datetime.datetime object
+        end -- a datetime.datetime object (exclusive)
+        granularity -- an integer representing granularity in seconds
+        iso8601 -- True to yield iso8601 formated strings rather than datetime
+        max_candles -- the Exchange's candle limit, see `Exchange.max_candles`
+
+        Yields:
+        (datetime, datetime)  or...
+        (str, str)
+        """
+        for first, last in TimeSlice.epoch_slices(start, end, granularity,
+                                                  max_candles).tolist():
+            if iso8601:
+                yield TimeSlice.format_iso(first), TimeSlice.format_iso(last)
+            else:
+                yield datetime.utcfromtimestamp(
+                    first), datetime.utcfromtimestamp(last)
+
+    @staticmethod
+    def epoch_slices(start, end, granularity: int,
+                     max_candles: int = 300) -> np.ndarray:
+        """Returns aligned request windows as an (n, 2) int64 array of
+        inclusive `[first, last]` bucket start times in seconds since epoch.
+
+        See `iter_slices` for the alignment rules.
+
+        Keyword arguments:
+        start -- a datetime.datetime object or seconds since epoch
+        end -- a datetime.datetime object or seconds since epoch (exclusive)
+        granularity -- an integer representing granularity in seconds
+        max_candles -- the Exchange's candle limit, see `Exchange.max_candles`
+        """
+        _start, _end = TimeSlice.to_epoch(start), TimeSlice.to_epoch(end)
+        if _start > _end or granularity <= 0 or max_candles <= 0:
+            raise Exception('start: {}, end: {}, granularity: {}'.format(
+                start, end, granularity))
+
+        granularity = int(granularity)
+        first = _start - _start % granularity
+        last = -(-_end // granularity) * granularity - granularity
+        window = granularity * max_candles
+        starts = np.arange(first, last + 1, window, dtype=np.int64)
+        ends = np.minimum(starts + window - granularity, last)
+        return np.stack([starts, ends], axis=1)
+
+    @staticmethod
+    def to_epoch(value) -> int:
+        """Converts a datetime, ISO 8601 string or number into integer
+        seconds since epoch (UTC). Naive datetimes and strings without an
+        offset are treated as UTC, which is how Coinbase reads them.
+        """
+        if isinstance(value, str):
+            return TimeSlice.parse_iso(value)
+        if isinstance(value, datetime):
+            seconds = (value.toordinal() - 719163) * 86400 + \
+                value.hour * 3600 + value.minute * 60 + value.second
+            offset = value.utcoffset()
+            if offset is not None:
+                seconds -= int(offset.total_seconds())
+            return seconds
+        return int(value)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse_iso(value: str) -> int:
+        """Parses an ISO 8601 string into integer seconds since epoch (UTC).
+
+        Fixed-format timestamps such as `2019-01-01T00:00:00`,
+        `2019-01-01T00:00:00.123Z` or `2019-01-01 00:00:00+02:00` take a
+        fast path; anything else falls back to dateutil. Results are
+        memoized, since the same window boundaries are parsed repeatedly.
+        """
+        parsed = _fast_iso(value)
+        if parsed is None:
+            return TimeSlice.to_epoch(parser.parse(value))
+        wall, offset = parsed
+        return wall - (offset or 0)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def format_iso(seconds: int) -> str:
+        """Formats integer seconds since epoch as `YYYY-MM-DDTHH:MM:SS` (UTC)
+        """
+        return '%04d-%02d-%02dT%02d:%02d:%02d' % time.gmtime(seconds)[:6]
+
+    @staticmethod
+    def to_epochs(values) -> np.ndarray:
+        """Vectorized `to_epoch` for arrays of datetimes or ISO 8601 strings.
+
+        Returns:
+        an int64 array of seconds since epoch (UTC)
+        """
+        values = np.asarray(values)
+        if values.dtype.kind in 'iuf':
+            return values.astype(np.int64)
+        if values.dtype.kind == 'M':
+            return values.astype('datetime64[s]').astype(np.int64)
+        try:
+            with warnings.catch_warnings():
+                # numpy only warns about offsets, so take the slow path
+                warnings.simplefilter('error')
+                return values.astype('datetime64[s]').astype(np.int64)
+        except (ValueError, TypeError, UserWarning, DeprecationWarning):
+            pass
+        return np.fromiter((TimeSlice.to_epoch(v) for v in values.ravel()),
+                           dtype=np.int64,
+                           count=values.size).reshape(values.shape)
+
+    @staticmethod
+    def to_isos(seconds) -> np.ndarray:
+        """Vectorized `format_iso` for an array of seconds since epoch"""
+        return np.asarray(seconds, dtype=np.int64).astype(
+            'datetime64[s]').astype(str)
@@ -1,5 +1,7 @@
 import unittest
 from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 from timeslice import TimeSlice
 
 
@@ -139,6 +141,98 @@ class TestTimeSlice(unittest.TestCase):
         self.assertEqual(ts_list[210],
                          ['2029-12-24T20:00:00', '2030-01-01T00:00:00'])
 
+        # Custom candle limit
+        ts_list = ts.time_slice(start, end, granularity, max_candles=600)
+        self.assertEqual(len(ts_list), 106)
+
+    def test_iter_slices(self):
+        ts = TimeSlice()
+        start = datetime(2020, 1, 1, 0, 0, 30)
+        end = datetime(2020, 1, 1, 0, 10)
+
+        slices = ts.iter_slices(start, end, 60, max_candles=4)
+        self.assertFalse(isinstance(slices, list))
+        self.assertEqual(next(slices), (datetime(2020, 1, 1, 0, 0),
+                                        datetime(2020, 1, 1, 0, 3)))
+        self.assertEqual(list(slices),
+                         [(datetime(2020, 1, 1, 0, 4),
+                           datetime(2020, 1, 1, 0, 7)),
+                          (datetime(2020, 1, 1, 0, 8),
+                           datetime(2020, 1, 1, 0, 9))])
+
+        slices = list(ts.iter_slices(start, end, 60, True, 4))
+        self.assertEqual(slices[0],
+                         ('2020-01-01T00:00:00', '2020-01-01T00:03:00'))
+
+    def test_epoch_slices(self):
+        ts = TimeSlice()
+        windows = ts.epoch_slices(10, 36000, 3600, 4)
+        self.assertEqual(windows.tolist(),
+                         [[0, 10800], [14400, 25200], [28800, 32400]])
+
+        # Ten years of one minute candles without building any datetimes
+        windows = ts.epoch_slices(datetime(2010, 1, 1), datetime(2020, 1, 1),
+                                  60)
+        self.assertEqual(len(windows), 17530)
+        self.assertTrue(((windows[1:, 0] - windows[:-1, 1]) == 60).all())
+
+        with self.assertRaises(Exception):
+            ts.epoch_slices(100, 0, 60)
+
+    def test_parse_iso(self):
+        ts = TimeSlice()
+        self.assertEqual(ts.parse_iso('2020-01-01T00:00:00'), 1577836800)
+        self.assertEqual(ts.parse_iso('2020-01-01T00:00:00.250Z'),
+                         1577836800)
+        self.assertEqual(ts.parse_iso('2020-01-01 02:00:00+02:00'),
+                         1577836800)
+        self.assertEqual(ts.parse_iso('2020-02-29T12:30'), 1582979400)
+
+        # Odd formats fall back to dateutil
+        self.assertEqual(ts.parse_iso('2020-01-01'), 1577836800)
+        self.assertEqual(ts.parse_iso('Jan 1 2020'), 1577836800)
+
+        with self.assertRaises(ValueError):
+            ts.parse_iso('2019-02-29T00:00:00')
+
+        with self.assertRaises(ValueError):
+            ts.parse_iso('random string')
+
+    def test_sub_second_iso_str(self):
+        ts = TimeSlice()
+        self.assertEqual(ts.convert_iso_str('2019-01-01T00:00:00.5'),
+                         datetime(2019, 1, 1, 0, 0, 0, 500000))
+        self.assertEqual(ts.convert_iso_str('2019-01-01 12:30:01.000250'),
+                         datetime(2019, 1, 1, 12, 30, 1, 250))
+        self.assertEqual(ts.convert_iso_str('2019-01-01T00:00:07'),
+                         datetime(2019, 1, 1, 0, 0, 7))
+
+    def test_to_epoch(self):
+        ts = TimeSlice()
+        self.assertEqual(ts.to_epoch(datetime(2020, 1, 1)), 1577836800)
+        self.assertEqual(
+            ts.to_epoch(datetime(2020, 1, 1, 2,
+                                 tzinfo=timezone(timedelta(hours=2)))),
+            1577836800)
+        self.assertEqual(ts.to_epoch('2020-01-01T00:00:00'), 1577836800)
+        self.assertEqual(ts.to_epoch(1577836800.0), 1577836800)
+        self.assertEqual(ts.format_iso(1577836800), '2020-01-01T00:00:00')
+
+    def test_vectorized(self):
+        ts = TimeSlice()
+        epochs = ts.to_epochs(['2020-01-01T00:00:00', '2020-01-01T00:01:00'])
+        self.assertEqual(epochs.tolist(), [1577836800, 1577836860])
+
+        epochs = ts.to_epochs(['2020-01-01T00:00:00Z', 'Jan 1 2020'])
+        self.assertEqual(epochs.tolist(), [1577836800, 1577836800])
+
+        epochs = ts.to_epochs([datetime(2020, 1, 1), datetime(2030, 1, 1)])
+        self.assertEqual(epochs.tolist(), [1577836800, 1893456000])
+
+        isos = ts.to_isos([1577836800, 1893456000])
+        self.assertEqual(isos.tolist(),
+                         ['2020-01-01T00:00:00', '2030-01-01T00:00:00'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,5 @@
+__author__ = 'Rob R'
+__version__ = "0.1.0"
+__maintainer__ = "Rob R"
+__email__ = "robertris2@gmail.com"
+__status__ = "Prototype"
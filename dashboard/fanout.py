@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+""" Fans real-time market updates out to many dashboard clients.
+
+Updates (tickers, candles, order books) are published once into a
+FanoutServer and pushed to every subscribed browser over Server-Sent
+Events:
+
+    GET /stream?topics=ticker:BTC-USD,candles:BTC-USD:60
+
+Every update is serialized to its SSE frame exactly once, and all
+subscribers share that bytes object. A subscriber keeps at most the
+latest pending frame per topic: a client that falls behind skips straight
+to the newest value instead of growing an unbounded queue, and the
+skipped frames are counted as conflated.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from api.coinbase.exceptions import ExchangeError
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+HEADERS = (b'HTTP/1.1 200 OK\r\n'
+           b'Content-Type: text/event-stream\r\n'
+           b'Cache-Control: no-cache\r\n'
+           b'Connection: keep-alive\r\n'
+           b'Access-Control-Allow-Origin: *\r\n\r\n')
+HEARTBEAT = b': heartbeat\n\n'
+BAD_REQUEST = b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n'
+NOT_FOUND = b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n'
+
+
+def sse_frame(topic, payload, event_id=None) -> bytes:
+    """Serializes one update as a Server-Sent Events frame"""
+    data = payload if isinstance(payload, str) else json.dumps(
+        payload, separators=(',', ':'))
+    lines = ['event: {}'.format(topic)]
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.extend('data: {}'.format(line) for line in data.split('\n'))
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+class Subscriber:
+    """One connected client with at most one pending frame per topic"""
+    def __init__(self, topics):
+        self.topics = set(topics)
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.conflated = 0
+        self.connected = time.time()
+
+    def offer(self, topic, frame):
+        """Queues `frame`, replacing an older frame of the same topic that
+        has not been sent yet
+        """
+        if topic in self.pending:
+            self.conflated += 1
+        self.pending[topic] = frame
+        self.ready.set()
+
+    def take(self) -> list:
+        frames, self.pending = list(self.pending.values()), {}
+        self.ready.clear()
+        return frames
+
+
+class FanoutServer:
+    """An asyncio Server-Sent Events server for market updates.
+
+    `publish` must be called from the server's event loop; other threads,
+    such as a polling MarketData, use `publish_threadsafe`.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, heartbeat=15.0):
+        """An asyncio Server-Sent Events server for market updates
+
+        Keyword arguments:
+        host -- interface to listen on
+        port -- port to listen on, 0 picks a free one
+        heartbeat -- seconds of silence before a keep-alive comment
+        """
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self.latest = {}
+        self.published = 0
+        self._subscribers = {}
+        self._clients = set()
+        self._server = None
+        self._loop = None
+        self._sequence = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self.__handle, self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        event_log.info('fan-out listening on %s:%s', self.host, self.port)
+        return self
+
+    async def stop(self):
+        """Stops listening and disconnects every client"""
+        if self._server is not None:
+            self._server.close()
+            clients = list(self._clients)
+            for task in clients:
+                task.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+            await self._server.wait_closed()
+
+    def publish(self, topic, payload):
+        """Serializes an update once and offers it to every subscriber of
+        `topic`. The latest frame is also replayed to new subscribers.
+        """
+        self._sequence += 1
+        frame = sse_frame(topic, payload, self._sequence)
+        self.latest[topic] = frame
+        self.published += 1
+        for subscriber in self._subscribers.get(topic, ()):
+            subscriber.offer(topic, frame)
+        return frame
+
+    def publish_threadsafe(self, topic, payload):
+        self._loop.call_soon_threadsafe(self.publish, topic, payload)
+
+    def stats(self) -> dict:
+        subscribers = set()
+        for topic_subscribers in self._subscribers.values():
+            subscribers.update(topic_subscribers)
+        return {
+            'subscribers': len(subscribers),
+            'topics': len(self.latest),
+            'published': self.published,
+            'sent': sum(s.sent for s in subscribers),
+            'conflated': sum(s.conflated for s in subscribers)
+        }
+
+    def subscribe(self, topics) -> Subscriber:
+        subscriber = Subscriber(topics)
+        for topic in subscriber.topics:
+            self._subscribers.setdefault(topic, set()).add(subscriber)
+            if topic in self.latest:
+                subscriber.offer(topic, self.latest[topic])
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for topic in subscriber.topics:
+            self._subscribers.get(topic, set()).discard(subscriber)
+
+    async def __handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            await self.__serve(reader, writer)
+        except (ConnectionError, asyncio.CancelledError):
+            # Disconnected, or canceled by stop()
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    async def __serve(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return
+        parts = request.split(b'\r\n', 1)[0].split(b' ')
+        if len(parts) != 3 or not parts[2].startswith(b'HTTP/'):
+            event_log.debug('bad request line %r', request[:80])
+            writer.write(BAD_REQUEST)
+            await writer.drain()
+            return
+        method, target = parts[:2]
+        url = urlsplit(target.decode('latin-1'))
+        topics = [
+            t for value in parse_qs(url.query).get('topics', [])
+            for t in value.split(',') if t
+        ]
+        if method != b'GET' or url.path != '/stream' or not topics:
+            writer.write(NOT_FOUND)
+            await writer.drain()
+            return
+
+        subscriber = self.subscribe(topics)
+        event_log.debug('subscribed to %s', topics)
+        try:
+            writer.write(HEADERS)
+            await writer.drain()
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(),
+                                           self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(HEARTBEAT)
+                    await writer.drain()
+                    continue
+                frames = subscriber.take()
+                writer.writelines(frames)
+                # While the client drains, new frames conflate in pending
+                await writer.drain()
+                subscriber.sent += len(frames)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+async def poll_tickers(server, md, product_ids, interval=1.0):
+    """Publishes `ticker:<product_id>` updates by polling `md.ticker` once
+    for all subscribers. Requests run in the default executor.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        for product_id in product_ids:
+            try:
+                ticker = await loop.run_in_executor(None, md.ticker,
+                                                    product_id)
+            except (ExchangeError, OSError) as err:
+                event_log.error('ticker %s failed: %s', product_id, err)
+                continue
+            server.publish('ticker:{}'.format(product_id), ticker)
+        await asyncio.sleep(interval)
+
+
+def candle_topic(product_id, granularity) -> str:
+    return 'candles:{}:{}'.format(product_id, int(granularity))
+
+
+def book_topic(product_id, level=1) -> str:
+    return 'book:{}:{}'.format(product_id, level)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import unittest
+
+from dashboard.fanout import FanoutServer
+from dashboard.fanout import Subscriber
+from dashboard.fanout import sse_frame
+
+
+async def connect(port, topics):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write('GET /stream?topics={} HTTP/1.1\r\nHost: x\r\n\r\n'.format(
+        topics).encode())
+    await writer.drain()
+    headers = await reader.readuntil(b'\r\n\r\n')
+    return reader, writer, headers
+
+
+async def read_event(reader):
+    frame = await asyncio.wait_for(reader.readuntil(b'\n\n'), 2)
+    fields = dict(line.split(': ', 1) for line in frame.decode().split('\n')
+                  if line)
+    return fields['event'], json.loads(fields['data'])
+
+
+class TestFanout(unittest.TestCase):
+    def test_sse_frame(self):
+        self.assertEqual(sse_frame('ticker:BTC-USD', {'price': '1.5'}, 7),
+                         b'event: ticker:BTC-USD\nid: 7\n'
+                         b'data: {"price":"1.5"}\n\n')
+
+    def test_conflation(self):
+        async def run():
+            subscriber = Subscriber(['a', 'b'])
+            for i in range(100):
+                subscriber.offer('a', i)
+            subscriber.offer('b', 'x')
+            self.assertTrue(subscriber.ready.is_set())
+            self.assertEqual(subscriber.take(), [99, 'x'])
+            self.assertEqual(subscriber.conflated, 99)
+            self.assertFalse(subscriber.ready.is_set())
+
+        asyncio.run(run())
+
+    def test_broadcast(self):
+        async def run():
+            server = await FanoutServer(port=0).start()
+            server.publish('ticker:BTC-USD', {'price': '100'})
+            clients = [
+                await connect(server.port, 'ticker:BTC-USD,ticker:ETH-USD')
+                for _ in range(20)
+            ]
+            self.assertTrue(clients[0][2].startswith(b'HTTP/1.1 200'))
+            # The latest value is replayed on subscribe
+            for reader, _, _ in clients:
+                self.assertEqual(await read_event(reader),
+                                 ('ticker:BTC-USD', {'price': '100'}))
+
+            frame = server.publish('ticker:ETH-USD', {'price': '5'})
+            server.publish('candles:BTC-USD:60', [[0, 1, 2, 1, 2, 3]])
+            for reader, _, _ in clients:
+                self.assertEqual(await read_event(reader),
+                                 ('ticker:ETH-USD', {'price': '5'}))
+            subscribers = server._subscribers['ticker:ETH-USD']
+            self.assertEqual(len(subscribers), 20)
+
+            stats = server.stats()
+            self.assertEqual(stats['subscribers'], 20)
+            self.assertEqual(stats['published'], 3)
+            self.assertIs(server.latest['ticker:ETH-USD'], frame)
+
+            for _, writer, _ in clients:
+                writer.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_not_found(self):
+        async def run():
+            server = await FanoutServer(port=0).start()
+            reader, writer = await asyncio.open_connection(
+                '127.0.0.1', server.port)
+            writer.write(b'GET /other HTTP/1.1\r\n\r\n')
+            response = await reader.read()
+            self.assertTrue(response.startswith(b'HTTP/1.1 404'))
+            writer.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_bad_request(self):
+        async def run():
+            server = await FanoutServer(port=0).start()
+            for request in (b'\r\n\r\n', b'GARBAGE\r\n\r\n',
+                            b'GET /stream?topics=a\r\n\r\n'):
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', server.port)
+                writer.write(request)
+                response = await asyncio.wait_for(reader.read(), 2)
+                self.assertTrue(response.startswith(b'HTTP/1.1 400'))
+                writer.close()
+            await server.stop()
+
+        asyncio.run(run())
+
+    def test_stop_disconnects_clients(self):
+        async def run():
+            server = await FanoutServer(port=0).start()
+            reader, writer, _ = await connect(server.port, 'ticker:BTC-USD')
+            await asyncio.wait_for(server.stop(), 2)
+            self.assertEqual(await asyncio.wait_for(reader.read(), 2), b'')
+            self.assertEqual(server.stats()['subscribers'], 0)
+            writer.close()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+""" Plans and runs large historical backfills.
+
+A BackfillSpec such as "all USD pairs, all granularities, since 2016" is
+expanded into window-level Tasks, ordered by a priority, and run by a pool
+of worker threads that share one RateLimiter. Progress, throughput and an
+ETA are tracked per product.
+"""
+import logging
+import threading
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from api.coinbase.exceptions import ExchangeError
+from api.coinbase.exceptions import InvalidArgument
+from api.exchange.ratelimit import RateLimiter
+from api.exchange.timeslice import TimeSlice
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+Task = namedtuple('Task', ['product_id', 'granularity', 'start', 'end'])
+
+# Sort keys for Task ordering; ties are broken round-robin across products
+PRIORITIES = {
+    'recent': lambda task: (-task.end, task.granularity),
+    'oldest': lambda task: (task.start, task.granularity),
+    'coarse': lambda task: (-task.granularity, -task.end),
+    'fine': lambda task: (task.granularity, -task.end),
+}
+
+
+class BackfillSpec:
+    """Describes which products, granularities and time range to backfill"""
+    def __init__(self,
+                 products='*',
+                 granularities='*',
+                 start=None,
+                 end=None,
+                 quote=None):
+        """Describes which products, granularities and time range to backfill
+
+        Keyword arguments:
+        products -- a list of product_ids, or '*' for every valid product
+        granularities -- a list of granularities, or '*' for all available
+        start -- a datetime or seconds since epoch (naive datetimes are UTC)
+        end -- optional datetime or seconds since epoch, defaults to now
+        quote -- optional quote currency filter, e.g. 'USD'
+        """
+        if start is None:
+            raise InvalidArgument('a backfill needs a start time')
+        self.products = products
+        self.granularities = granularities
+        self.start = TimeSlice.to_epoch(start)
+        self.end = TimeSlice.to_epoch(end) if end is not None else \
+            int(time.time())
+        self.quote = quote
+
+    def expand_products(self, md) -> list:
+        products = md.available_trade_pairs() if self.products == '*' \
+            else self.products
+        if self.quote:
+            products = [
+                p for p in products
+                if p.split('-')[-1].upper() == self.quote.upper()
+            ]
+        return sorted(products)
+
+    def expand_granularities(self, md) -> list:
+        if self.granularities == '*':
+            return sorted(md.available_granularity().values)
+        return sorted(int(g) for g in self.granularities)
+
+
+def plan(spec: BackfillSpec, md, order='recent', max_candles=None) -> list:
+    """Expands a spec into window-level tasks in priority order.
+
+    Window edges are aligned to granularity boundaries, every window holds
+    at most `max_candles` buckets, and buckets that have not closed yet are
+    left out.
+
+    Keyword arguments:
+    spec -- a BackfillSpec
+    md -- the MarketData used to resolve '*' products and granularities
+    order -- a key of PRIORITIES or a callable taking a Task
+    max_candles -- candles per request, defaults to `md.max_candles()`
+
+    Returns:
+    [Task, ...]
+    """
+    key = PRIORITIES[order] if isinstance(order, str) else order
+    products = spec.expand_products(md)
+    rank = {product_id: i for i, product_id in enumerate(products)}
+    max_candles = max_candles or md.max_candles()
+    now = int(time.time())
+
+    tasks = []
+    for granularity in spec.expand_granularities(md):
+        start = spec.start - spec.start % granularity
+        end = min(spec.end, now) // granularity * granularity
+        window = granularity * max_candles
+        for w_start in range(start, end, window):
+            w_end = min(w_start + window, end)
+            for product_id in products:
+                tasks.append(Task(product_id, granularity, w_start, w_end))
+
+    tasks.sort(key=lambda task: (key(task), rank[task.product_id]))
+    return tasks
+
+
+class ProductProgress:
+    """Completed work, throughput and ETA for one product"""
+    def __init__(self, product_id, total):
+        self.product_id = product_id
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.candles = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def remaining(self):
+        return self.total - self.done - self.failed
+
+    @property
+    def rate(self):
+        """Completed windows per second"""
+        if not self.started:
+            return 0.0
+        elapsed = (self.finished or time.time()) - self.started
+        return (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated seconds until every window of the product is done"""
+        if not self.remaining:
+            return 0.0
+        return self.remaining / self.rate if self.rate else None
+
+    def report(self) -> dict:
+        return {
+            'product_id': self.product_id,
+            'done': self.done,
+            'failed': self.failed,
+            'total': self.total,
+            'candles': self.candles,
+            'windows_per_second': self.rate,
+            'eta': self.eta
+        }
+
+    def __str__(self):
+        eta = self.eta
+        return '{}: {}/{} windows, {} failed, {} candles, eta {}'.format(
+            self.product_id, self.done, self.total, self.failed, self.candles,
+            '?' if eta is None else '{:.0f}s'.format(eta))
+
+
+class BackfillScheduler:
+    """Runs backfill tasks on a worker pool that shares one rate limiter.
+
+    Every fetched window is handed to `sink(task, frame)`, for example a
+    CandleStore write or a BulkIngester, from the worker thread.
+    """
+    def __init__(self,
+                 md,
+                 sink=None,
+                 workers=4,
+                 limiter: RateLimiter = None,
+                 report_every=60,
+                 checkpoint=None):
+        """Runs backfill tasks on a worker pool that shares one rate limiter
+
+        Keyword arguments:
+        md -- a MarketData used to fetch every window
+        sink -- optional callable(task, CandleFrame)
+        workers -- number of worker threads
+        limiter -- optional extra RateLimiter acquired before every window.
+                   Workers share `md`, so they already share the
+                   exchange's own limiter (see `Coinbase.rate_limiter`).
+        report_every -- seconds between progress log lines
+        checkpoint -- optional Checkpoint; finished windows are skipped and
+                      every window's outcome is journaled
+        """
+        self.md = md
+        self.sink = sink
+        self.workers = workers
+        self.limiter = limiter
+        self.report_every = report_every
+        self.progress = {}
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+        self.checkpoint = checkpoint
+
+    def run(self, tasks) -> dict:
+        """Runs every task and returns {product_id: ProductProgress}"""
+        tasks = list(tasks)
+        if self.checkpoint is not None:
+            skipped = len(tasks)
+            tasks = self.checkpoint.pending(tasks)
+            event_log.info('resuming: skipping %i windows already done or '
+                           'failed permanently', skipped - len(tasks))
+        for task in tasks:
+            if task.product_id not in self.progress:
+                self.progress[task.product_id] = ProductProgress(
+                    task.product_id, 0)
+            self.progress[task.product_id].total += 1
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for _ in pool.map(self.__run_task, tasks):
+                self.__maybe_report()
+        self.report()
+        return self.progress
+
+    def report(self):
+        for product_id in sorted(self.progress):
+            event_log.info('%s', self.progress[product_id])
+        return [self.progress[p].report() for p in sorted(self.progress)]
+
+    def __run_task(self, task):
+        progress = self.progress[task.product_id]
+        with self._lock:
+            if progress.started is None:
+                progress.started = time.time()
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            frame = self.md.window(task.product_id, task.start, task.end,
+                                   task.granularity)
+        except (ExchangeError, requests.RequestException) as err:
+            return self.__fail(task, progress, err)
+        if self.sink is not None:
+            try:
+                self.sink(task, frame)
+            except Exception as err:
+                # A failing sink must not abort the other windows
+                return self.__fail(task, progress, err)
+
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done(task, len(frame))
+        with self._lock:
+            progress.done += 1
+            progress.candles += len(frame)
+            if not progress.remaining:
+                progress.finished = time.time()
+        return task, frame
+
+    def __fail(self, task, progress, err):
+        event_log.error('%s failed: %s', task, err)
+        if self.checkpoint is not None:
+            self.checkpoint.mark_failed(task, err)
+        with self._lock:
+            progress.failed += 1
+            if not progress.remaining:
+                progress.finished = time.time()
+        return task, None
+
+    def __maybe_report(self):
+        now = time.time()
+        if now - self._last_report >= self.report_every:
+            self._last_report = now
+            self.report()
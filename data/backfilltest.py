@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+
+import requests
+
+from api.coinbase.exceptions import InvalidSymbol
+from api.exchange.granularity import Granularity
+from data.backfill import BackfillScheduler
+from data.backfill import BackfillSpec
+from data.backfill import Task
+from data.backfill import plan
+from data.checkpoint import Checkpoint
+from data.frame import CandleFrame
+
+
+class FakeMarketData:
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.calls = []
+
+    def available_trade_pairs(self):
+        return ['ETH-USD', 'BTC-USD', 'BTC-EUR']
+
+    def available_granularity(self):
+        return Granularity((60, 3600))
+
+    def max_candles(self):
+        return 300
+
+    def window(self, product_id, start, end, granularity):
+        task = Task(product_id, granularity, start, end)
+        self.calls.append(task)
+        if task in self.failures:
+            raise self.failures[task]
+        return CandleFrame.from_rows([[t, 1, 2, 1, 2, 1]
+                                      for t in range(start, end, granularity)])
+
+
+class TestPlan(unittest.TestCase):
+    def test_windows(self):
+        spec = BackfillSpec(granularities=[60], start=30, end=700 * 60 + 30,
+                            quote='usd')
+        tasks = plan(spec, FakeMarketData())
+        self.assertEqual(len(tasks), 6)
+        self.assertEqual({t.product_id for t in tasks},
+                         {'BTC-USD', 'ETH-USD'})
+        windows = sorted({(t.start, t.end) for t in tasks})
+        self.assertEqual(windows, [(0, 18000), (18000, 36000),
+                                   (36000, 42000)])
+        # Newest windows first, alternating products
+        self.assertEqual([t.product_id for t in tasks[:2]],
+                         ['BTC-USD', 'ETH-USD'])
+        self.assertEqual(tasks[0].end, 42000)
+
+    def test_every_granularity_and_order(self):
+        spec = BackfillSpec(products=['BTC-USD'], start=0, end=7200)
+        tasks = plan(spec, FakeMarketData(), order='coarse')
+        self.assertEqual([(t.granularity, t.start, t.end) for t in tasks],
+                         [(3600, 0, 7200), (60, 0, 7200)])
+        tasks = plan(spec, FakeMarketData(), order='oldest', max_candles=60)
+        self.assertEqual([t.start for t in tasks], [0, 0, 3600])
+
+    def test_open_bucket_left_out(self):
+        spec = BackfillSpec(products=['BTC-USD'], granularities=[3600],
+                            start=0, end=10**12)
+        tasks = plan(spec, FakeMarketData())
+        self.assertLess(max(t.end for t in tasks), 10**12)
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        spec = BackfillSpec(products=['BTC-USD', 'ETH-USD'],
+                            granularities=[60], start=0, end=36000)
+        self.tasks = plan(spec, FakeMarketData())
+
+    def test_failures_are_journaled_and_retried(self):
+        timeout, refused, broken = self.tasks[:3]
+        md = FakeMarketData({
+            timeout: requests.Timeout('read timed out'),
+            refused: requests.ConnectionError('refused'),
+            broken: InvalidSymbol('BTC-USD')
+        })
+        written = []
+
+        def sink(task, frame):
+            if task == self.tasks[3]:
+                raise OSError('disk full')
+            written.append(task)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'backfill')
+            with Checkpoint.beside(path) as checkpoint:
+                scheduler = BackfillScheduler(md, sink, workers=2,
+                                              checkpoint=checkpoint)
+                with self.assertLogs('root.data.backfill', 'ERROR'):
+                    progress = scheduler.run(self.tasks)
+                self.assertEqual(
+                    sum(p.failed for p in progress.values()), 4)
+                self.assertEqual(sum(p.done for p in progress.values()), 0)
+                self.assertEqual(written, [])
+                self.assertEqual(sorted(checkpoint.failed()),
+                                 sorted(self.tasks))
+
+            # A resumed run only fetches what has not been done
+            md = FakeMarketData({timeout: requests.Timeout('again')})
+            with Checkpoint.beside(path) as checkpoint:
+                checkpoint.mark_done(self.tasks[1], 300)
+                scheduler = BackfillScheduler(md, lambda t, f: None,
+                                              checkpoint=checkpoint)
+                with self.assertLogs('root.data.backfill', 'ERROR'):
+                    progress = scheduler.run(self.tasks)
+                self.assertEqual(sorted(md.calls),
+                                 sorted(self.tasks[:1] + self.tasks[2:]))
+                self.assertEqual(sum(p.done for p in progress.values()), 2)
+                self.assertEqual(checkpoint.failed(), [timeout])
+                self.assertEqual(checkpoint.summary()['done']['windows'], 3)
+
+    def test_progress(self):
+        scheduler = BackfillScheduler(FakeMarketData(), workers=3)
+        progress = scheduler.run(self.tasks)
+        btc = progress['BTC-USD']
+        self.assertEqual((btc.done, btc.total, btc.candles), (2, 2, 600))
+        self.assertEqual(btc.eta, 0.0)
+        self.assertEqual(len(scheduler.report()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
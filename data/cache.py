@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+""" An in-process, byte-bounded LRU cache of candle ranges.
+
+Every (product_id, granularity) entry holds one merged, ascending
+CandleFrame and an IntervalSet of the time ranges it covers. A query for
+any sub-range of what is cached is answered without a request. A query
+that only partly overlaps fetches just the missing edges and merges them
+in. Only buckets that have closed are recorded as covered, so the open
+bucket and anything after it are fetched again on every query. Entries
+are evicted least recently used first once the cached
+candles exceed `max_bytes`.
+"""
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from .coverage import IntervalSet
+from .frame import CandleFrame
+from .merge import merge_frames
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+
+class CacheEntry:
+    """The cached candles and covered ranges of one product/granularity"""
+    def __init__(self):
+        self.frame = CandleFrame()
+        self.coverage = IntervalSet()
+
+    @property
+    def nbytes(self):
+        return self.frame.nbytes
+
+
+class CandleCache:
+    """A byte-bounded LRU cache of (product_id, granularity) candle ranges.
+
+    Safe to share between threads. Missing ranges are fetched outside the
+    lock, so two threads asking for the same cold range may both fetch it.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """A byte-bounded LRU cache of candle ranges
+
+        Keyword arguments:
+        max_bytes -- the cached candles are kept below this size
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, product_id, granularity, start, end,
+            fetch) -> CandleFrame:
+        """Returns the candles with `start <= time < end`.
+
+        Keyword arguments:
+        product_id -- the product of the candles
+        granularity -- the granularity of the candles
+        start -- seconds since epoch, aligned to `granularity`
+        end -- seconds since epoch (exclusive), aligned to `granularity`
+        fetch -- callable(start, end) returning a CandleFrame of the
+                 candles in [start, end), called once per missing range
+        """
+        key = (product_id, int(granularity))
+        with self._lock:
+            entry = self._entries.get(key)
+            gaps = entry.coverage.missing(start, end) if entry else \
+                [(start, end)]
+            if not gaps:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.frame.between(start, end)
+            if entry is not None and entry.coverage.overlap(start, end):
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+
+        fetched = [(gap, fetch(*gap)) for gap in gaps]
+        event_log.debug('%s: fetched %i missing ranges', key, len(gaps))
+
+        with self._lock:
+            entry = self._entries.pop(key, None) or CacheEntry()
+            self.nbytes -= entry.nbytes
+            # Fetched frames come first so a refetched open bucket wins
+            # over the stale candle cached for it
+            entry.frame = merge_frames([frame for _, frame in fetched] +
+                                       [entry.frame])
+            # The open bucket is still changing; don't record it as covered
+            closed = int(time.time()) // key[1] * key[1]
+            for (gap_start, gap_end), _ in fetched:
+                entry.coverage.add(gap_start, min(gap_end, closed))
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            result = entry.frame.between(start, end)
+            self.__evict()
+        return result
+
+    def invalidate(self, product_id=None, granularity=None):
+        """Drops every entry matching `product_id` and `granularity`
+        (None matches any)
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if product_id not in (None, key[0]) or \
+                        granularity not in (None, key[1]):
+                    continue
+                self.nbytes -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'partial_hits': self.partial_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def __evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.evictions += 1
+            event_log.debug('evicted %s (%i bytes)', key, entry.nbytes)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return 'CandleCache({})'.format(self.stats())
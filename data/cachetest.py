@@ -0,0 +1,95 @@
+import time
+import unittest
+
+import numpy as np
+
+from data.cache import CandleCache
+from data.frame import CandleFrame
+
+
+class Source:
+    """Counts the ranges it is asked for; the close is the call number"""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        times = np.arange(start, end, 60)
+        close = len(self.calls)
+        return CandleFrame.from_columns(times, 1, close, 1, close, times)
+
+
+class TestCandleCache(unittest.TestCase):
+    def test_sub_range_hit(self):
+        cache, source = CandleCache(), Source()
+        cache.get('BTC-USD', 60, 0, 6000, source)
+        frame = cache.get('BTC-USD', 60, 600, 1200, source)
+        self.assertEqual(frame.time.tolist(), list(range(600, 1200, 60)))
+        self.assertEqual(source.calls, [(0, 6000)])
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_only_edges_are_fetched(self):
+        cache, source = CandleCache(), Source()
+        cache.get('BTC-USD', 60, 600, 1200, source)
+        cache.get('BTC-USD', 60, 1800, 2400, source)
+        frame = cache.get('BTC-USD', 60, 0, 3000, source)
+        self.assertEqual(source.calls[2:],
+                         [(0, 600), (1200, 1800), (2400, 3000)])
+        self.assertEqual(frame.time.tolist(), list(range(0, 3000, 60)))
+        self.assertEqual(cache.stats()['partial_hits'], 1)
+
+    def test_open_bucket_is_not_cached(self):
+        cache, source = CandleCache(), Source()
+        day = 86400
+        closed = int(time.time()) // day * day
+        start, end = closed - 2 * day, closed + day
+
+        def closes(frame):
+            return (set(frame.between(start, closed).close.tolist()),
+                    set(frame.between(closed, end).close.tolist()))
+
+        self.assertEqual(closes(cache.get('BTC-USD', day, start, end,
+                                          source)), ({1}, {1}))
+        for calls in (2, 3):
+            frame = cache.get('BTC-USD', day, start, end, source)
+            self.assertEqual(source.calls[-1], (closed, end))
+            # The open bucket is refreshed, the closed ones are cached
+            self.assertEqual(closes(frame), ({1}, {calls}))
+        frame = cache.get('BTC-USD', day, start, closed, source)
+        self.assertEqual(len(source.calls), 3)
+        self.assertEqual(set(frame.close.tolist()), {1})
+
+    def test_keys_are_separate(self):
+        cache, source = CandleCache(), Source()
+        cache.get('BTC-USD', 60, 0, 600, source)
+        cache.get('ETH-USD', 60, 0, 600, source)
+        cache.get('BTC-USD', 300, 0, 600, source)
+        self.assertEqual(len(source.calls), 3)
+        self.assertEqual(len(cache), 3)
+
+    def test_lru_eviction_by_bytes(self):
+        # 100 candles of 48 bytes per entry; room for two entries
+        cache, source = CandleCache(max_bytes=10000), Source()
+        cache.get('A', 60, 0, 6000, source)
+        cache.get('B', 60, 0, 6000, source)
+        cache.get('A', 60, 0, 60, source)
+        cache.get('C', 60, 0, 6000, source)
+        self.assertIn(('A', 60), cache)
+        self.assertNotIn(('B', 60), cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+    def test_invalidate(self):
+        cache, source = CandleCache(), Source()
+        cache.get('A', 60, 0, 600, source)
+        cache.get('B', 60, 0, 600, source)
+        cache.invalidate('A')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 10 * CandleFrame().records.itemsize)
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+""" Durable progress journal for long-running backfills.
+
+Every completed or failed request window is recorded in a small SQLite
+file, normally kept next to the output it protects. A resumed run loads
+the finished windows into a set, so skipping them is O(1) per window, and
+windows that keep failing are marked permanent so they can be retried
+selectively later.
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from .backfill import Task
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+DONE = 'done'
+FAILED = 'failed'
+PERMANENT = 'permanent'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS windows (
+    product_id TEXT NOT NULL,
+    granularity INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    candles INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (product_id, granularity, start, end)
+)
+'''
+
+
+class Checkpoint:
+    """A SQLite journal of finished and failed backfill windows.
+
+    Safe to share between the threads of a BackfillScheduler.
+    """
+    def __init__(self, path, max_attempts=3):
+        """A SQLite journal of finished and failed backfill windows
+
+        Keyword arguments:
+        path -- the SQLite file, created if it does not exist
+        max_attempts -- failures after which a window is marked permanent
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        self._done = self.__load(DONE)
+        self._permanent = self.__load(PERMANENT)
+        event_log.debug('%s: %i windows already done, %i failed permanently',
+                        path, len(self._done), len(self._permanent))
+
+    def __load(self, status) -> set:
+        return set(
+            Task(*row) for row in self._db.execute(
+                'SELECT product_id, granularity, start, end FROM windows '
+                'WHERE status = ?', (status, )))
+
+    @classmethod
+    def beside(cls, output_path, **kwargs):
+        """Opens the checkpoint kept next to `output_path`"""
+        return cls('{}.checkpoint.sqlite'.format(output_path), **kwargs)
+
+    def is_done(self, task) -> bool:
+        return Task(*task) in self._done
+
+    def is_permanent(self, task) -> bool:
+        return Task(*task) in self._permanent
+
+    def pending(self, tasks, include_permanent=False) -> list:
+        """Filters out every task that has already been completed, and the
+        ones that failed permanently unless `include_permanent` is True.
+        Use `retry` to give permanent failures another `max_attempts`.
+        """
+        skip = self._done if include_permanent else \
+            self._done | self._permanent
+        return [task for task in tasks if Task(*task) not in skip]
+
+    def mark_done(self, task, candles=0):
+        task = Task(*task)
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO windows (product_id, granularity, start, end, '
+                'status, attempts, candles, error, updated) '
+                'VALUES (?, ?, ?, ?, ?, 1, ?, NULL, ?) '
+                'ON CONFLICT (product_id, granularity, start, end) DO UPDATE '
+                'SET status = excluded.status, candles = excluded.candles, '
+                'attempts = attempts + 1, error = NULL, '
+                'updated = excluded.updated',
+                tuple(task) + (DONE, int(candles), time.time()))
+            self._db.commit()
+            self._done.add(task)
+            self._permanent.discard(task)
+
+    def mark_failed(self, task, error=None) -> bool:
+        """Records a failed attempt.
+
+        Returns:
+        True if the window has now failed `max_attempts` times and is marked
+        permanent
+        """
+        task = Task(*task)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT attempts FROM windows WHERE product_id = ? AND '
+                'granularity = ? AND start = ? AND end = ?',
+                tuple(task)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            status = PERMANENT if attempts >= self.max_attempts else FAILED
+            self._db.execute(
+                'INSERT OR REPLACE INTO windows (product_id, granularity, '
+                'start, end, status, attempts, candles, error, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)',
+                tuple(task) +
+                (status, attempts, str(error) if error else None, time.time()))
+            self._db.commit()
+            if status == PERMANENT:
+                self._permanent.add(task)
+        return status == PERMANENT
+
+    def failed(self, permanent_only=False) -> list:
+        """Returns the windows that have failed, oldest first"""
+        statuses = (PERMANENT, ) if permanent_only else (FAILED, PERMANENT)
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT product_id, granularity, start, end FROM windows '
+                'WHERE status IN ({}) ORDER BY product_id, granularity, '
+                'start'.format(','.join('?' * len(statuses))), statuses)
+            return [Task(*row) for row in rows]
+
+    def retry(self, tasks=None):
+        """Resets failed windows (all, or just `tasks`) so that they are
+        attempted `max_attempts` more times
+        """
+        with self._lock:
+            if tasks is None:
+                self._db.execute('DELETE FROM windows WHERE status != ?',
+                                 (DONE, ))
+                self._permanent.clear()
+            else:
+                self._permanent.difference_update(Task(*t) for t in tasks)
+                self._db.executemany(
+                    'DELETE FROM windows WHERE product_id = ? AND '
+                    'granularity = ? AND start = ? AND end = ? AND '
+                    'status != ?', [tuple(Task(*t)) + (DONE, ) for t in tasks])
+            self._db.commit()
+
+    def summary(self) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT status, COUNT(*), SUM(candles) FROM windows '
+                'GROUP BY status').fetchall()
+        return {status: {'windows': n, 'candles': c} for status, n, c in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        return len(self._done)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
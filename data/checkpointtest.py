@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from data.backfill import Task
+from data.checkpoint import Checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+    def test_resume_and_failures(self):
+        tasks = [Task('BTC-USD', 60, t, t + 18000) for t in range(0, 90000,
+                                                                   18000)]
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'btc.candles')
+            with Checkpoint.beside(output, max_attempts=2) as checkpoint:
+                checkpoint.mark_done(tasks[0], 300)
+                checkpoint.mark_done(tasks[1], 300)
+                self.assertFalse(checkpoint.mark_failed(tasks[2], 'timeout'))
+
+            # A new process sees the journal
+            with Checkpoint.beside(output, max_attempts=2) as checkpoint:
+                self.assertTrue(checkpoint.is_done(tasks[0]))
+                self.assertEqual(checkpoint.pending(tasks), tasks[2:])
+                self.assertEqual(checkpoint.failed(permanent_only=True), [])
+
+                self.assertTrue(checkpoint.mark_failed(tasks[2], 'timeout'))
+                self.assertEqual(checkpoint.failed(permanent_only=True),
+                                 [tasks[2]])
+                self.assertTrue(checkpoint.is_permanent(tasks[2]))
+                self.assertEqual(checkpoint.pending(tasks), tasks[3:])
+                self.assertEqual(
+                    checkpoint.pending(tasks, include_permanent=True),
+                    tasks[2:])
+
+            # Permanent failures stay skipped after a restart
+            with Checkpoint.beside(output, max_attempts=2) as checkpoint:
+                self.assertEqual(checkpoint.pending(tasks), tasks[3:])
+
+                checkpoint.retry([tasks[2]])
+                self.assertEqual(checkpoint.pending(tasks), tasks[2:])
+                self.assertEqual(checkpoint.failed(), [])
+                self.assertEqual(checkpoint.summary()['done']['candles'], 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
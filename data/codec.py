@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+""" A compact, block-based codec for stored candles.
+
+Every block holds up to a few thousand consecutive candles and encodes
+each column with what suits it, all vectorized with NumPy:
+
+time -- delta-of-delta; a regular series becomes a run of zeros
+prices -- scaled to integers on the product's quote increment. The close
+          is stored as a delta of the previous close, the open as a delta
+          of the previous close, and high and low as their (non-negative)
+          distance above or below the body of the candle
+volume -- scaled to integers on the base increment
+
+Integers are zigzag encoded and written as LEB128 varints. A column whose
+values do not survive scaling exactly (NaN, infinities, -0.0 or values
+too large for 53 bits) is stored as raw float64, so decoding always
+returns the original values bit for bit.
+
+A CandleArchive is a file of such blocks followed by an index of each
+block's first and last time, so a range read decodes only the blocks it
+touches. Run `python -m data.codec [store_root product_id granularity]`
+to measure the compression ratio and decode speed on stored candles.
+"""
+import mmap
+import os
+import struct
+import time
+
+from decimal import Decimal
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from .frame import CANDLE_DTYPE
+from .frame import CandleFrame
+
+BLOCK_MAGIC = b'CGB1'
+ARCHIVE_MAGIC = b'CGA1'
+# magic, count, flags, price decimals, volume decimals, first, last
+BLOCK_HEADER = struct.Struct('<4sIBBBqq')
+# magic, blocks, index offset
+ARCHIVE_FOOTER = struct.Struct('<4sIQ')
+INDEX_DTYPE = np.dtype([('first', '<i8'), ('last', '<i8'),
+                        ('offset', '<u8'), ('length', '<u8')])
+
+RAW_PRICES = 1
+RAW_VOLUME = 2
+MAX_DECIMALS = 12
+
+
+def zigzag(values) -> np.ndarray:
+    """Maps signed integers onto unsigned ones: 0, -1, 1, -2 -> 0, 1, 2, 3"""
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64) ^
+            -(values & np.uint64(1)).view(np.int64))
+
+
+def encode_varints(values) -> bytes:
+    """LEB128 encodes unsigned 64 bit integers"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b''
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += values >= np.uint64(1) << np.uint64(7 * k)
+    offsets = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max())):
+        mask = lengths > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        byte |= np.where(lengths[mask] > k + 1, 0x80, 0).astype(np.uint64)
+        out[offsets[mask] + k] = byte
+    return out.tobytes()
+
+
+def decode_varints(data, count=None) -> np.ndarray:
+    """Decodes LEB128 varints into unsigned 64 bit integers"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    if not len(data):
+        return np.empty(0, dtype=np.uint64)
+    last = (data & 0x80) == 0
+    starts = np.flatnonzero(np.r_[True, last[:-1]])
+    if count is not None and len(starts) != count:
+        raise InvalidArgument('expected {} varints, found {}'.format(
+            count, len(starts)))
+    group = np.cumsum(np.r_[0, last[:-1]])
+    shift = (np.arange(len(data)) - starts[group]) * 7
+    parts = (data & 0x7f).astype(np.uint64) << shift.astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def decimals(increment) -> int:
+    """Decimal places of an increment such as '0.01' or 1e-08"""
+    exponent = Decimal(str(increment)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+def detect_decimals(values) -> int:
+    """The fewest decimal places that represent every value exactly, or
+    -1 if there are none up to MAX_DECIMALS
+    """
+    values = np.asarray(values, dtype=np.float64)
+    for places in range(MAX_DECIMALS + 1):
+        if _scale(values, places) is not None:
+            return places
+    return -1
+
+
+def _scale(values, places):
+    """Scales values to integers, or None if that is not exact.
+
+    Integers have no negative zero, so -0.0 is not exact either.
+    """
+    if places < 0 or not np.all(np.isfinite(values)):
+        return None
+    scale = 10.0**places
+    # Checked before multiplying so that huge values cannot overflow
+    if np.any(np.abs(values) >= 2**53 / scale) or \
+            np.any(np.signbit(values) & (values == 0)):
+        return None
+    scaled = np.rint(values * scale)
+    if np.any(np.abs(scaled) >= 2**53) or \
+            not np.array_equal(scaled / scale, values):
+        return None
+    return scaled.astype(np.int64)
+
+
+def encode_block(candles, price_increment=None,
+                 volume_increment=None) -> bytes:
+    """Encodes sorted candles into one block.
+
+    Keyword arguments:
+    candles -- a CandleFrame, candle dicts or raw rows, sorted by time
+    price_increment -- the product's quote increment, detected if None
+    volume_increment -- the product's base increment, detected if None
+    """
+    frame = CandleFrame.coerce(candles)
+    count = len(frame)
+    if not count:
+        return BLOCK_HEADER.pack(BLOCK_MAGIC, 0, 0, 0, 0, 0, 0)
+
+    times = frame.time.astype(np.int64)
+    deltas = np.diff(times, prepend=times[0])
+    sections = [encode_varints(zigzag(np.diff(deltas, prepend=0)))]
+
+    flags = 0
+    prices = np.stack([frame.close, frame.open, frame.high, frame.low])
+    price_places = decimals(price_increment) if price_increment \
+        else detect_decimals(prices)
+    scaled = _scale(prices, price_places)
+    if scaled is None:
+        flags |= RAW_PRICES
+        price_places = 0
+        sections.append(prices.astype('<f8').tobytes())
+    else:
+        close, _open, high, low = scaled
+        previous = np.r_[0, close[:-1]]
+        top = np.maximum(_open, close)
+        bottom = np.minimum(_open, close)
+        sections.append(
+            encode_varints(
+                np.concatenate([
+                    zigzag(close - previous),
+                    zigzag(_open - previous),
+                    zigzag(high - top),
+                    zigzag(bottom - low)
+                ])))
+
+    volume_places = decimals(volume_increment) if volume_increment \
+        else detect_decimals(frame.volume)
+    volume = _scale(frame.volume, volume_places)
+    if volume is None or np.any(volume < 0):
+        flags |= RAW_VOLUME
+        volume_places = 0
+        sections.append(frame.volume.astype('<f8').tobytes())
+    else:
+        sections.append(encode_varints(volume.view(np.uint64)))
+
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, count, flags, price_places,
+                               volume_places, int(times[0]), int(times[-1]))
+    body = b''.join(struct.pack('<I', len(s)) + s for s in sections)
+    return header + body
+
+
+def block_range(block) -> tuple:
+    """Returns (count, first, last) of a block without decoding it"""
+    magic, count, _, _, _, first, last = BLOCK_HEADER.unpack_from(block, 0)
+    if magic != BLOCK_MAGIC:
+        raise InvalidArgument('not a candle block')
+    return count, first, last
+
+
+def decode_block(block) -> CandleFrame:
+    """Decodes a block from `encode_block` into a new CandleFrame"""
+    magic, count, flags, price_places, volume_places, first, _ = \
+        BLOCK_HEADER.unpack_from(block, 0)
+    if magic != BLOCK_MAGIC:
+        raise InvalidArgument('not a candle block')
+    records = np.empty(count, dtype=CANDLE_DTYPE)
+    if not count:
+        return CandleFrame(records)
+
+    sections = []
+    offset = BLOCK_HEADER.size
+    for _ in range(3):
+        (length, ) = struct.unpack_from('<I', block, offset)
+        offset += 4
+        sections.append(memoryview(block)[offset:offset + length])
+        offset += length
+
+    deltas = np.cumsum(unzigzag(decode_varints(sections[0], count)))
+    records['time'] = first + np.cumsum(deltas)
+
+    if flags & RAW_PRICES:
+        close, _open, high, low = np.frombuffer(sections[1],
+                                                dtype='<f8').reshape(4, -1)
+    else:
+        values = unzigzag(decode_varints(sections[1], 4 * count))
+        close_deltas, open_deltas, highs, lows = values.reshape(4, -1)
+        close = np.cumsum(close_deltas)
+        _open = np.r_[0, close[:-1]] + open_deltas
+        high = np.maximum(_open, close) + highs
+        low = np.minimum(_open, close) - lows
+        scale = 10.0**price_places
+        close, _open, high, low = (close / scale, _open / scale,
+                                   high / scale, low / scale)
+    records['close'], records['open'] = close, _open
+    records['high'], records['low'] = high, low
+
+    if flags & RAW_VOLUME:
+        records['volume'] = np.frombuffer(sections[2], dtype='<f8')
+    else:
+        volume = decode_varints(sections[2], count).view(np.int64)
+        records['volume'] = volume / 10.0**volume_places
+    return CandleFrame(records)
+
+
+def write_archive(path, candles, price_increment=None,
+                  volume_increment=None, block_size=4096):
+    """Writes sorted candles to `path` as an indexed file of blocks.
+
+    The file is written to a temporary name and moved into place, so a
+    reader never sees a partial archive.
+
+    Returns:
+    the number of bytes written
+    """
+    frame = CandleFrame.coerce(candles)
+    index = np.zeros(-(-len(frame) // block_size), dtype=INDEX_DTYPE)
+    tmp = '{}.tmp'.format(path)
+    with open(tmp, 'wb') as archive:
+        offset = 0
+        for n, lo in enumerate(range(0, len(frame), block_size)):
+            block_frame = frame[lo:lo + block_size]
+            block = encode_block(block_frame, price_increment,
+                                 volume_increment)
+            archive.write(block)
+            index[n] = (block_frame.time[0], block_frame.time[-1], offset,
+                        len(block))
+            offset += len(block)
+        archive.write(index.tobytes())
+        archive.write(ARCHIVE_FOOTER.pack(ARCHIVE_MAGIC, len(index), offset))
+        archive.flush()
+        os.fsync(archive.fileno())
+        size = archive.tell()
+    os.replace(tmp, path)
+    return size
+
+
+class CandleArchive:
+    """A read-only, memory-mapped archive written by `write_archive`.
+
+    Supports:
+    len(archive),
+    archive.range(start, end), which decodes only the blocks it needs
+    """
+    def __init__(self, path):
+        """A read-only, memory-mapped archive written by `write_archive`
+
+        Keyword arguments:
+        path -- the archive file
+        """
+        self.path = path
+        with open(path, 'rb') as archive:
+            self._map = mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, blocks, index_offset = ARCHIVE_FOOTER.unpack_from(
+            self._map, len(self._map) - ARCHIVE_FOOTER.size)
+        if magic != ARCHIVE_MAGIC:
+            raise InvalidArgument('{} is not a candle archive'.format(path))
+        self.index = np.frombuffer(self._map,
+                                   dtype=INDEX_DTYPE,
+                                   count=blocks,
+                                   offset=index_offset)
+
+    @property
+    def nbytes(self):
+        return len(self._map)
+
+    def block(self, n) -> CandleFrame:
+        _, _, offset, length = self.index[n].tolist()
+        return decode_block(self._map[offset:offset + length])
+
+    def range(self, start, end) -> CandleFrame:
+        """Returns the candles with `start <= time < end`"""
+        lo = np.searchsorted(self.index['last'], start, side='left')
+        hi = np.searchsorted(self.index['first'], end, side='left')
+        frame = CandleFrame.concat([self.block(n) for n in range(lo, hi)])
+        return frame.between(start, end) if len(frame) else frame
+
+    def read(self) -> CandleFrame:
+        return CandleFrame.concat(
+            [self.block(n) for n in range(len(self.index))])
+
+    def close(self):
+        self.index = None
+        self._map.close()
+
+    def __len__(self):
+        return sum(
+            block_range(self._map[offset:offset + BLOCK_HEADER.size])[0]
+            for offset in self.index['offset'].tolist())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def benchmark(frame, price_increment=None, volume_increment=None,
+              block_size=4096) -> dict:
+    """Measures compression ratio and encode/decode speed on `frame`"""
+    blocks = [
+        frame[lo:lo + block_size] for lo in range(0, len(frame), block_size)
+    ]
+    started = time.perf_counter()
+    encoded = [encode_block(b, price_increment, volume_increment)
+               for b in blocks]
+    encode_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    decoded = CandleFrame.concat([decode_block(b) for b in encoded])
+    decode_seconds = time.perf_counter() - started
+    size = sum(map(len, encoded))
+    return {
+        'candles': len(frame),
+        'raw_bytes': frame.nbytes,
+        'encoded_bytes': size,
+        'ratio': frame.nbytes / float(size) if size else 0.0,
+        'bytes_per_candle': size / float(len(frame)) if len(frame) else 0.0,
+        'encode_candles_per_second': len(frame) / encode_seconds,
+        'decode_candles_per_second': len(frame) / decode_seconds,
+        'lossless': bool(np.array_equal(decoded.records, frame.records))
+    }
+
+
+def _random_walk(count, granularity=60, seed=0):
+    """Minute candles resembling a quote increment of 0.01"""
+    rng = np.random.default_rng(seed)
+    times = np.arange(count, dtype=np.int64) * granularity
+    keep = rng.random(count) > 0.02
+    close = np.round(10000 + np.cumsum(rng.normal(0, 5, count)), 2)
+    _open = np.round(np.r_[close[0], close[:-1]], 2)
+    high = np.round(np.maximum(_open, close) + rng.exponential(2, count), 2)
+    low = np.round(np.minimum(_open, close) - rng.exponential(2, count), 2)
+    volume = np.round(rng.exponential(3, count), 8)
+    frame = CandleFrame.from_columns(times, low, high, _open, close, volume)
+    return CandleFrame(frame.records[keep])
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) == 4:
+        from .store import CandleStore
+        source = CandleStore(sys.argv[1]).read(sys.argv[2], sys.argv[3])
+        print('{} @ {}s from {}'.format(sys.argv[2], sys.argv[3],
+                                        sys.argv[1]))
+    else:
+        source = _random_walk(525600)
+        print('one year of synthetic minute candles')
+    for name, value in benchmark(source).items():
+        print('{:>28}: {}'.format(name, value))
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from data.codec import CandleArchive
+from data.codec import _random_walk
+from data.codec import decimals
+from data.codec import decode_block
+from data.codec import decode_varints
+from data.codec import encode_block
+from data.codec import encode_varints
+from data.codec import unzigzag
+from data.codec import write_archive
+from data.codec import zigzag
+from data.frame import CandleFrame
+
+
+class TestCodec(unittest.TestCase):
+    def setUp(self):
+        self.frame = _random_walk(20000)
+
+    def test_varints(self):
+        values = np.array([0, 1, 127, 128, 300, 2**35, 2**63 + 5, 2**64 - 1],
+                          dtype=np.uint64)
+        data = encode_varints(values)
+        self.assertEqual(data[:4], b'\x00\x01\x7f\x80')
+        np.testing.assert_array_equal(decode_varints(data), values)
+
+    def test_zigzag(self):
+        values = np.array([0, -1, 1, -2, 2**62, -2**63], dtype=np.int64)
+        self.assertEqual(zigzag(values[:4]).tolist(), [0, 1, 2, 3])
+        np.testing.assert_array_equal(unzigzag(zigzag(values)), values)
+
+    def test_decimals(self):
+        self.assertEqual(decimals('0.01'), 2)
+        self.assertEqual(decimals(1e-08), 8)
+        self.assertEqual(decimals('1.00000000'), 0)
+
+    def test_lossless_and_compact(self):
+        block = encode_block(self.frame, '0.01', '0.00000001')
+        decoded = decode_block(block)
+        np.testing.assert_array_equal(decoded.records, self.frame.records)
+        self.assertLess(len(block) * 3, self.frame.nbytes)
+
+    def test_regular_times_cost_a_byte(self):
+        times = np.arange(1000) * 60 + 1546300800
+        frame = CandleFrame.from_columns(times, 1, 1, 1, 1, 0)
+        block = encode_block(frame)
+        self.assertLess(len(block), 1000 * 1 + 5 * 1000 + 100)
+        np.testing.assert_array_equal(decode_block(block).time, times)
+
+    def test_raw_fallback(self):
+        frame = self.frame[:100].copy()
+        frame.close[3] = 1 / 3.0
+        frame.volume[5] = np.nan
+        decoded = decode_block(encode_block(frame, '0.01'))
+        self.assertEqual(decoded.records.tobytes(), frame.records.tobytes())
+
+    def test_negative_zero_and_huge_values(self):
+        frame = self.frame[:100].copy()
+        frame.low[2] = -0.0
+        frame.volume[4] = -0.0
+        for increment in ('0.01', None):
+            decoded = decode_block(encode_block(frame, increment))
+            self.assertEqual(decoded.records.tobytes(),
+                             frame.records.tobytes())
+
+        frame = self.frame[:100].copy()
+        frame.high[7] = 1e300
+        frame.volume[8] = 1.7e308
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            decoded = decode_block(encode_block(frame))
+        self.assertEqual(decoded.records.tobytes(), frame.records.tobytes())
+
+    def test_empty_block(self):
+        self.assertEqual(len(decode_block(encode_block(CandleFrame()))), 0)
+
+
+class TestCandleArchive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'BTC-USD-60.cga')
+        self.frame = _random_walk(10000)
+        write_archive(self.path, self.frame, block_size=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_range_reads(self):
+        with CandleArchive(self.path) as archive:
+            self.assertEqual(len(archive), len(self.frame))
+            self.assertEqual(len(archive.index), 10)
+            start, end = 123 * 60, 4567 * 60
+            np.testing.assert_array_equal(
+                archive.range(start, end).records,
+                self.frame.between(start, end).records)
+            self.assertEqual(len(archive.range(-600, 0)), 0)
+            np.testing.assert_array_equal(archive.read().records,
+                                          self.frame.records)
+
+
+if __name__ == '__main__':
+    unittest.main()
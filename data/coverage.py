@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+""" Tracks which time ranges of candle data have already been fetched.
+
+A CoverageMap holds one IntervalSet per (product_id, granularity) and is
+persisted as a small JSON file so that repeated runs only request the
+ranges that are still missing.
+"""
+import bisect
+import json
+import logging
+import os
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+
+class IntervalSet:
+    """A sorted set of disjoint, half-open [start, end) integer intervals.
+
+    Adjacent and overlapping intervals are merged on insert, so the set
+    always holds the minimal number of intervals.
+    """
+    def __init__(self, intervals=None):
+        """A sorted set of disjoint, half-open [start, end) intervals
+
+        Keyword arguments:
+        intervals -- optional iterable of (start, end) pairs
+        """
+        self._starts = []
+        self._ends = []
+        for start, end in intervals or ():
+            self.add(start, end)
+
+    def add(self, start, end):
+        """Adds [start, end) to the set, merging with any neighbours"""
+        if start >= end:
+            return
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def remove(self, start, end):
+        """Removes [start, end) from the set, splitting intervals if needed"""
+        if start >= end:
+            return
+        lo = bisect.bisect_right(self._ends, start)
+        hi = bisect.bisect_left(self._starts, end)
+        if lo >= hi:
+            return
+        starts, ends = [], []
+        if self._starts[lo] < start:
+            starts.append(self._starts[lo])
+            ends.append(start)
+        if self._ends[hi - 1] > end:
+            starts.append(end)
+            ends.append(self._ends[hi - 1])
+        self._starts[lo:hi] = starts
+        self._ends[lo:hi] = ends
+
+    def missing(self, start, end):
+        """Returns the sub-ranges of [start, end) that are not in the set"""
+        gaps = []
+        cursor = start
+        lo = bisect.bisect_right(self._ends, start)
+        for i in range(lo, len(self._starts)):
+            if self._starts[i] >= end:
+                break
+            if self._starts[i] > cursor:
+                gaps.append((cursor, self._starts[i]))
+            cursor = max(cursor, self._ends[i])
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def overlap(self, start, end):
+        """Returns the sub-ranges of [start, end) that are in the set"""
+        found = []
+        lo = bisect.bisect_right(self._ends, start)
+        for i in range(lo, len(self._starts)):
+            if self._starts[i] >= end:
+                break
+            found.append((max(start, self._starts[i]), min(end,
+                                                           self._ends[i])))
+        return found
+
+    def covers(self, start, end):
+        """True if [start, end) is entirely contained in the set"""
+        return not self.missing(start, end)
+
+    def total(self):
+        """Total length of all intervals in the set"""
+        return sum(e - s for s, e in zip(self._starts, self._ends))
+
+    def to_list(self):
+        return [[s, e] for s, e in zip(self._starts, self._ends)]
+
+    def __contains__(self, point):
+        i = bisect.bisect_right(self._starts, point) - 1
+        return i >= 0 and point < self._ends[i]
+
+    def __iter__(self):
+        return iter(list(zip(self._starts, self._ends)))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and \
+            self.to_list() == other.to_list()
+
+    def __str__(self):
+        return str(self.to_list())
+
+
+class CoverageMap:
+    """A persistent map of (product_id, granularity) -> covered time ranges.
+
+    Two interval sets are kept for every key:
+    covered -- ranges that were fetched successfully
+    empty -- ranges that were re-requested as holes and are confirmed to
+             have no candles (Coinbase skips intervals without trades)
+
+    All times are integer seconds since the epoch (UTC).
+    """
+    def __init__(self, path=None):
+        """A persistent map of (product_id, granularity) -> covered ranges
+
+        Keyword arguments:
+        path -- optional JSON file used by load() and save()
+        """
+        self.path = path
+        self._covered = {}
+        self._empty = {}
+        if path and os.path.exists(path):
+            self.load()
+
+    def covered(self, product_id, granularity) -> IntervalSet:
+        key = (product_id, int(granularity))
+        return self._covered.setdefault(key, IntervalSet())
+
+    def empty(self, product_id, granularity) -> IntervalSet:
+        key = (product_id, int(granularity))
+        return self._empty.setdefault(key, IntervalSet())
+
+    def add(self, product_id, granularity, start, end):
+        """Marks [start, end) as fetched"""
+        self.covered(product_id, granularity).add(int(start), int(end))
+
+    def record(self, product_id, granularity, start, end, times):
+        """Marks [start, end) as fetched.
+
+        Buckets without a candle are confirmed empty only where [start, end)
+        had been fetched before, i.e. when a known hole came back empty a
+        second time. After a first fetch they stay holes.
+
+        Keyword arguments:
+        times -- sorted bucket start times returned for [start, end)
+        """
+        granularity = int(granularity)
+        start, end = int(start), int(end)
+        fetched_before = IntervalSet(
+            self.covered(product_id, granularity).overlap(start, end))
+        self.add(product_id, granularity, start, end)
+        edges = [start - granularity] + list(times) + [end]
+        for prev, nxt in zip(edges, edges[1:]):
+            if nxt > prev + granularity:
+                for gap in fetched_before.overlap(prev + granularity, nxt):
+                    self.mark_empty(product_id, granularity, *gap)
+
+    def discard(self, product_id, granularity, start, end):
+        """Forgets [start, end) so that the next sync fetches it again"""
+        self.covered(product_id, granularity).remove(int(start), int(end))
+        self.empty(product_id, granularity).remove(int(start), int(end))
+
+    def mark_empty(self, product_id, granularity, start, end):
+        """Records [start, end) as a confirmed no-trade range"""
+        self.empty(product_id, granularity).add(int(start), int(end))
+
+    def missing(self, product_id, granularity, start, end):
+        """Returns the sub-ranges of [start, end) that were never fetched"""
+        return self.covered(product_id, granularity).missing(
+            int(start), int(end))
+
+    def holes(self, product_id, granularity, times, start=None, end=None):
+        """Finds gaps inside stored data that should be requested again.
+
+        A hole is a run of missing buckets between two stored candles (or
+        between a covered edge and the first/last stored candle) that lies
+        inside a covered range and has not already been confirmed empty.
+
+        Keyword arguments:
+        times -- sorted bucket start times of the candles already stored
+        start -- optional lower bound for the search
+        end -- optional upper bound for the search
+
+        Returns:
+        [(start, end), ...]
+        """
+        granularity = int(granularity)
+        covered = self.covered(product_id, granularity)
+        empty = self.empty(product_id, granularity)
+        lo = start if start is not None else -2**62
+        hi = end if end is not None else 2**62
+
+        holes = []
+        for c_start, c_end in covered.overlap(lo, hi):
+            stored = list(_between(times, c_start, c_end))
+            edges = [c_start - granularity] + stored + [c_end]
+            for prev, nxt in zip(edges, edges[1:]):
+                gap_start = prev + granularity
+                if nxt > gap_start:
+                    holes.extend(empty.missing(gap_start, nxt))
+        return holes
+
+    def load(self):
+        with open(self.path) as fp:
+            raw = json.load(fp)
+        self._covered = {}
+        self._empty = {}
+        for product_id, granularities in raw.items():
+            for granularity, sets in granularities.items():
+                key = (product_id, int(granularity))
+                self._covered[key] = IntervalSet(sets.get('covered', []))
+                self._empty[key] = IntervalSet(sets.get('empty', []))
+
+    def save(self):
+        """Atomically writes the map to `path`"""
+        if not self.path:
+            return
+        raw = {}
+        for key in set(self._covered) | set(self._empty):
+            product_id, granularity = key
+            raw.setdefault(product_id, {})[str(granularity)] = {
+                'covered': self.covered(*key).to_list(),
+                'empty': self.empty(*key).to_list()
+            }
+        tmp = '{}.tmp'.format(self.path)
+        with open(tmp, 'w') as fp:
+            json.dump(raw, fp, sort_keys=True)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, self.path)
+        event_log.debug('coverage saved to %s', self.path)
+
+    def __contains__(self, key):
+        return key in self._covered
+
+    def __str__(self):
+        return str({k: str(v) for k, v in self._covered.items()})
+
+
+def _between(times, start, end):
+    """Returns the values of sorted `times` that fall within [start, end)"""
+    lo = bisect.bisect_left(times, start)
+    hi = bisect.bisect_left(times, end)
+    return times[lo:hi]
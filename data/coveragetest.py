@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from data.coverage import CoverageMap
+from data.coverage import IntervalSet
+
+
+class TestIntervalSet(unittest.TestCase):
+    def test_add_merges(self):
+        iset = IntervalSet()
+        iset.add(0, 10)
+        iset.add(20, 30)
+        self.assertEqual(iset.to_list(), [[0, 10], [20, 30]])
+
+        # Adjacent intervals merge
+        iset.add(10, 15)
+        self.assertEqual(iset.to_list(), [[0, 15], [20, 30]])
+
+        # Bridging intervals merge
+        iset.add(12, 25)
+        self.assertEqual(iset.to_list(), [[0, 30]])
+        self.assertEqual(iset.total(), 30)
+
+    def test_remove_splits(self):
+        iset = IntervalSet([(0, 100)])
+        iset.remove(40, 60)
+        self.assertEqual(iset.to_list(), [[0, 40], [60, 100]])
+        iset.remove(-10, 5)
+        self.assertEqual(iset.to_list(), [[5, 40], [60, 100]])
+        self.assertTrue(10 in iset)
+        self.assertFalse(50 in iset)
+
+    def test_missing(self):
+        iset = IntervalSet([(10, 20), (30, 40)])
+        self.assertEqual(iset.missing(0, 50), [(0, 10), (20, 30), (40, 50)])
+        self.assertEqual(iset.missing(12, 18), [])
+        self.assertEqual(iset.missing(15, 35), [(20, 30)])
+        self.assertTrue(iset.covers(30, 40))
+
+
+class TestCoverageMap(unittest.TestCase):
+    def test_missing_and_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'coverage.json')
+            cov = CoverageMap(path)
+            cov.add('BTC-USD', 60, 0, 6000)
+            cov.save()
+
+            cov = CoverageMap(path)
+            self.assertEqual(cov.missing('BTC-USD', 60, 0, 12000),
+                             [(6000, 12000)])
+            self.assertEqual(cov.missing('ETH-USD', 60, 0, 600), [(0, 600)])
+
+    def test_holes(self):
+        cov = CoverageMap()
+        cov.add('BTC-USD', 60, 0, 600)
+
+        # Buckets 120 and 180 are missing and bucket 540 is past the tail
+        times = [0, 60, 240, 300, 360, 420, 480]
+        self.assertEqual(cov.holes('BTC-USD', 60, times),
+                         [(120, 240), (540, 600)])
+
+        # Confirmed no-trade ranges are not holes
+        cov.mark_empty('BTC-USD', 60, 120, 240)
+        self.assertEqual(cov.holes('BTC-USD', 60, times), [(540, 600)])
+
+    def test_record(self):
+        cov = CoverageMap()
+        cov.record('BTC-USD', 60, 0, 600, [0, 60, 240])
+        # A first fetch only finds holes
+        self.assertEqual(cov.empty('BTC-USD', 60).to_list(), [])
+        self.assertEqual(cov.holes('BTC-USD', 60, [0, 60, 240]),
+                         [(120, 240), (300, 600)])
+
+        # Holes that come back empty again are confirmed
+        cov.record('BTC-USD', 60, 120, 600, [240, 300])
+        self.assertEqual(cov.empty('BTC-USD', 60).to_list(),
+                         [[120, 240], [360, 600]])
+        self.assertEqual(cov.holes('BTC-USD', 60, [0, 60, 240, 300]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
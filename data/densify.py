@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+""" Regularizes sparse candle series onto a fixed time step.
+
+Coinbase publishes no candle for an interval without trades, so the series
+returned by `MarketData.candles` are ragged. The functions here scatter
+candles onto a dense, evenly spaced time axis and fill the gaps:
+
+'ffill' -- open, high, low and close repeat the previous close and the
+           volume is zero, which is what the market looked like
+'nan' -- every price is NaN and the volume is zero
+
+Either way a boolean mask marks the buckets that held a real candle. Many
+products can be aligned onto one shared axis in a single pass.
+"""
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from .frame import CandleFrame
+from .resample import parse_granularity
+
+FILLS = ('ffill', 'nan')
+PRICES = ('low', 'high', 'open', 'close')
+
+
+class AlignedCandles:
+    """Candles for several products on one shared, dense time axis.
+
+    Attributes:
+    time -- int64 array with one entry per bucket
+    products -- the product_ids, in row order
+    mask -- bool array (products, buckets), True where a candle existed
+    low, high, open, close, volume -- float64 arrays (products, buckets)
+    """
+    def __init__(self, time, products, mask, columns):
+        self.time = time
+        self.products = list(products)
+        self.mask = mask
+        self.columns = columns
+
+    @property
+    def low(self):
+        return self.columns['low']
+
+    @property
+    def high(self):
+        return self.columns['high']
+
+    @property
+    def open(self):
+        return self.columns['open']
+
+    @property
+    def close(self):
+        return self.columns['close']
+
+    @property
+    def volume(self):
+        return self.columns['volume']
+
+    @property
+    def gaps(self):
+        """Number of filled buckets per product"""
+        return dict(zip(self.products, (~self.mask).sum(axis=1).tolist()))
+
+    def frame(self, product_id) -> CandleFrame:
+        row = self.products.index(product_id)
+        return CandleFrame.from_columns(self.time,
+                                        *(self.columns[label][row]
+                                          for label in CandleFrame.labels[1:]))
+
+    def __len__(self):
+        return len(self.time)
+
+    def __str__(self):
+        return 'AlignedCandles({} products, {} buckets)'.format(
+            len(self.products), len(self.time))
+
+
+def align(frames: dict, granularity, start=None, end=None,
+          fill='ffill') -> AlignedCandles:
+    """Scatters the candles of many products onto one shared time axis.
+
+    All products are placed with a single vectorized scatter and filled
+    with a single forward pass, without a Python loop over buckets.
+
+    Keyword arguments:
+    frames -- {product_id: CandleFrame, candle dicts or raw rows}
+    granularity -- the bucket size in seconds, or a string like '1h'
+    start -- first bucket, defaults to the earliest candle
+    end -- end of the axis (exclusive), defaults to after the latest candle
+    fill -- one of FILLS
+
+    Returns:
+    AlignedCandles
+
+    Raises:
+    InvalidArgument -- for an unknown fill, or candles off the time grid
+    """
+    if fill not in FILLS:
+        raise InvalidArgument('fill must be one of {}'.format(FILLS))
+    granularity = parse_granularity(granularity)
+    products = list(frames)
+    frames = [CandleFrame.coerce(frames[p]) for p in products]
+
+    times = np.concatenate([f.time for f in frames]) if frames else \
+        np.empty(0, dtype=np.int64)
+    if start is None:
+        start = int(times.min()) if len(times) else 0
+    if end is None:
+        end = int(times.max()) + granularity if len(times) else start
+    start = int(start)
+    axis = np.arange(start, max(int(end), start), granularity, dtype=np.int64)
+
+    rows = np.repeat(np.arange(len(frames)), [len(f) for f in frames])
+    offset = times - start
+    if np.any(offset % granularity):
+        raise InvalidArgument('candles are not aligned to {}s buckets '
+                              'starting at {}'.format(granularity, start))
+    columns = offset // granularity
+    inside = (columns >= 0) & (columns < len(axis))
+    rows, columns = rows[inside], columns[inside]
+
+    shape = (len(frames), len(axis))
+    mask = np.zeros(shape, dtype=bool)
+    mask[rows, columns] = True
+    result = {label: np.full(shape, np.nan) for label in PRICES}
+    result['volume'] = np.zeros(shape)
+    if frames:
+        records = np.concatenate([f.records for f in frames])[inside]
+        for label in CandleFrame.labels[1:]:
+            result[label][rows, columns] = records[label]
+
+    if fill == 'ffill' and mask.size:
+        # Index of the latest real candle at or before every bucket
+        last = np.where(mask, np.arange(shape[1]), -1)
+        np.maximum.accumulate(last, axis=1, out=last)
+        close = np.take_along_axis(result['close'], np.maximum(last, 0),
+                                   axis=1)
+        close[last < 0] = np.nan
+        for label in PRICES:
+            np.copyto(result[label], close, where=~mask)
+
+    return AlignedCandles(axis, products, mask, result)
+
+
+def densify(candles, granularity, start=None, end=None, fill='ffill'):
+    """Turns a sparse candle series into a dense, evenly spaced one.
+
+    Buckets before the first candle have no previous close, so they stay
+    NaN even with 'ffill'.
+
+    Keyword arguments:
+    candles -- a CandleFrame, candle dicts or raw rows
+    granularity -- the bucket size in seconds, or a string like '1h'
+    start -- first bucket, defaults to the first candle
+    end -- end of the series (exclusive), defaults to after the last candle
+    fill -- one of FILLS
+
+    Returns:
+    (CandleFrame, mask) where mask is True for buckets that held a candle
+    """
+    aligned = align({None: candles}, granularity, start, end, fill)
+    return aligned.frame(None), aligned.mask[0]
+
+
+def gap_mask(candles, granularity, start, end):
+    """Returns a bool array over the buckets of [start, end) that is True
+    where no candle exists
+    """
+    return ~densify(candles, granularity, start, end, 'nan')[1]
@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from data.densify import align
+from data.densify import densify
+from data.densify import gap_mask
+from data.frame import CandleFrame
+
+# time, low, high, open, close, volume; nothing traded at 120 and 180
+ROWS = [[60, 9, 12, 10, 11, 1], [0, 8, 11, 9, 10, 2], [240, 12, 14, 13, 13, 3]]
+
+
+class TestDensify(unittest.TestCase):
+    def test_forward_fill(self):
+        frame, mask = densify(CandleFrame.from_rows(ROWS), 60)
+        self.assertEqual(frame.time.tolist(), [0, 60, 120, 180, 240])
+        self.assertEqual(mask.tolist(), [True, True, False, False, True])
+        self.assertEqual(frame.to_rows()[2], (120, 11, 11, 11, 11, 0))
+        self.assertEqual(frame.to_rows()[4], (240, 12, 14, 13, 13, 3))
+
+    def test_nan_fill(self):
+        frame, mask = densify(ROWS, '1m', fill='nan')
+        self.assertTrue(np.isnan(frame.close[2:4]).all())
+        self.assertEqual(frame.volume.tolist(), [2, 1, 0, 0, 3])
+
+    def test_leading_gap_has_no_close(self):
+        frame, mask = densify(ROWS, 60, start=-120, end=300)
+        self.assertEqual(len(frame), 7)
+        self.assertTrue(np.isnan(frame.close[:2]).all())
+        self.assertEqual(frame.close[-1], 13)
+
+    def test_range_clips_candles(self):
+        frame, mask = densify(ROWS, 60, start=60, end=180)
+        self.assertEqual(frame.time.tolist(), [60, 120])
+        self.assertEqual(mask.tolist(), [True, False])
+
+    def test_gap_mask(self):
+        self.assertEqual(gap_mask(ROWS, 60, 0, 300).tolist(),
+                         [False, False, True, True, False])
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidArgument):
+            densify(ROWS, 60, fill='zero')
+        with self.assertRaises(InvalidArgument):
+            densify(ROWS, 60, start=30)
+
+
+class TestAlign(unittest.TestCase):
+    def test_shared_axis(self):
+        frames = {
+            'BTC-USD': CandleFrame.from_rows(ROWS),
+            'ETH-USD': CandleFrame.from_rows([[120, 1, 2, 1, 2, 5]])
+        }
+        aligned = align(frames, 60, 0, 300)
+        self.assertEqual(aligned.close.shape, (2, 5))
+        self.assertEqual(aligned.mask.sum(axis=1).tolist(), [3, 1])
+        self.assertEqual(aligned.gaps, {'BTC-USD': 2, 'ETH-USD': 4})
+        eth = aligned.frame('ETH-USD')
+        self.assertTrue(np.isnan(eth.close[:2]).all())
+        self.assertEqual(eth.close[2:].tolist(), [2, 2, 2])
+        self.assertEqual(eth.volume.tolist(), [0, 0, 5, 0, 0])
+
+    def test_matches_loop(self):
+        rng = np.random.default_rng(7)
+        frames = {}
+        for product in range(5):
+            times = np.sort(rng.choice(1000, 300, replace=False)) * 60
+            close = rng.random(len(times))
+            frames[product] = CandleFrame.from_columns(
+                times, close, close, close, close, np.ones(len(times)))
+        aligned = align(frames, 60, 0, 60000)
+        for product, frame in frames.items():
+            closes = dict(zip(frame.time.tolist(), frame.close.tolist()))
+            previous = np.nan
+            expected = []
+            for t in range(0, 60000, 60):
+                previous = closes.get(t, previous)
+                expected.append(previous)
+            np.testing.assert_array_equal(aligned.frame(product).close,
+                                          expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
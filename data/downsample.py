@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+""" Shape-preserving downsampling of candle series for charts.
+
+A browser chart cannot draw millions of points, and keeping every n-th
+point (decimation) drops exactly the spikes a chart is meant to show.
+Both methods here pick real points and return their indices:
+
+lttb -- Largest-Triangle-Three-Buckets keeps, per bucket, the point that
+        spans the largest triangle with its neighbours, which follows the
+        visual shape of a line
+minmax -- keeps the lowest and highest point of every bucket, so no peak
+          or trough is ever lost
+
+Both run over NumPy arrays; minmax is fully vectorized and lttb loops once
+per output bucket (not per input point).
+"""
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from .frame import CandleFrame
+
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(x, y, threshold) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Keyword arguments:
+    x -- ascending x values, e.g. candle times
+    y -- the values to plot
+    threshold -- the number of points to keep, at least 3
+
+    Returns:
+    the sorted indices of the kept points, always including the first
+    and the last
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or n < 3:
+        return np.arange(n)
+    if threshold < 3:
+        raise InvalidArgument('lttb needs a threshold of at least 3')
+
+    # The first and last points are kept; the rest is cut into buckets
+    edges = (np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    x_means = np.add.reduceat(x[:-1], starts) / counts
+    y_means = np.add.reduceat(y[:-1], starts) / counts
+    # The bucket after the last one is the final point itself
+    x_next = np.r_[x_means[1:], x[-1]]
+    y_next = np.r_[y_means[1:], y[-1]]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i, (lo, hi) in enumerate(zip(starts.tolist(), ends.tolist())):
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - x_next[i]) * (y[lo:hi] - ay) -
+                      (ax - x[lo:hi]) * (y_next[i] - ay))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax(y, width, low=None) -> np.ndarray:
+    """Min/max-per-bucket downsampling.
+
+    Keyword arguments:
+    y -- the values to plot, or the highs of candles
+    width -- the number of buckets, e.g. the chart width in pixels
+    low -- optional lows of candles; the minimum is taken from these
+
+    Returns:
+    the sorted, unique indices of the kept points: at most two per bucket
+    plus the first and last point
+    """
+    high = np.asarray(y, dtype=np.float64)
+    low = high if low is None else np.asarray(low, dtype=np.float64)
+    n = len(high)
+    if 2 * width + 2 >= n:
+        return np.arange(n)
+    if width < 1:
+        raise InvalidArgument('minmax needs a width of at least 1')
+
+    size = -(-n // width)
+    padding = size * width - n
+    highs = np.r_[high, np.full(padding, -np.inf)].reshape(width, size)
+    lows = np.r_[low, np.full(padding, np.inf)].reshape(width, size)
+    offsets = np.arange(width) * size
+    indices = np.concatenate([
+        [0], offsets + np.argmax(highs, axis=1),
+        offsets + np.argmin(lows, axis=1), [n - 1]
+    ])
+    return np.unique(indices[indices < n])
+
+
+def downsample(candles, width, method='minmax', column='close') -> CandleFrame:
+    """Reduces candles to about `width` points for drawing.
+
+    Keyword arguments:
+    candles -- a CandleFrame, candle dicts or raw rows, sorted by time
+    width -- the target number of buckets, e.g. the chart width in pixels
+    method -- one of METHODS. 'minmax' keeps the candle with the highest
+              high and the one with the lowest low per bucket; 'lttb'
+              keeps `width` candles following the shape of `column`
+    column -- the series LTTB follows, e.g. 'close' or 'volume'
+
+    Returns:
+    a CandleFrame of the kept candles
+    """
+    frame = CandleFrame.coerce(candles)
+    if method == 'minmax':
+        if column in ('close', 'open', 'high', 'low'):
+            indices = minmax(frame.high, width, frame.low)
+        else:
+            indices = minmax(frame.records[column], width)
+    elif method == 'lttb':
+        indices = lttb(frame.time, frame.records[column], width)
+    else:
+        raise InvalidArgument('method must be one of {}'.format(METHODS))
+    return CandleFrame(frame.records[indices])
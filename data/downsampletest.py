@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from data.downsample import downsample
+from data.downsample import lttb
+from data.downsample import minmax
+from data.frame import CandleFrame
+
+
+def reference_lttb(x, y, threshold):
+    """A direct, loop-per-point port of the original algorithm"""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n)
+        if i == threshold - 3:
+            next_lo, next_hi = n - 1, n
+        avg_x = sum(x[next_lo:next_hi]) / (next_hi - next_lo)
+        avg_y = sum(y[next_lo:next_hi]) / (next_hi - next_lo)
+        best, best_area = lo, -1
+        for j in range(lo, hi):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) -
+                       (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+class TestDownsample(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.x = np.arange(5000, dtype=np.float64) * 60
+        self.y = np.cumsum(rng.normal(0, 1, 5000))
+
+    def test_lttb_matches_reference(self):
+        for threshold in (3, 10, 97, 500):
+            self.assertEqual(
+                lttb(self.x, self.y, threshold).tolist(),
+                reference_lttb(self.x.tolist(), self.y.tolist(), threshold))
+
+    def test_lttb_small_inputs(self):
+        self.assertEqual(lttb(self.x[:5], self.y[:5], 10).tolist(),
+                         [0, 1, 2, 3, 4])
+        with self.assertRaises(InvalidArgument):
+            lttb(self.x, self.y, 2)
+
+    def test_minmax_keeps_extremes(self):
+        y = self.y.copy()
+        y[1234], y[4321] = 1000, -1000
+        indices = minmax(y, 50)
+        self.assertIn(1234, indices)
+        self.assertIn(4321, indices)
+        self.assertLessEqual(len(indices), 102)
+        self.assertEqual((indices[0], indices[-1]), (0, 4999))
+        # Plain decimation would have missed both spikes
+        self.assertNotIn(1234, range(0, 5000, 50))
+
+    def test_minmax_candles(self):
+        close = self.y
+        frame = CandleFrame.from_columns(self.x, close - 1, close + 1, close,
+                                         close, 1)
+        frame.high[777] = 500
+        frame.low[3333] = -500
+        small = downsample(frame, 40)
+        self.assertEqual(small.high.max(), 500)
+        self.assertEqual(small.low.min(), -500)
+        self.assertTrue(np.all(np.diff(small.time) > 0))
+        self.assertEqual(len(downsample(frame, 40, 'lttb', 'volume')), 40)
+        with self.assertRaises(InvalidArgument):
+            downsample(frame, 40, 'every_nth')
+
+    def test_millions_of_points(self):
+        rng = np.random.default_rng(1)
+        y = np.cumsum(rng.normal(0, 1, 2000000))
+        x = np.arange(len(y), dtype=np.float64)
+        self.assertEqual(len(lttb(x, y, 1000)), 1000)
+        self.assertLessEqual(len(minmax(y, 1000)), 2002)
+
+
+if __name__ == '__main__':
+    unittest.main()
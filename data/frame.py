@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+""" Columnar candle data.
+
+A CandleFrame wraps a NumPy structured array whose fields follow the
+Coinbase bucket layout: time, low, high, open, close, volume. The same
+record layout is used on disk by the CandleStore, so frames read from a
+store are zero-copy views of the mapped file.
+"""
+import numpy as np
+
+from api.exchange.candle import Candle
+
+CANDLE_DTYPE = np.dtype([('time', '<i8'), ('low', '<f8'), ('high', '<f8'),
+                         ('open', '<f8'), ('close', '<f8'),
+                         ('volume', '<f8')])
+
+
+class CandleFrame:
+    """Columnar OHLCV data sorted by time.
+
+    Supports:
+    len(frame),
+    frame[i] and frame[i:j],
+    frame.time, frame.low, frame.high, frame.open, frame.close, frame.volume
+    """
+    labels = ['time', 'low', 'high', 'open', 'close', 'volume']
+
+    def __init__(self, records=None):
+        """Columnar OHLCV data sorted by time
+
+        Keyword arguments:
+        records -- optional structured array with dtype CANDLE_DTYPE
+        """
+        if records is None:
+            records = np.empty(0, dtype=CANDLE_DTYPE)
+        self.records = records
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a frame from raw `[time, low, high, open, close, volume]`
+        rows as returned by `Exchange.candles`
+        """
+        values = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+        records = np.empty(len(values), dtype=CANDLE_DTYPE)
+        records['time'] = values[:, 0]
+        for i, label in enumerate(cls.labels[1:], 1):
+            records[label] = values[:, i]
+        return cls(records)
+
+    @classmethod
+    def from_dicts(cls, candles):
+        """Builds a frame from the dicts returned by `MarketData.candles`"""
+        return cls.from_rows([[c[label] for label in cls.labels]
+                              for c in candles])
+
+    @classmethod
+    def coerce(cls, candles):
+        """Returns `candles` as a CandleFrame.
+
+        Accepts a CandleFrame, a list of `MarketData.candles` dicts or a list
+        of raw `[time, low, high, open, close, volume]` rows.
+        """
+        if isinstance(candles, CandleFrame):
+            return candles
+        if isinstance(candles, np.ndarray) and candles.dtype == CANDLE_DTYPE:
+            return cls(candles)
+        candles = list(candles)
+        if candles and isinstance(candles[0], dict):
+            return cls.from_dicts(candles)
+        return cls.from_rows(candles)
+
+    @classmethod
+    def from_columns(cls, time, low, high, open, close, volume):
+        records = np.empty(len(time), dtype=CANDLE_DTYPE)
+        records['time'] = time
+        records['low'] = low
+        records['high'] = high
+        records['open'] = open
+        records['close'] = close
+        records['volume'] = volume
+        return cls(records)
+
+    @classmethod
+    def concat(cls, frames):
+        frames = [f.records for f in frames if len(f)]
+        if not frames:
+            return cls()
+        return cls(np.concatenate(frames))
+
+    @property
+    def time(self):
+        return self.records['time']
+
+    @property
+    def low(self):
+        return self.records['low']
+
+    @property
+    def high(self):
+        return self.records['high']
+
+    @property
+    def open(self):
+        return self.records['open']
+
+    @property
+    def close(self):
+        return self.records['close']
+
+    @property
+    def volume(self):
+        return self.records['volume']
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def between(self, start, end):
+        """Returns the candles with `start <= time < end` as a view.
+
+        The frame must be sorted by time; the lookup is a binary search.
+        """
+        lo, hi = np.searchsorted(self.time, [start, end], side='left')
+        return CandleFrame(self.records[lo:hi])
+
+    def sorted(self):
+        """Returns a copy sorted by time, keeping the first of duplicates"""
+        times, index = np.unique(self.time, return_index=True)
+        return CandleFrame(self.records[index])
+
+    def copy(self):
+        return CandleFrame(self.records.copy())
+
+    def to_rows(self):
+        return self.records.tolist()
+
+    def to_dicts(self):
+        return [dict(zip(self.labels, row)) for row in self.records.tolist()]
+
+    def to_candles(self):
+        return [Candle(*row) for row in self.records.tolist()]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CandleFrame(self.records[index])
+        return self.records[index]
+
+    def __str__(self):
+        return 'CandleFrame({} candles)'.format(len(self))
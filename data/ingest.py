@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+""" Bulk ingestion of candle data into Elasticsearch.
+
+Candles are encoded straight into NDJSON bytes, cut into chunks bounded by
+a document count and a byte size, and posted to the `_bulk` endpoint by a
+pool of worker threads. Every document id is `product:granularity:time`,
+so ingesting the same range twice overwrites instead of duplicating.
+"""
+import json
+import logging
+import math
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests import exceptions as rqex
+
+from api.coinbase.constants import CBConst
+from .frame import CandleFrame
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+# String fields are filled in already JSON encoded, see `ndjson`
+ACTION = '{{"index":{{"_index":{},"_id":"{}:{}:{}"}}}}\n'
+DOCUMENT = '{{"time":{},"product_id":{},"granularity":{},"low":{},' \
+    '"high":{},"open":{},"close":{},"volume":{}}}\n'
+
+
+def _number(value) -> str:
+    """A float as a JSON number, or null for NaN and infinities"""
+    return repr(value) if math.isfinite(value) else 'null'
+
+
+def doc_id(product_id, granularity, time) -> str:
+    """The deterministic Elasticsearch id of a candle"""
+    return '{}:{}:{}'.format(product_id, int(granularity), int(time))
+
+
+def ndjson(index, product_id, granularity, candles) -> list:
+    """Encodes candles as bulk `index` action/document line pairs.
+
+    Returns:
+    a list with one bytes object (two NDJSON lines) per candle
+    """
+    frame = CandleFrame.coerce(candles)
+    granularity = int(granularity)
+    # Quotes and backslashes must not break the bulk body
+    _index, _product_id = json.dumps(index), json.dumps(product_id)
+    lines = []
+    for _time, low, high, _open, close, volume in frame.records.tolist():
+        lines.append((ACTION.format(_index, _product_id[1:-1], granularity,
+                                    _time) +
+                      DOCUMENT.format(_time, _product_id, granularity,
+                                      _number(low), _number(high),
+                                      _number(_open), _number(close),
+                                      _number(volume))).encode())
+    return lines
+
+
+class IngestMetrics:
+    """Thread-safe counters for a BulkIngester"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.docs = 0
+        self.bytes = 0
+        self.requests = 0
+        self.rejected = 0
+        self.retries = 0
+        self.failed_requests = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def docs_per_second(self):
+        return self.docs / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'docs': self.docs,
+                'bytes': self.bytes,
+                'requests': self.requests,
+                'rejected': self.rejected,
+                'retries': self.retries,
+                'failed_requests': self.failed_requests,
+                'elapsed': self.elapsed,
+                'docs_per_second': self.docs_per_second,
+                'bytes_per_second': self.bytes_per_second
+            }
+
+    def __str__(self):
+        return str(self.snapshot())
+
+
+class BulkIngester:
+    """Streams candles into Elasticsearch through parallel bulk requests.
+
+    Chunks are handed to `workers` threads as soon as they fill up. At most
+    `2 * workers` chunks are in flight, so a slow cluster slows the
+    producer down instead of growing an unbounded backlog. Documents
+    rejected with 429 are retried with exponential backoff, other
+    rejections are counted in `metrics`.
+    """
+    def __init__(self,
+                 index,
+                 url='http://localhost:9200',
+                 workers=4,
+                 chunk_docs=5000,
+                 chunk_bytes=5 * 1024 * 1024,
+                 max_retries=3,
+                 backoff=0.5,
+                 session=None):
+        """Streams candles into Elasticsearch through parallel bulk requests
+
+        Keyword arguments:
+        index -- the target index
+        url -- the Elasticsearch (or stand-in) base url
+        workers -- number of concurrent bulk requests
+        chunk_docs -- maximum documents per bulk request
+        chunk_bytes -- maximum body size per bulk request
+        max_retries -- attempts for 429 responses before giving up
+        backoff -- seconds to wait before the first retry, doubled each time
+        session -- optional requests.Session
+        """
+        self.index = index
+        self.url = url.rstrip('/') + '/_bulk'
+        self.chunk_docs = chunk_docs
+        self.chunk_bytes = chunk_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.metrics = IngestMetrics()
+        self._session = session or requests.Session()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._futures = []
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def ingest(self, product_id, granularity, candles):
+        """Queues candles for indexing, sending every chunk that fills up"""
+        for line in ndjson(self.index, product_id, granularity, candles):
+            self.__append(line)
+
+    def ingest_ndjson(self, body: bytes):
+        """Queues an NDJSON body of action/document line pairs, such as
+        the buffers built by `TransformPool.documents`
+        """
+        lines = body.splitlines(keepends=True)
+        for i in range(0, len(lines) - 1, 2):
+            self.__append(lines[i] + lines[i + 1])
+
+    def ingest_slices(self, product_id, granularity, slices):
+        """Indexes an iterable of slices, such as `MarketData.iter_slices`,
+        while it is still being fetched
+        """
+        for _slice in slices:
+            self.ingest(product_id, granularity, _slice)
+
+    def flush(self):
+        """Sends any buffered documents and waits for all bulk requests"""
+        if self._buffer:
+            self.__submit()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        return self.metrics
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown()
+        event_log.info('ingest finished: %s', self.metrics)
+
+    def __append(self, line):
+        self._buffer.append(line)
+        self._buffer_bytes += len(line)
+        if len(self._buffer) >= self.chunk_docs or \
+                self._buffer_bytes >= self.chunk_bytes:
+            self.__submit()
+
+    def __submit(self):
+        chunk, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        self._slots.acquire()
+        future = self._pool.submit(self.__send, chunk)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures = [
+            f for f in self._futures if not f.done() or f.exception()
+        ]
+        self._futures.append(future)
+
+    def __send(self, chunk):
+        attempt = 0
+        while chunk:
+            body = b''.join(chunk)
+            try:
+                response = self._session.post(
+                    self.url,
+                    data=body,
+                    headers={'Content-Type': 'application/x-ndjson'})
+            except rqex.RequestException as err:
+                event_log.exception(err)
+                self.metrics.add(failed_requests=1, rejected=len(chunk))
+                return
+            self.metrics.add(requests=1)
+
+            if response.status_code == CBConst.Status.too_many_requests:
+                retry = chunk
+            elif response.status_code != CBConst.Status.success:
+                event_log.error('bulk request failed: %s %s',
+                                response.status_code, response.text[:200])
+                self.metrics.add(failed_requests=1, rejected=len(chunk))
+                return
+            else:
+                retry = self.__accept(chunk, response.json())
+
+            if retry and attempt < self.max_retries:
+                time.sleep(self.backoff * 2**attempt)
+                attempt += 1
+                self.metrics.add(retries=len(retry))
+                chunk = retry
+            else:
+                if retry:
+                    self.metrics.add(rejected=len(retry))
+                return
+
+    def __accept(self, chunk, result):
+        """Counts indexed and rejected documents.
+
+        Returns:
+        the lines that were rejected with 429 and should be retried
+        """
+        if not result.get('errors'):
+            self.metrics.add(docs=len(chunk), bytes=sum(map(len, chunk)))
+            return []
+
+        retry = []
+        rejected = 0
+        for line, item in zip(chunk, result.get('items', [])):
+            status = next(iter(item.values())).get('status', 500)
+            if status == CBConst.Status.too_many_requests:
+                retry.append(line)
+            elif status >= CBConst.Status.bad_request:
+                rejected += 1
+            else:
+                self.metrics.add(docs=1, bytes=len(line))
+        if rejected:
+            event_log.warning('%i documents rejected', rejected)
+            self.metrics.add(rejected=rejected)
+        return retry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def index_settings() -> dict:
+    """Index settings and mappings for the documents built by `ndjson`"""
+    _float = {'type': 'float'}
+    return {
+        'settings': {},
+        'mappings': {
+            'properties': {
+                'time': {
+                    'type': 'date',
+                    'format': 'epoch_second'
+                },
+                'product_id': {
+                    'type': 'keyword'
+                },
+                'granularity': {
+                    'type': 'integer'
+                },
+                'high': _float,
+                'low': _float,
+                'open': _float,
+                'close': _float,
+                'volume': _float
+            }
+        }
+    }
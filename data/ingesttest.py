@@ -0,0 +1,123 @@
+import json
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from data.frame import CandleFrame
+from data.ingest import BulkIngester
+from data.ingest import ndjson
+
+
+class StandInBulk(BaseHTTPRequestHandler):
+    """A minimal `_bulk` endpoint that stores documents by id and rejects
+    every document whose id is listed in `server.reject`
+    """
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        lines = body.decode().splitlines()
+        items = []
+        for action, doc in zip(lines[::2], lines[1::2]):
+            _id = json.loads(action)['index']['_id']
+            if _id in self.server.reject:
+                items.append({'index': {'_id': _id, 'status': 400}})
+            else:
+                with self.server.lock:
+                    self.server.docs[_id] = json.loads(doc)
+                items.append({'index': {'_id': _id, 'status': 201}})
+        with self.server.lock:
+            self.server.requests += 1
+
+        errors = any(i['index']['status'] >= 400 for i in items)
+        payload = json.dumps({'errors': errors, 'items': items}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBulkIngester(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInBulk)
+        self.server.docs = {}
+        self.server.reject = set()
+        self.server.requests = 0
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.frame = CandleFrame.from_rows([[t, 1.0, 2.0, 1.5, 1.25, 3.0]
+                                            for t in range(0, 60000, 60)])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_ndjson(self):
+        lines = ndjson('candles', 'BTC-USD', 60, self.frame[:1])
+        action, doc = lines[0].decode().splitlines()
+        self.assertEqual(json.loads(action),
+                         {'index': {'_index': 'candles',
+                                    '_id': 'BTC-USD:60:0'}})
+        self.assertEqual(json.loads(doc)['close'], 1.25)
+
+    def test_ndjson_escapes_strings(self):
+        index, product_id = 'can"dles\\', 'BTC-"USD'
+        lines = ndjson(index, product_id, 60, self.frame[:1])
+        action, doc = lines[0].decode().splitlines()
+        self.assertEqual(json.loads(action), {
+            'index': {
+                '_index': index,
+                '_id': '{}:60:0'.format(product_id)
+            }
+        })
+        self.assertEqual(json.loads(doc)['product_id'], product_id)
+
+    def test_ndjson_non_finite(self):
+        frame = CandleFrame.from_rows([[0, float('nan'), 2.0, 1.0,
+                                        float('inf'), -float('inf')]])
+        doc = ndjson('candles', 'BTC-USD', 60, frame)[0].decode()
+        doc = json.loads(doc.splitlines()[1], parse_constant=self.fail)
+        self.assertEqual((doc['low'], doc['close'], doc['volume']),
+                         (None, None, None))
+        self.assertEqual(doc['high'], 2.0)
+
+    def test_idempotent_parallel_ingest(self):
+        for _ in range(2):
+            with BulkIngester('candles', self.url, workers=4,
+                              chunk_docs=100) as ingester:
+                ingester.ingest('BTC-USD', 60, self.frame)
+            self.assertEqual(ingester.metrics.docs, 1000)
+            self.assertEqual(ingester.metrics.requests, 10)
+
+        # The second run overwrote the first
+        self.assertEqual(len(self.server.docs), 1000)
+        self.assertEqual(self.server.docs['BTC-USD:60:600']['time'], 600)
+
+    def test_byte_chunks_and_rejections(self):
+        self.server.reject = {'BTC-USD:60:0', 'BTC-USD:60:60'}
+        size = len(ndjson('candles', 'BTC-USD', 60, self.frame[:1])[0])
+        with BulkIngester('candles', self.url,
+                          chunk_bytes=size * 250) as ingester:
+            ingester.ingest('BTC-USD', 60, self.frame)
+        self.assertGreaterEqual(ingester.metrics.requests, 4)
+        self.assertEqual(ingester.metrics.rejected, 2)
+        self.assertEqual(ingester.metrics.docs, 998)
+
+    def test_prebuilt_ndjson(self):
+        body = b''.join(ndjson('candles', 'ETH-USD', 60, self.frame))
+        with BulkIngester('candles', self.url,
+                          chunk_docs=300) as ingester:
+            ingester.ingest_ndjson(body)
+        self.assertEqual(ingester.metrics.docs, 1000)
+        self.assertEqual(ingester.metrics.requests, 4)
+        self.assertEqual(self.server.docs['ETH-USD:60:60']['time'], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+""" Merges per-window candle results into one ascending series.
+
+Coinbase returns every window newest first and may include candles before
+the requested start, so the windows of `MarketData.slices` are each
+descending, overlap at their edges and, when fetched in parallel, arrive
+in any order. Every window is already a sorted run, so instead of
+concatenating and sorting, runs are reversed where needed, ordered by
+their first candle and merged:
+
+- runs that do not overlap are simply concatenated, which is the common
+  case for adjacent windows;
+- runs that do overlap are combined with a k-way heap merge, which is
+  linear in the number of candles for a fixed number of runs.
+
+Duplicates are dropped while merging, keeping the candle of the earliest
+window passed in.
+"""
+import heapq
+
+from itertools import repeat
+
+import numpy as np
+
+from .frame import CandleFrame
+
+
+def as_run(candles) -> CandleFrame:
+    """Returns `candles` as an ascending CandleFrame.
+
+    A descending window is reversed as a view; only a window that is not
+    ordered at all is sorted.
+    """
+    frame = CandleFrame.coerce(candles)
+    if len(frame) < 2:
+        return frame
+    steps = np.diff(frame.time)
+    if np.all(steps >= 0):
+        return frame
+    if np.all(steps <= 0):
+        return frame[::-1]
+    return CandleFrame(frame.records[np.argsort(frame.time, kind='stable')])
+
+
+def merge_frames(parts, start=None, end=None) -> CandleFrame:
+    """Merges candle windows into one strictly ascending, de-duplicated
+    CandleFrame.
+
+    Keyword arguments:
+    parts -- an iterable of CandleFrames, candle dicts or raw rows, in any
+             order and each ascending or descending
+    start -- optional, drops candles before it
+    end -- optional, drops candles at or after it
+    """
+    runs = [as_run(part) for part in parts]
+    runs = [(i, run) for i, run in enumerate(runs) if len(run)]
+    if not runs:
+        return CandleFrame()
+    runs.sort(key=lambda item: (int(item[1].time[0]), item[0]))
+
+    # Group runs that overlap; separate groups are concatenated as they are
+    merged = []
+    group = [runs[0]]
+    group_end = int(runs[0][1].time[-1])
+    for item in runs[1:]:
+        if int(item[1].time[0]) > group_end:
+            merged.append(_merge_group(group))
+            group = []
+        group.append(item)
+        group_end = max(group_end, int(item[1].time[-1]))
+    merged.append(_merge_group(group))
+
+    records = merged[0] if len(merged) == 1 else np.concatenate(merged)
+    keep = np.r_[True, records['time'][1:] > records['time'][:-1]]
+    frame = CandleFrame(records if keep.all() else records[keep])
+    if start is not None or end is not None:
+        frame = frame.between(
+            frame.time[0] if start is None else start,
+            frame.time[-1] + 1 if end is None else end)
+    return frame
+
+
+def merge_rows(parts, start=None, end=None) -> list:
+    """Like `merge_frames`, returning raw
+    `[time, low, high, open, close, volume]` rows
+    """
+    return merge_frames(parts, start, end).to_rows()
+
+
+def merge_slices(slices, start=None, end=None) -> list:
+    """Like `merge_frames`, for the candle dicts of `MarketData.slices`"""
+    return merge_frames(slices, start, end).to_dicts()
+
+
+def _merge_group(group):
+    """Merges overlapping runs, keeping equal times in input order"""
+    if len(group) == 1:
+        return group[0][1].records
+    records = np.concatenate([run.records for _, run in group])
+    offsets = np.cumsum([0] + [len(run) for _, run in group[:-1]]).tolist()
+    keys = [
+        zip(run.time.tolist(), repeat(i), range(offset, offset + len(run)))
+        for (i, run), offset in zip(group, offsets)
+    ]
+    order = np.fromiter((row for _, _, row in heapq.merge(*keys)),
+                        dtype=np.int64,
+                        count=len(records))
+    return records[order]
@@ -0,0 +1,69 @@
+import random
+import unittest
+
+import numpy as np
+
+from data.frame import CandleFrame
+from data.merge import as_run
+from data.merge import merge_frames
+from data.merge import merge_rows
+from data.merge import merge_slices
+
+
+def window(first, last, step=60):
+    """A Coinbase style window: newest first, `last` inclusive"""
+    return [[t, 1, 2, 1, 2, t] for t in range(last, first - step, -step)]
+
+
+class TestMerge(unittest.TestCase):
+    def test_as_run(self):
+        self.assertEqual(as_run(window(0, 120)).time.tolist(), [0, 60, 120])
+        shuffled = [[60, 1, 1, 1, 1, 1], [0, 1, 1, 1, 1, 1],
+                    [120, 1, 1, 1, 1, 1]]
+        self.assertEqual(as_run(shuffled).time.tolist(), [0, 60, 120])
+
+    def test_adjacent_windows_out_of_order(self):
+        windows = [window(600, 1140), window(0, 600), window(1140, 1800)]
+        frame = merge_frames(windows)
+        self.assertEqual(frame.time.tolist(), list(range(0, 1860, 60)))
+
+    def test_overlapping_windows(self):
+        windows = [window(0, 3000), window(1200, 1800), window(2400, 4800)]
+        random.Random(3).shuffle(windows)
+        frame = merge_frames(windows)
+        self.assertEqual(frame.time.tolist(), list(range(0, 4860, 60)))
+        np.testing.assert_array_equal(frame.time, frame.volume)
+
+    def test_duplicates_keep_the_first_window(self):
+        first = [[60, 1, 1, 1, 1, 1], [0, 1, 1, 1, 1, 1]]
+        second = [[120, 2, 2, 2, 2, 2], [60, 2, 2, 2, 2, 2]]
+        self.assertEqual(merge_rows([second, first]),
+                         [(0, 1, 1, 1, 1, 1), (60, 2, 2, 2, 2, 2),
+                          (120, 2, 2, 2, 2, 2)])
+
+    def test_clipping(self):
+        # Coinbase may return candles before the start of a window
+        frame = merge_frames([window(0, 600), window(300, 900)], 120, 600)
+        self.assertEqual(frame.time.tolist(), list(range(120, 600, 60)))
+
+    def test_matches_sort(self):
+        rng = np.random.default_rng(11)
+        windows = []
+        for _ in range(20):
+            first = int(rng.integers(0, 1000)) * 60
+            last = first + int(rng.integers(0, 300)) * 60
+            windows.append(window(first, last))
+        expected = np.unique(
+            np.concatenate([np.array(w)[:, 0] for w in windows]))
+        np.testing.assert_array_equal(merge_frames(windows).time, expected)
+
+    def test_slices(self):
+        labels = CandleFrame.labels
+        slices = [[dict(zip(labels, row)) for row in window(0, 120)], []]
+        self.assertEqual([c['time'] for c in merge_slices(slices)],
+                         [0, 60, 120])
+        self.assertEqual(len(merge_frames([])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
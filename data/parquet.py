@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+""" Export and import of candle history as Arrow tables and Parquet files.
+
+Files hold one row per candle with a dictionary-encoded product_id column.
+Rows are written in row groups that each cover one fixed time range, so
+the per-row-group min/max statistics of the time column let readers skip
+every row group outside of the requested range.
+"""
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .frame import CandleFrame
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+SCHEMA = pa.schema([
+    ('product_id', pa.dictionary(pa.int32(), pa.string())),
+    ('time', pa.int64()),
+    ('low', pa.float64()),
+    ('high', pa.float64()),
+    ('open', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.float64()),
+])
+
+
+def to_arrow(product_id, candles) -> pa.Table:
+    """Converts candle data for a single product into an Arrow table"""
+    frame = CandleFrame.coerce(candles)
+    product = pa.DictionaryArray.from_arrays(
+        pa.array(np.zeros(len(frame), dtype=np.int32)),
+        pa.array([product_id], type=pa.string()))
+    columns = [product] + [
+        pa.array(np.ascontiguousarray(frame.records[label]))
+        for label in CandleFrame.labels
+    ]
+    return pa.Table.from_arrays(columns, schema=SCHEMA)
+
+
+def from_arrow(table: pa.Table) -> dict:
+    """Splits an Arrow table into one CandleFrame per product_id
+
+    Returns:
+    {product_id: CandleFrame, ...}
+    """
+    if not table.num_rows:
+        return {}
+    table = table.unify_dictionaries()
+    products = table.column('product_id').combine_chunks()
+    if isinstance(products, pa.DictionaryArray):
+        names = products.dictionary.to_pylist()
+        codes = products.indices.to_numpy(zero_copy_only=False)
+    else:
+        names, codes = np.unique(products.to_numpy(zero_copy_only=False),
+                                 return_inverse=True)
+        names = names.tolist()
+    columns = [
+        table.column(label).to_numpy() for label in CandleFrame.labels
+    ]
+
+    frames = {}
+    for code, name in enumerate(names):
+        mask = codes == code
+        if mask.any():
+            frames[name] = CandleFrame.from_columns(
+                *[c[mask] for c in columns])
+    return frames
+
+
+class ParquetCandleWriter:
+    """Streams candle data into a Parquet file, one row group per time range.
+
+    Candles are buffered per product until a candle from a later time range
+    arrives (or the writer is closed), then the buffered range is sorted and
+    written as its own row group.
+    """
+    def __init__(self,
+                 path,
+                 granularity=None,
+                 row_group_seconds=86400 * 7,
+                 compression='zstd'):
+        """Streams candle data into a Parquet file
+
+        Keyword arguments:
+        path -- the Parquet file to create
+        granularity -- optional, recorded in the file metadata
+        row_group_seconds -- the time range covered by each row group
+        compression -- any codec supported by pyarrow.parquet
+        """
+        self.path = path
+        self.row_group_seconds = int(row_group_seconds)
+        self.rows = 0
+        schema = SCHEMA
+        if granularity:
+            schema = schema.with_metadata(
+                {b'granularity': str(int(granularity)).encode()})
+        self._writer = pq.ParquetWriter(path,
+                                        schema,
+                                        compression=compression,
+                                        use_dictionary=['product_id'],
+                                        write_statistics=True)
+        self._schema = schema
+        self._pending = {}
+
+    def write(self, product_id, candles):
+        """Buffers a slice of candles, flushing any completed time ranges
+
+        Keyword arguments:
+        product_id -- the product the candles belong to
+        candles -- a CandleFrame, candle dicts or raw candle rows
+        """
+        frame = CandleFrame.coerce(candles)
+        if not len(frame):
+            return
+        buckets = frame.time // self.row_group_seconds
+        for bucket in np.unique(buckets):
+            key = (product_id, int(bucket))
+            part = CandleFrame(frame.records[buckets == bucket])
+            self._pending.setdefault(key, []).append(part)
+
+        newest = int(buckets.max())
+        for key in sorted(self._pending):
+            if key[0] == product_id and key[1] < newest:
+                self.__flush(key)
+
+    def close(self):
+        for key in sorted(self._pending):
+            self.__flush(key)
+        self._writer.close()
+        event_log.debug('wrote %i rows to %s', self.rows, self.path)
+
+    def __flush(self, key):
+        frame = CandleFrame.concat(self._pending.pop(key)).sorted()
+        table = to_arrow(key[0], frame).replace_schema_metadata(
+            self._schema.metadata)
+        self._writer.write_table(table, row_group_size=len(frame))
+        self.rows += len(frame)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def export_parquet(path,
+                   product_id,
+                   slices,
+                   granularity=None,
+                   row_group_seconds=86400 * 7) -> int:
+    """Writes an iterable of candle slices to a Parquet file as they arrive.
+
+    `slices` may be a generator such as `MarketData.iter_slices`, so each
+    window is written without holding the full history in memory.
+
+    Returns:
+    the number of rows written
+    """
+    with ParquetCandleWriter(path, granularity,
+                             row_group_seconds) as writer:
+        for _slice in slices:
+            writer.write(product_id, _slice)
+    return writer.rows
+
+
+def row_groups(path, start=None, end=None) -> list:
+    """Returns the row groups of a candle file that may hold times in
+    [start, end), based on the time column statistics
+    """
+    metadata = pq.ParquetFile(path).metadata
+    index = metadata.schema.to_arrow_schema().get_field_index('time')
+    selected = []
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(index).statistics
+        if stats is None or not stats.has_min_max:
+            selected.append(i)
+        elif (end is None or stats.min < end) and \
+                (start is None or stats.max >= start):
+            selected.append(i)
+    return selected
+
+
+def read_parquet(path, start=None, end=None, product_ids=None) -> dict:
+    """Loads candles with `start <= time < end` from a Parquet file.
+
+    Only the row groups whose time statistics overlap the range are read.
+
+    Keyword arguments:
+    path -- a file written by `export_parquet` or `ParquetCandleWriter`
+    start -- optional seconds since epoch
+    end -- optional seconds since epoch (exclusive)
+    product_ids -- optional collection of products to keep
+
+    Returns:
+    {product_id: CandleFrame, ...}
+    """
+    groups = row_groups(path, start, end)
+    if not groups:
+        return {}
+    table = pq.ParquetFile(path).read_row_groups(groups)
+    times = table.column('time').to_numpy()
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times < end
+    frames = from_arrow(table.filter(pa.array(mask)))
+    if product_ids is not None:
+        frames = {k: v for k, v in frames.items() if k in product_ids}
+    return {k: v.sorted() for k, v in frames.items()}
+
+
+def file_granularity(path):
+    """Returns the granularity recorded in a candle file, if any"""
+    metadata = pq.read_schema(path).metadata or {}
+    value = metadata.get(b'granularity')
+    return int(value) if value else None
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import pyarrow.parquet as pq
+
+from data.frame import CandleFrame
+from data.parquet import export_parquet
+from data.parquet import file_granularity
+from data.parquet import read_parquet
+from data.parquet import row_groups
+
+
+def make_slices(start, end, granularity, size):
+    """Coinbase style slices: newest candle first within every window"""
+    for w_start in range(start, end, granularity * size):
+        w_end = min(w_start + granularity * size, end)
+        yield [[t, 1.0, 2.0, 1.5, float(t), 1.0]
+               for t in range(w_end - granularity, w_start - 1,
+                              -granularity)]
+
+
+class TestParquet(unittest.TestCase):
+    def test_round_trip_and_pushdown(self):
+        day = 86400
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'btc.parquet')
+            rows = export_parquet(path,
+                                  'BTC-USD',
+                                  make_slices(0, 70 * day, 3600, 300),
+                                  granularity=3600,
+                                  row_group_seconds=7 * day)
+            self.assertEqual(rows, 70 * 24)
+            self.assertEqual(pq.ParquetFile(path).num_row_groups, 10)
+            self.assertEqual(file_granularity(path), 3600)
+
+            # A single week only touches one row group
+            self.assertEqual(row_groups(path, 14 * day, 21 * day), [2])
+
+            frames = read_parquet(path, 14 * day, 15 * day)
+            frame = frames['BTC-USD']
+            self.assertIsInstance(frame, CandleFrame)
+            self.assertEqual(len(frame), 24)
+            self.assertEqual(frame.time[0], 14 * day)
+            self.assertEqual(frame.close[-1], 15 * day - 3600)
+
+            self.assertEqual(read_parquet(path, product_ids=['ETH-USD']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+""" A multi-resolution pyramid of candles for zoomable charts.
+
+Level 0 holds the finest candles and every further level aggregates the
+one below it into coarser buckets (5m, 15m, 1h, 6h, 1d and 1w for 1m
+candles by default). A viewport query picks the coarsest level that still
+draws at least one bar per pixel, so ten years of history on a 1000 pixel
+wide chart costs a few thousand candles instead of millions.
+
+New candles are merged into level 0 and only the trailing buckets they
+touch are aggregated again on each level above, so keeping a live
+pyramid up to date costs time proportional to the new candles.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from .frame import CANDLE_DTYPE
+from .frame import CandleFrame
+from .merge import merge_frames
+from .resample import default_origin
+from .resample import parse_granularity
+from .resample import resample
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+# Buckets use `resample.default_origin`, so weeks start on Mondays
+LEVELS = ('5m', '15m', '1h', '6h', '1d', '1w')
+
+
+class Level:
+    """The candles of one pyramid level in a growable buffer"""
+    def __init__(self, granularity):
+        self.granularity = granularity
+        self._records = np.empty(0, dtype=CANDLE_DTYPE)
+        self._size = 0
+
+    @property
+    def frame(self) -> CandleFrame:
+        return CandleFrame(self._records[:self._size])
+
+    def replace_from(self, start, records):
+        """Replaces every candle at or after `start` with `records`"""
+        frame = self.frame
+        keep = int(np.searchsorted(frame.time, start, side='left'))
+        size = keep + len(records)
+        if size > len(self._records):
+            grown = np.empty(max(size, 2 * len(self._records), 64),
+                             dtype=CANDLE_DTYPE)
+            grown[:keep] = self._records[:keep]
+            self._records = grown
+        self._records[keep:size] = records
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+
+class CandlePyramid:
+    """Pre-aggregated candles at several resolutions of one series.
+
+    Every level's granularity must be a multiple of the level below it.
+    """
+    def __init__(self, granularity, levels=LEVELS):
+        """Pre-aggregated candles at several resolutions of one series
+
+        Keyword arguments:
+        granularity -- the finest granularity, e.g. 60 or '1m'
+        levels -- the coarser granularities, finest first
+        """
+        granularities = [parse_granularity(granularity)]
+        for level in levels:
+            level = parse_granularity(level)
+            if level <= granularities[-1] or level % granularities[-1]:
+                raise InvalidArgument(
+                    '{}s is not a multiple of {}s'.format(
+                        level, granularities[-1]))
+            granularities.append(level)
+        self.levels = [Level(g) for g in granularities]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, candles, granularity, levels=LEVELS):
+        pyramid = cls(granularity, levels)
+        pyramid.update(candles)
+        return pyramid
+
+    @property
+    def granularities(self) -> list:
+        return [level.granularity for level in self.levels]
+
+    def update(self, candles) -> int:
+        """Merges new candles into the pyramid.
+
+        Candles may be out of order or repeat stored times (the stored
+        candle is replaced); only the buckets from the earliest new candle
+        onwards are aggregated again.
+
+        Returns:
+        the number of level 0 candles after the update
+        """
+        frame = CandleFrame.coerce(candles)
+        if not len(frame):
+            return len(self.levels[0])
+        with self._lock:
+            base = self.levels[0]
+            start = int(frame.time.min())
+            start -= start % base.granularity
+            tail = base.frame.between(start, np.iinfo(np.int64).max)
+            # New candles come first so they win over stored duplicates
+            base.replace_from(start, merge_frames([frame, tail]).records)
+
+            for finer, level in zip(self.levels, self.levels[1:]):
+                start -= (start - default_origin(level.granularity)) % \
+                    level.granularity
+                source = finer.frame.between(start, np.iinfo(np.int64).max)
+                level.replace_from(
+                    start,
+                    resample(source, level.granularity,
+                             finer.granularity).records)
+            return len(base)
+
+    def level_for(self, start, end, pixels) -> int:
+        """The coarsest granularity with at least one bar per pixel"""
+        span = max(0, end - start)
+        for level in reversed(self.levels):
+            if span // level.granularity >= pixels:
+                return level.granularity
+        return self.levels[0].granularity
+
+    def viewport(self, start, end, pixels):
+        """Returns the candles to draw [start, end) across `pixels`.
+
+        Returns:
+        (granularity, CandleFrame) where the frame is a view of the level,
+        valid until the next `update`
+        """
+        granularity = self.level_for(start, end, pixels)
+        start -= (start - default_origin(granularity)) % granularity
+        return granularity, self.level(granularity).between(start, end)
+
+    def level(self, granularity) -> CandleFrame:
+        granularity = parse_granularity(granularity)
+        for level in self.levels:
+            if level.granularity == granularity:
+                return level.frame
+        raise InvalidArgument('no {}s level in {}'.format(
+            granularity, self.granularities))
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def __str__(self):
+        return 'CandlePyramid({})'.format(', '.join(
+            '{}s: {}'.format(level.granularity, len(level))
+            for level in self.levels))
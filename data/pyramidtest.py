@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from data.frame import CandleFrame
+from data.pyramid import CandlePyramid
+from data.resample import MONDAY
+from data.resample import resample
+
+
+def walk(first, count, seed=0):
+    rng = np.random.default_rng(seed)
+    times = first + np.arange(count) * 60
+    times = times[rng.random(count) > 0.1]
+    close = 100 + np.cumsum(rng.normal(0, 1, len(times)))
+    return CandleFrame.from_columns(times, close - 1, close + 1, close, close,
+                                    rng.random(len(times)))
+
+
+class TestCandlePyramid(unittest.TestCase):
+    def setUp(self):
+        self.frame = walk(0, 20 * 1440)
+
+    def test_levels_match_resample(self):
+        pyramid = CandlePyramid.from_frame(self.frame, '1m')
+        self.assertEqual(pyramid.granularities,
+                         [60, 300, 900, 3600, 21600, 86400, 604800])
+        for granularity in pyramid.granularities[1:]:
+            np.testing.assert_allclose(
+                pyramid.level(granularity).to_rows(),
+                resample(self.frame, granularity).to_rows())
+        weeks = pyramid.level('1w').time
+        self.assertEqual(((weeks - MONDAY) % 604800).tolist(),
+                         [0] * len(weeks))
+
+    def test_incremental_updates(self):
+        pyramid = CandlePyramid(60)
+        for lo in range(0, len(self.frame), 997):
+            pyramid.update(self.frame[lo:lo + 997])
+        self.assertEqual(len(pyramid), len(self.frame))
+        for granularity in pyramid.granularities:
+            np.testing.assert_allclose(
+                pyramid.level(granularity).to_rows(),
+                resample(self.frame, granularity).to_rows())
+
+    def test_late_and_repeated_candles(self):
+        pyramid = CandlePyramid.from_frame(self.frame[::2], 60)
+        pyramid.update(self.frame[1::2][::-1])
+        late = CandleFrame.from_columns([3600], 0, 1000, 50, 50, 5)
+        pyramid.update(late)
+        hour = pyramid.level('1h').between(3600, 7200)
+        self.assertEqual(hour.high[0], 1000)
+        self.assertEqual(len(pyramid), len(self.frame) + (3600 not in
+                                                          self.frame.time))
+
+    def test_viewport(self):
+        pyramid = CandlePyramid.from_frame(self.frame, 60)
+        day = 86400
+        granularity, frame = pyramid.viewport(0, 20 * day, 400)
+        self.assertEqual(granularity, 3600)
+        self.assertGreaterEqual(len(frame), 400)
+        self.assertEqual(pyramid.viewport(0, 20 * day, 10)[0], day)
+        self.assertEqual(pyramid.viewport(0, 3600, 1000)[0], 60)
+        granularity, frame = pyramid.viewport(5 * day + 100, 6 * day, 90)
+        self.assertEqual(granularity, 900)
+        self.assertEqual(frame.time[0], 5 * day)
+        # Day 0 is a Thursday; its week started on the Monday before
+        granularity, frame = pyramid.viewport(0, 20 * day, 2)
+        self.assertEqual(granularity, 7 * day)
+        self.assertEqual(frame.time.tolist(),
+                         [MONDAY + k * 7 * day for k in range(-1, 3)])
+
+    def test_invalid_levels(self):
+        with self.assertRaises(InvalidArgument):
+            CandlePyramid(60, ['5m', '7m'])
+        with self.assertRaises(InvalidArgument):
+            CandlePyramid(60).level(120)
+
+
+if __name__ == '__main__':
+    unittest.main()
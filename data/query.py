@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+""" Range and aggregation queries over a local CandleStore.
+
+Stored candles are sorted by time, so any range is found with a binary
+search on the memory-mapped time column. For aggregations, every series
+is also cut into fixed-size blocks with a precomputed summary (lowest low,
+highest high, summed volume and row count). A wide aggregation reads the
+summaries of the blocks it covers completely and scans rows only in the
+two partial blocks at its edges.
+
+Summaries are kept per series and extended incrementally when candles are
+appended to the store; a series rewritten by a merge is summarized again.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .densify import align
+from .frame import CandleFrame
+from .resample import parse_granularity
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+SUMMARY_DTYPE = np.dtype([('low', '<f8'), ('high', '<f8'), ('volume', '<f8'),
+                          ('count', '<i8')])
+
+
+class BlockSummaries:
+    """Per-block low, high, volume and count of one stored series"""
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.blocks = np.empty(0, dtype=SUMMARY_DTYPE)
+        self.rows = 0
+        self.stamp = None
+
+    def update(self, frame, stamp):
+        """Summarizes the rows added since the last update, or everything
+        if the file was replaced
+        """
+        replaced = self.stamp is not None and (
+            stamp is None or stamp[0] != self.stamp[0] or
+            stamp[1] < self.stamp[1])
+        if replaced or len(frame) < self.rows:
+            self.blocks = self.blocks[:0]
+            self.rows = 0
+        self.stamp = stamp
+
+        complete = len(self.blocks) - (self.rows % self.block_size != 0)
+        lo = complete * self.block_size
+        if lo >= len(frame):
+            return
+        starts = np.arange(lo, len(frame), self.block_size)
+        blocks = np.empty(len(starts), dtype=SUMMARY_DTYPE)
+        blocks['low'] = np.minimum.reduceat(frame.low[lo:], starts - lo)
+        blocks['high'] = np.maximum.reduceat(frame.high[lo:], starts - lo)
+        blocks['volume'] = np.add.reduceat(frame.volume[lo:], starts - lo)
+        blocks['count'] = np.diff(np.r_[starts, len(frame)])
+        self.blocks = np.concatenate([self.blocks[:complete], blocks])
+        self.rows = len(frame)
+
+
+class CandleQuery:
+    """Answers range, aggregation, last-N and aligned queries from a
+    CandleStore without touching the network.
+    """
+    def __init__(self, store, block_size=1024):
+        """Answers queries from a CandleStore
+
+        Keyword arguments:
+        store -- the CandleStore to query
+        block_size -- rows per precomputed block summary
+        """
+        self.store = store
+        self.block_size = block_size
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def range(self, product_id, granularity, start, end) -> CandleFrame:
+        """Returns the candles with `start <= time < end` as a view"""
+        return self.store.range(product_id, parse_granularity(granularity),
+                                start, end)
+
+    def last(self, product_id, granularity, n=1) -> CandleFrame:
+        """Returns the latest `n` candles as a view"""
+        frame = self.store.read(product_id, parse_granularity(granularity))
+        return frame[max(0, len(frame) - n):]
+
+    def aggregate(self, product_id, granularity, start, end) -> dict:
+        """Aggregates [start, end) into a single OHLCV candle.
+
+        Returns:
+        a dict with time (`start`), low, high, open, close, volume and
+        count, or None if there are no candles in the range
+        """
+        granularity = parse_granularity(granularity)
+        frame, summaries = self.__summarized(product_id, granularity)
+        lo, hi = np.searchsorted(frame.time, [start, end], side='left')
+        return self.__aggregate(frame, summaries, int(lo), int(hi), start)
+
+    def windows(self, product_id, granularity, start, end,
+                every) -> CandleFrame:
+        """Aggregates [start, end) into consecutive windows of `every`
+        seconds (e.g. '1d' or 7 * 86400), skipping empty windows. Each
+        window is labelled with its start.
+        """
+        granularity = parse_granularity(granularity)
+        every = parse_granularity(every)
+        frame, summaries = self.__summarized(product_id, granularity)
+        edges = np.r_[np.arange(start, end, every), end]
+        rows = np.searchsorted(frame.time, edges, side='left').tolist()
+        candles = []
+        for edge, lo, hi in zip(edges.tolist(), rows[:-1], rows[1:]):
+            candle = self.__aggregate(frame, summaries, lo, hi, edge)
+            if candle is not None:
+                candles.append(candle)
+        if not candles:
+            return CandleFrame()
+        return CandleFrame.from_dicts(candles)
+
+    def aligned(self, products, granularity, start, end, fill='ffill'):
+        """Returns several products on one shared, dense time axis.
+        See `data.densify.align`.
+        """
+        granularity = parse_granularity(granularity)
+        return align(
+            {p: self.range(p, granularity, start, end)
+             for p in products}, granularity, start, end, fill)
+
+    def __summarized(self, product_id, granularity):
+        frame = self.store.read(product_id, granularity)
+        path = self.store.path(product_id, granularity)
+        try:
+            stat = os.stat(path)
+            stamp = (stat.st_ino, stat.st_size)
+        except OSError:
+            stamp = None
+        with self._lock:
+            key = (product_id, granularity)
+            summaries = self._summaries.get(key)
+            if summaries is None:
+                summaries = BlockSummaries(self.block_size)
+                self._summaries[key] = summaries
+            summaries.update(frame, stamp)
+            return frame, summaries.blocks
+
+    def __aggregate(self, frame, summaries, lo, hi, start):
+        if lo >= hi:
+            return None
+        size = self.block_size
+        first_block = -(-lo // size)
+        last_block = hi // size
+
+        if first_block >= last_block:
+            parts = [(lo, hi)]
+            blocks = summaries[:0]
+        else:
+            parts = [(lo, first_block * size), (last_block * size, hi)]
+            blocks = summaries[first_block:last_block]
+
+        lows = [blocks['low'].min()] if len(blocks) else []
+        highs = [blocks['high'].max()] if len(blocks) else []
+        volume = blocks['volume'].sum()
+        for a, b in parts:
+            if a < b:
+                lows.append(frame.low[a:b].min())
+                highs.append(frame.high[a:b].max())
+                volume += frame.volume[a:b].sum()
+        return {
+            'time': int(start),
+            'low': float(min(lows)),
+            'high': float(max(highs)),
+            'open': float(frame.open[lo]),
+            'close': float(frame.close[hi - 1]),
+            'volume': float(volume),
+            'count': hi - lo
+        }
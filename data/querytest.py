@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from data.frame import CandleFrame
+from data.query import CandleQuery
+from data.store import CandleStore
+
+
+def walk(first, count, seed=0):
+    rng = np.random.default_rng(seed)
+    times = first + np.arange(count) * 60
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    _open = np.r_[100, close[:-1]]
+    high = np.maximum(_open, close) + rng.random(count)
+    low = np.minimum(_open, close) - rng.random(count)
+    return CandleFrame.from_columns(times, low, high, _open, close,
+                                    rng.random(count))
+
+
+class TestCandleQuery(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = CandleStore(self.root)
+        self.frame = walk(0, 10000)
+        self.store.write('BTC-USD', 60, self.frame)
+        self.query = CandleQuery(self.store, block_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def expected(self, frame, start):
+        return {
+            'time': start,
+            'low': frame.low.min(),
+            'high': frame.high.max(),
+            'open': frame.open[0],
+            'close': frame.close[-1],
+            'volume': frame.volume.sum(),
+            'count': len(frame)
+        }
+
+    def assertCandle(self, actual, expected):
+        self.assertEqual(actual.keys(), expected.keys())
+        for key in expected:
+            self.assertAlmostEqual(actual[key], expected[key], places=6)
+
+    def test_range_and_last(self):
+        frame = self.query.range('BTC-USD', 60, 600, 1200)
+        self.assertEqual(frame.time.tolist(), list(range(600, 1200, 60)))
+        self.assertEqual(self.query.last('BTC-USD', '1m', 3).time.tolist(),
+                         [599820, 599880, 599940])
+        self.assertEqual(len(self.query.last('ETH-USD', 60)), 0)
+
+    def test_aggregate_matches_scan(self):
+        for start, end in [(0, 600000), (123 * 60, 8765 * 60),
+                           (30 * 60, 70 * 60), (5999 * 60, 6001 * 60)]:
+            expected = self.expected(self.frame.between(start, end), start)
+            self.assertCandle(
+                self.query.aggregate('BTC-USD', 60, start, end), expected)
+        self.assertIsNone(self.query.aggregate('BTC-USD', 60, -600, 0))
+
+    def test_windows(self):
+        frame = self.query.windows('BTC-USD', 60, 0, 600000, '1d')
+        self.assertEqual(frame.time.tolist(), [0, 86400 * 1, 86400 * 2,
+                                                86400 * 3, 86400 * 4,
+                                                86400 * 5, 86400 * 6])
+        day = self.frame.between(86400, 2 * 86400)
+        self.assertAlmostEqual(frame.volume[1], day.volume.sum())
+        self.assertAlmostEqual(frame.low[1], day.low.min())
+
+    def test_summaries_follow_appends_and_rewrites(self):
+        self.query.aggregate('BTC-USD', 60, 0, 600000)
+        more = walk(600000, 250, seed=1)
+        self.store.write('BTC-USD', 60, more)
+        full = CandleFrame.concat([self.frame, more])
+        self.assertCandle(self.query.aggregate('BTC-USD', 60, 0, 700000),
+                          self.expected(full, 0))
+
+        # Rewriting an older candle replaces the file
+        self.store.write('BTC-USD', 60, CandleFrame.from_columns(
+            [-60], -5, 500, 1, 1, 1000))
+        self.assertEqual(self.query.aggregate('BTC-USD', 60, -60,
+                                              700000)['high'], 500)
+
+    def test_aligned(self):
+        self.store.write('ETH-USD', 60, walk(300, 5, seed=2))
+        aligned = self.query.aligned(['BTC-USD', 'ETH-USD'], 60, 0, 600)
+        self.assertEqual(aligned.close.shape, (2, 10))
+        self.assertEqual(aligned.mask[1].tolist(), [False] * 5 + [True] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+""" Derives coarser candles from finer ones without another network call.
+
+Buckets are reduced with vectorized group-by operations: the first open,
+the highest high, the lowest low, the last close and the summed volume.
+Coinbase publishes no candle for intervals without trades, so a bucket is
+simply built from whatever finer candles exist inside it, and buckets with
+no candles at all are left out, exactly as Coinbase would.
+"""
+import re
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from .frame import CandleFrame
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# 1970-01-01 was a Thursday; use this origin for weeks starting on Monday
+MONDAY = 4 * 86400
+WEEK = UNITS['w']
+
+
+def parse_granularity(value) -> int:
+    """Converts '4h', '15m', '1w', ... or a number into seconds"""
+    if isinstance(value, str):
+        match = re.fullmatch(r'\s*(\d+)\s*([smhdw])\s*', value.lower())
+        if not match:
+            raise InvalidArgument('unknown granularity {}'.format(value))
+        return int(match.group(1)) * UNITS[match.group(2)]
+    return int(value)
+
+
+def default_origin(granularity) -> int:
+    """Weekly buckets start on Monday, every other bucket at the epoch"""
+    return MONDAY if parse_granularity(granularity) % WEEK == 0 else 0
+
+
+def resample(candles,
+             granularity,
+             source_granularity=None,
+             origin=None,
+             start=None,
+             end=None) -> CandleFrame:
+    """Aggregates candles into coarser buckets.
+
+    Keyword arguments:
+    candles -- a CandleFrame, candle dicts or raw rows at a finer granularity
+    granularity -- the target bucket size in seconds, or a string like '4h'
+    source_granularity -- optional, validated to divide `granularity`
+    origin -- bucket edges fall on `origin + k * granularity`, defaults
+              to `default_origin(granularity)`
+    start -- optional start of the source range; buckets beginning before
+             it are dropped because they would be incomplete
+    end -- optional end of the source range; buckets ending after it are
+           dropped for the same reason
+
+    Returns:
+    a CandleFrame sorted by time
+    """
+    granularity = parse_granularity(granularity)
+    if origin is None:
+        origin = default_origin(granularity)
+    if source_granularity:
+        source_granularity = parse_granularity(source_granularity)
+        errors = [(granularity % source_granularity != 0),
+                  (origin % source_granularity != 0)]
+        if any(errors):
+            raise InvalidArgument('cannot build {}s candles from {}s'.format(
+                granularity, source_granularity))
+
+    frame = CandleFrame.coerce(candles)
+    if len(frame) > 1 and np.any(np.diff(frame.time) <= 0):
+        frame = frame.sorted()
+    if not len(frame):
+        return CandleFrame()
+
+    buckets = (frame.time - origin) // granularity
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(frame)]
+
+    result = CandleFrame.from_columns(
+        time=buckets[starts] * granularity + origin,
+        low=np.minimum.reduceat(frame.low, starts),
+        high=np.maximum.reduceat(frame.high, starts),
+        open=frame.open[starts],
+        close=frame.close[ends - 1],
+        volume=np.add.reduceat(frame.volume, starts))
+
+    keep = np.ones(len(result), dtype=bool)
+    if start is not None:
+        keep &= result.time >= start
+    if end is not None:
+        keep &= result.time + granularity <= end
+    if not keep.all():
+        result = CandleFrame(result.records[keep])
+    return result
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from data.frame import CandleFrame
+from data.resample import parse_granularity
+from data.resample import resample
+
+
+class TestResample(unittest.TestCase):
+    def test_ohlcv_reduction(self):
+        # Two five minute buckets; 120 and 360 had no trades
+        rows = [[0, 9, 12, 10, 11, 1], [60, 8, 11, 11, 9, 2],
+                [180, 9, 15, 9, 14, 3], [240, 13, 14, 14, 13, 4],
+                [300, 12, 13, 13, 12, 5], [420, 10, 12, 12, 11, 6]]
+        frame = resample(CandleFrame.from_rows(rows[::-1]), 300, 60)
+        self.assertEqual(frame.to_rows(),
+                         [(0, 8, 15, 10, 13, 10), (300, 10, 13, 13, 11, 11)])
+
+    def test_missing_buckets_are_skipped(self):
+        rows = [[t, 1, 2, 1, 2, 1] for t in (0, 60, 7200, 7260)]
+        frame = resample(CandleFrame.from_rows(rows), '1h')
+        self.assertEqual(frame.time.tolist(), [0, 7200])
+        self.assertEqual(frame.volume.tolist(), [2, 2])
+
+    def test_incomplete_edges(self):
+        rows = [[t, 1, 2, 1, 2, 1] for t in range(1800, 3 * 3600, 60)]
+        frame = resample(CandleFrame.from_rows(rows), 3600, start=1800,
+                         end=3 * 3600)
+        self.assertEqual(frame.time.tolist(), [3600, 7200])
+
+    def test_week_origin(self):
+        monday = 4 * 86400
+        rows = [[t, 1, 2, 1, 2, 1] for t in range(0, 21 * 86400, 86400)]
+        frame = resample(CandleFrame.from_rows(rows), '1w', 86400,
+                         origin=monday)
+        self.assertTrue(np.all((frame.time - monday) % 604800 == 0))
+        self.assertEqual(frame.volume.sum(), 21)
+        # Weeks start on Monday by default
+        np.testing.assert_array_equal(
+            resample(CandleFrame.from_rows(rows), '1w', 86400).time,
+            frame.time)
+        self.assertEqual(resample(CandleFrame.from_rows(rows), '1d').time[1],
+                         86400)
+
+    def test_invalid(self):
+        self.assertEqual(parse_granularity('4h'), 14400)
+        with self.assertRaises(InvalidArgument):
+            resample([], 90, source_granularity=60)
+        with self.assertRaises(InvalidArgument):
+            parse_granularity('4 fortnights')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+""" Candle history shared between processes without copies.
+
+A loader process fetches history once and copies it into a single
+`multiprocessing.shared_memory` segment. Worker processes attach to the
+segment by name and read every series as a read-only NumPy view of the
+shared pages, so nothing is fetched, pickled or copied per worker:
+
+    with SharedCandles.load(md, ['BTC-USD'], 3600, start, end) as shared:
+        pool.map(work, [(shared.name, 'BTC-USD', 3600)] * 8)
+
+    def work(args):
+        name, product_id, granularity = args
+        with SharedCandles.attach(name) as shared:
+            return shared.frame(product_id, granularity).close.mean()
+
+The segment starts with a small JSON directory of the series it holds,
+followed by the CANDLE_DTYPE records of each series.
+"""
+import json
+import logging
+import struct
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from .frame import CANDLE_DTYPE
+from .frame import CandleFrame
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+MAGIC = b'CGSHM001'
+HEADER = struct.Struct('<8sQ')
+
+
+class SharedCandles:
+    """A shared memory segment of (product_id, granularity) candle series"""
+    def __init__(self, shm, directory, owner=False):
+        """Use `create`, `load` or `attach` instead"""
+        self._shm = shm
+        self._directory = directory
+        self._owner = owner
+
+    @classmethod
+    def create(cls, frames: dict, name=None):
+        """Copies candle series into a new shared memory segment.
+
+        Keyword arguments:
+        frames -- {(product_id, granularity): CandleFrame or candles}
+        name -- optional segment name, chosen by the system if None
+
+        Returns:
+        the owning SharedCandles; call `unlink` (or leave the `with`
+        block) once the workers are done
+        """
+        frames = {(p, int(g)): CandleFrame.coerce(f)
+                  for (p, g), f in frames.items()}
+        directory = []
+        offset = 0
+        for (product_id, granularity), frame in frames.items():
+            directory.append([product_id, granularity, offset, len(frame)])
+            offset += frame.nbytes
+        header = json.dumps(directory).encode()
+        data_offset = -(-(HEADER.size + len(header)) // 64) * 64
+
+        shm = shared_memory.SharedMemory(name=name,
+                                         create=True,
+                                         size=max(1, data_offset + offset))
+        HEADER.pack_into(shm.buf, 0, MAGIC, len(header))
+        shm.buf[HEADER.size:HEADER.size + len(header)] = header
+        shared = cls(shm, cls.__index(directory, data_offset), owner=True)
+        for key, frame in frames.items():
+            view = shared.__view(key, writeable=True)
+            view[:] = frame.records
+        event_log.debug('%s: %i series, %i bytes', shm.name, len(frames),
+                        shm.size)
+        return shared
+
+    @classmethod
+    def load(cls, md, products, granularity, start, end, name=None):
+        """Fetches every product once through `md` and shares it.
+
+        Keyword arguments:
+        md -- a MarketData
+        products -- a list of product_ids
+        granularity -- the granularity to fetch
+        start -- datetime, ISO 8601 timestamp or seconds since epoch
+        end -- datetime, ISO 8601 timestamp or seconds since epoch
+        name -- optional segment name
+        """
+        frames = {(product_id, granularity):
+                  md.frame(product_id, start, end, granularity)
+                  for product_id in products}
+        return cls.create(frames, name)
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to an existing segment from any process.
+
+        Raises:
+        InvalidArgument -- if the segment was not made by `create`
+        """
+        shm = _open(name)
+        magic, length = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            shm.close()
+            raise InvalidArgument('{} is not a candle segment'.format(name))
+        header = bytes(shm.buf[HEADER.size:HEADER.size + length])
+        data_offset = -(-(HEADER.size + length) // 64) * 64
+        return cls(shm, cls.__index(json.loads(header.decode()),
+                                    data_offset))
+
+    @property
+    def name(self):
+        """Pass this to worker processes instead of the candles"""
+        return self._shm.name
+
+    @property
+    def nbytes(self):
+        return self._shm.size
+
+    def keys(self) -> list:
+        return list(self._directory)
+
+    def frame(self, product_id, granularity) -> CandleFrame:
+        """Returns a series as a read-only, zero-copy CandleFrame"""
+        key = (product_id, int(granularity))
+        if key not in self._directory:
+            raise InvalidArgument('{} is not shared'.format(key))
+        return CandleFrame(self.__view(key))
+
+    def close(self):
+        """Detaches this process. Every frame from `frame` must have been
+        released first, otherwise a BufferError is raised.
+        """
+        self._shm.close()
+
+    def unlink(self):
+        """Frees the segment once every process has closed it"""
+        self._shm.unlink()
+
+    def __view(self, key, writeable=False):
+        offset, count = self._directory[key]
+        view = np.ndarray((count, ),
+                          dtype=CANDLE_DTYPE,
+                          buffer=self._shm.buf,
+                          offset=offset)
+        view.flags.writeable = writeable
+        return view
+
+    @staticmethod
+    def __index(directory, data_offset):
+        return {(p, g): (data_offset + offset, count)
+                for p, g, offset, count in directory}
+
+    def __contains__(self, key):
+        return key in self._directory
+
+    def __len__(self):
+        return len(self._directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def __str__(self):
+        return 'SharedCandles({}, {} series)'.format(self.name, len(self))
+
+
+def _open(name):
+    """Opens a segment without registering it with this process's resource
+    tracker, which would unlink it when the process exits. Only the owner
+    may unlink it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
@@ -0,0 +1,56 @@
+import unittest
+
+from multiprocessing import get_context
+
+import numpy as np
+
+from api.coinbase.exceptions import InvalidArgument
+from data.frame import CandleFrame
+from data.sharedmem import SharedCandles
+
+
+def close_sum(args):
+    name, product_id, granularity = args
+    shared = SharedCandles.attach(name)
+    frame = shared.frame(product_id, granularity)
+    total = float(frame.close.sum())
+    writeable = frame.records.flags.writeable
+    del frame
+    shared.close()
+    return total, writeable
+
+
+def frame(n, price):
+    times = np.arange(n) * 60
+    return CandleFrame.from_columns(times, price, price, price, price, 1)
+
+
+class TestSharedCandles(unittest.TestCase):
+    def setUp(self):
+        self.frames = {('BTC-USD', 60): frame(1000, 2.0),
+                       ('ETH-USD', 60): frame(10, 3.0),
+                       ('LTC-USD', 60): CandleFrame()}
+
+    def test_round_trip(self):
+        with SharedCandles.create(self.frames) as shared:
+            self.assertEqual(len(shared), 3)
+            btc = shared.frame('BTC-USD', 60)
+            np.testing.assert_array_equal(btc.records,
+                                          self.frames['BTC-USD', 60].records)
+            self.assertFalse(btc.records.flags.writeable)
+            self.assertFalse(btc.records.flags.owndata)
+            self.assertEqual(len(shared.frame('LTC-USD', 60)), 0)
+            with self.assertRaises(InvalidArgument):
+                shared.frame('BTC-USD', 300)
+            del btc
+
+    def test_worker_processes(self):
+        with SharedCandles.create(self.frames) as shared:
+            args = [(shared.name, 'BTC-USD', 60), (shared.name, 'ETH-USD', 60)]
+            with get_context('spawn').Pool(2) as pool:
+                results = pool.map(close_sum, args)
+        self.assertEqual(results, [(2000.0, False), (30.0, False)])
+
+
+if __name__ == '__main__':
+    unittest.main()
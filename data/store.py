@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+""" A local, append-only candle store.
+
+Each (product_id, granularity) pair is kept in its own file of fixed-width
+little-endian records (see `CANDLE_DTYPE`), sorted by time. Reads memory-map
+the file and return zero-copy `CandleFrame` views; range lookups are a
+binary search on the time column.
+"""
+import logging
+import mmap
+import os
+import threading
+
+import numpy as np
+
+from .frame import CANDLE_DTYPE
+from .frame import CandleFrame
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+RECORD_SIZE = CANDLE_DTYPE.itemsize
+
+
+class CandleStore:
+    """One memory-mapped file of sorted candle records per product and
+    granularity.
+
+    Writes are atomic: candles newer than the last stored record are
+    appended with a single write() and fsync(), anything else is merged
+    into a temporary copy that replaces the file with os.replace(). A torn
+    record left at the tail by a crash is truncated the next time the
+    file is opened. Writes to one file are serialized from the first read
+    to the final replace, so concurrent backfills never lose candles.
+    """
+    def __init__(self, root):
+        """One memory-mapped file of sorted candle records per product and
+        granularity
+
+        Keyword arguments:
+        root -- directory holding the candle files, created if needed
+        """
+        self.root = root
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._write_locks = {}
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, product_id, granularity):
+        return os.path.join(self.root, '{}-{}.candles'.format(
+            product_id, int(granularity)))
+
+    def keys(self):
+        """Returns the (product_id, granularity) pairs held in the store"""
+        keys = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith('.candles'):
+                product_id, granularity = name[:-8].rsplit('-', 1)
+                keys.append((product_id, int(granularity)))
+        return keys
+
+    def read(self, product_id, granularity) -> CandleFrame:
+        """Returns every stored candle as a read-only, zero-copy view"""
+        path = self.path(product_id, granularity)
+        with self._lock:
+            if not os.path.exists(path):
+                return CandleFrame()
+            size = os.path.getsize(path)
+            cached = self._maps.get(path)
+            if cached is None or cached[0] != size:
+                self._maps[path] = (size, self.__map(path, size))
+            return CandleFrame(self._maps[path][1])
+
+    def range(self, product_id, granularity, start, end) -> CandleFrame:
+        """Returns the stored candles with `start <= time < end`"""
+        return self.read(product_id, granularity).between(start, end)
+
+    def times(self, product_id, granularity):
+        return self.read(product_id, granularity).time
+
+    def first(self, product_id, granularity):
+        frame = self.read(product_id, granularity)
+        return int(frame.time[0]) if len(frame) else None
+
+    def last(self, product_id, granularity):
+        frame = self.read(product_id, granularity)
+        return int(frame.time[-1]) if len(frame) else None
+
+    def write(self, product_id, granularity, frame: CandleFrame) -> int:
+        """Adds candles to the store, ignoring times that are already stored.
+
+        Returns:
+        the number of new candles written
+        """
+        frame = frame.sorted()
+        if not len(frame):
+            return 0
+        path = self.path(product_id, granularity)
+        with self.__write_lock(path):
+            self.__recover(path)
+            stored = self.__last_time(path)
+            if stored is None or frame.time[0] > stored:
+                return self.__append(path, frame.records)
+
+            existing = self.read(product_id, granularity)
+            index = np.searchsorted(existing.time, frame.time)
+            index = np.minimum(index, len(existing) - 1)
+            new = frame.records[existing.time[index] != frame.time]
+            if not len(new):
+                return 0
+            if new['time'][0] > existing.time[-1]:
+                return self.__append(path, new)
+
+            merged = np.concatenate([existing.records, new])
+            merged = merged[np.argsort(merged['time'], kind='stable')]
+            self.__replace(path, merged)
+        return len(new)
+
+    def __write_lock(self, path):
+        """The lock that serializes writes to one file"""
+        with self._lock:
+            return self._write_locks.setdefault(path, threading.Lock())
+
+    def __append(self, path, records):
+        data = np.ascontiguousarray(records, dtype=CANDLE_DTYPE).tobytes()
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return len(records)
+
+    def __replace(self, path, records):
+        tmp = '{}.tmp'.format(path)
+        with open(tmp, 'wb') as fp:
+            fp.write(np.ascontiguousarray(records).tobytes())
+            fp.flush()
+            os.fsync(fp.fileno())
+        with self._lock:
+            os.replace(tmp, path)
+            self._maps.pop(path, None)
+        event_log.debug('rewrote %s with %i candles', path, len(records))
+
+    def __last_time(self, path):
+        if not os.path.exists(path):
+            return None
+        size = os.path.getsize(path)
+        if size < RECORD_SIZE:
+            return None
+        with open(path, 'rb') as fp:
+            fp.seek(size - RECORD_SIZE)
+            record = np.frombuffer(fp.read(RECORD_SIZE), dtype=CANDLE_DTYPE)
+        return int(record['time'][0])
+
+    @staticmethod
+    def __recover(path):
+        """Truncates a partially written record left by a crash"""
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        torn = size % RECORD_SIZE
+        if torn:
+            event_log.warning('truncating %i torn bytes from %s', torn, path)
+            with open(path, 'r+b') as fp:
+                fp.truncate(size - torn)
+                os.fsync(fp.fileno())
+
+    def __map(self, path, size):
+        count = size // RECORD_SIZE
+        if not count:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        with open(path, 'rb') as fp:
+            buf = mmap.mmap(fp.fileno(), count * RECORD_SIZE,
+                            access=mmap.ACCESS_READ)
+        return np.frombuffer(buf, dtype=CANDLE_DTYPE, count=count)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from data.frame import CandleFrame
+from data.store import CandleStore
+from data.store import RECORD_SIZE
+
+
+def make_frame(times):
+    return CandleFrame.from_rows([[t, 1.0, 2.0, 1.5, 1.75, 10.0]
+                                  for t in times])
+
+
+class TestCandleStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CandleStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_append_and_range(self):
+        written = self.store.write('BTC-USD', 60, make_frame(range(0, 600,
+                                                                    60)))
+        self.assertEqual(written, 10)
+
+        # Out of order input with duplicates is sorted and de-duplicated
+        written = self.store.write('BTC-USD', 60,
+                                   make_frame([900, 600, 540, 660]))
+        self.assertEqual(written, 3)
+
+        frame = self.store.range('BTC-USD', 60, 120, 660)
+        self.assertEqual(frame.time.tolist(), [120, 180, 240, 300, 360, 420,
+                                               480, 540, 600])
+        self.assertEqual(self.store.last('BTC-USD', 60), 900)
+        self.assertEqual(self.store.keys(), [('BTC-USD', 60)])
+
+    def test_backfill_rewrites(self):
+        self.store.write('BTC-USD', 60, make_frame([600, 660]))
+        self.store.write('BTC-USD', 60, make_frame([0, 60, 600]))
+        self.assertEqual(
+            self.store.read('BTC-USD', 60).time.tolist(), [0, 60, 600, 660])
+
+    def test_concurrent_backfills(self):
+        self.store.write('BTC-USD', 60, make_frame([60000]))
+        threads = [
+            threading.Thread(target=self.store.write,
+                             args=('BTC-USD', 60,
+                                   make_frame(range(i * 60, 60000, 600))))
+            for i in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.store.read('BTC-USD', 60).time.tolist(),
+                         list(range(0, 60060, 60)))
+
+    def test_read_only_view(self):
+        self.store.write('BTC-USD', 60, make_frame([0, 60]))
+        frame = self.store.read('BTC-USD', 60)
+        with self.assertRaises(ValueError):
+            frame.close[0] = 0.0
+
+    def test_torn_tail_recovery(self):
+        self.store.write('BTC-USD', 60, make_frame([0, 60]))
+        path = self.store.path('BTC-USD', 60)
+        with open(path, 'ab') as fp:
+            fp.write(b'\x00' * (RECORD_SIZE // 2))
+
+        self.assertEqual(len(self.store.read('BTC-USD', 60)), 2)
+        self.store.write('BTC-USD', 60, make_frame([120]))
+        self.assertEqual(os.path.getsize(path), 3 * RECORD_SIZE)
+        self.assertEqual(
+            self.store.read('BTC-USD', 60).time.tolist(), [0, 60, 120])
+
+
+if __name__ == '__main__':
+    unittest.main()
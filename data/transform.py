@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+""" Moves CPU-heavy decoding and document building into worker processes.
+
+With parallel fetching in place, ingestion is bound by the GIL: decoding
+JSON responses, building candle dicts and formatting Elasticsearch
+documents all run on one core. A TransformPool hands the raw response
+bytes from `MarketData.iter_raw_slices` to a process pool instead, and
+each worker sends back one compact buffer:
+
+decode -- CANDLE_DTYPE records, 48 bytes per candle, wrapped in a
+          CandleFrame without a copy
+documents -- the NDJSON bulk body, ready for `BulkIngester.ingest_ndjson`
+
+Only bytes cross the process boundary, so pickling costs a memcpy rather
+than one object per candle.
+"""
+import json
+import logging
+import os
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from api.coinbase.exceptions import ExchangeError
+from .backfill import Task
+from .frame import CANDLE_DTYPE
+from .frame import CandleFrame
+from .ingest import ndjson
+
+event_log = logging.getLogger('root.{}'.format(__name__))
+
+
+def decode_window(payload: bytes, start=None, end=None) -> bytes:
+    """Decodes a raw `candles` response into sorted CANDLE_DTYPE records.
+
+    Keyword arguments:
+    payload -- the response body, a JSON list of buckets
+    start -- optional, drops candles before it
+    end -- optional, drops candles at or after it
+
+    Raises:
+    ExchangeError -- if the payload is an error message
+    """
+    rows = json.loads(payload)
+    if isinstance(rows, dict):
+        raise ExchangeError(rows.get('message', rows))
+    frame = CandleFrame.from_rows(rows)
+    if len(frame):
+        frame = frame.sorted()
+    if start is not None and end is not None:
+        frame = frame.between(start, end)
+    return frame.records.tobytes()
+
+
+def window_documents(index, task, payload: bytes) -> bytes:
+    """Decodes a raw `candles` response straight into an NDJSON bulk body"""
+    frame = from_buffer(decode_window(payload, task.start, task.end))
+    return b''.join(
+        ndjson(index, task.product_id, task.granularity, frame))
+
+
+def from_buffer(buffer) -> CandleFrame:
+    """Wraps a buffer of CANDLE_DTYPE records without copying it"""
+    return CandleFrame(np.frombuffer(buffer, dtype=CANDLE_DTYPE))
+
+
+class TransformPool:
+    """A process pool that decodes raw candle windows.
+
+    Results are yielded in input order while later windows are still
+    being fetched and decoded. At most `max_pending` windows are in the
+    pool at once, so a slow consumer does not pile up decoded buffers.
+    """
+    def __init__(self, workers=None, max_pending=None):
+        """A process pool that decodes raw candle windows
+
+        Keyword arguments:
+        workers -- number of processes, defaults to the number of cores
+        max_pending -- windows in flight, defaults to twice the workers
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def decode(self, windows):
+        """Yields `(task, CandleFrame)` for every `(task, payload)`, e.g.
+        from `MarketData.iter_raw_slices`. Every frame is clipped to
+        [task.start, task.end) and sorted.
+        """
+        for task, buffer in self.__map(windows, self.__decode):
+            yield task, from_buffer(buffer)
+
+    def documents(self, index, windows):
+        """Yields `(task, ndjson_bytes)` for every `(task, payload)`"""
+        return self.__map(windows, self.__documents(index))
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __map(self, windows, submit):
+        pending = deque()
+        for task, payload in windows:
+            task = Task(*task)
+            pending.append((task, submit(task, payload)))
+            if len(pending) >= self.max_pending:
+                task, future = pending.popleft()
+                yield task, future.result()
+        while pending:
+            task, future = pending.popleft()
+            yield task, future.result()
+
+    def __decode(self, task, payload):
+        return self._pool.submit(decode_window, payload, task.start,
+                                 task.end)
+
+    def __documents(self, index):
+        return lambda task, payload: self._pool.submit(
+            window_documents, index, task, payload)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
@@ -0,0 +1,51 @@
+import json
+import unittest
+
+import numpy as np
+
+from api.coinbase.exceptions import ExchangeError
+from data.backfill import Task
+from data.ingest import ndjson
+from data.transform import TransformPool
+from data.transform import decode_window
+from data.transform import from_buffer
+
+
+def payload(first, last, step=60):
+    """A Coinbase style response body: newest first, `last` inclusive"""
+    rows = [[t, 1.0, 2.0, 1.5, 1.75, 0.5]
+            for t in range(last, first - step, -step)]
+    return json.dumps(rows).encode()
+
+
+class TestTransform(unittest.TestCase):
+    def test_decode_window(self):
+        buffer = decode_window(payload(-60, 600), 0, 600)
+        self.assertIsInstance(buffer, bytes)
+        frame = from_buffer(buffer)
+        self.assertEqual(frame.time.tolist(), list(range(0, 600, 60)))
+        self.assertEqual(frame.close[0], 1.75)
+
+    def test_error_payload(self):
+        with self.assertRaises(ExchangeError):
+            decode_window(b'{"message": "NotFound"}')
+
+    def test_pool_keeps_order(self):
+        windows = [(Task('BTC-USD', 60, t, t + 600), payload(t, t + 600))
+                   for t in range(0, 12000, 600)]
+        with TransformPool(workers=2, max_pending=3) as pool:
+            results = list(pool.decode(windows))
+            documents = list(pool.documents('candles', windows[:2]))
+            self.assertEqual((pool.workers, pool.max_pending), (2, 3))
+        self.assertEqual([task for task, _ in results],
+                         [task for task, _ in windows])
+        times = np.concatenate([frame.time for _, frame in results])
+        self.assertEqual(times.tolist(), list(range(0, 12000, 60)))
+
+        task, body = documents[0]
+        expected = b''.join(ndjson('candles', 'BTC-USD', 60, results[0][1]))
+        self.assertEqual(body, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,10 @@ from api.cbexchange import Coinbase
 from api.coinbase.exceptions import *
 from api.exchange.timeslice import TimeSlice
 from api.logs.setuplogger import logger
+from data.frame import CandleFrame
+from data.ingest import BulkIngester
+from data.ingest import index_settings
+from data.resample import resample
 from marketdata import MarketData
 
 if __name__ == '__main__':
@@ -26,39 +30,13 @@ if __name__ == '__main__':
     event_log.debug('{} started...'.format(__name__))
     exchange = Coinbase()
 
+    # Document ids are deterministic, so rerunning the demo against the
+    # same index overwrites candles instead of duplicating them.
     es = Elasticsearch()
-    index = 'test-{}'.format(str(int(time.time()))[-4:])
+    index = 'candles'
     print(index)
-    es_settings = {
-        'settings': {},
-        'mappings': {
-            'properties': {
-                'time': {
-                    'type': 'date',
-                    'format': 'epoch_second'
-                },
-                'high': {
-                    'type': 'float'
-                },
-                'low': {
-                    'type': 'float'
-                },
-                'open': {
-                    'type': 'float'
-                },
-                'close': {
-                    'type': 'float'
-                },
-                'volume': {
-                    'type': 'float'
-                },
-                'product_id': {
-                    'type': 'keyword'
-                }
-            }
-        }
-    }
-    es.indices.create(index=index, body=es_settings)
+    if not es.indices.exists(index=index):
+        es.indices.create(index=index, body=index_settings())
 
     md = MarketData(exchange)
     products = ['BTC-USD']
@@ -66,17 +44,27 @@ if __name__ == '__main__':
     start = datetime.datetime(year=2019, month=1, day=1)
     end = datetime.datetime(year=2019, month=6, day=1)
 
-    for granularity in granularities:
-        slices = TimeSlice.time_slice(start, end, granularity)
-        for product_id in products:
-            for _start, _end in slices:
-                try:
-                    Elasticsearch.bulk(
-                        es,
-                        md.es_candle_generator(index, product_id, _start, _end,
-                                               granularity))
-                except InvalidArgument as err:
-                    event_log.exception(err)
-                    raise err
-                event_log.debug('%s to %s @ %s DONE...', _start, _end,
-                                granularity)
+    # Only the finest granularity is downloaded, every coarser one is
+    # resampled locally from it.
+    base = min(granularities)
+    for product_id in products:
+        candles = CandleFrame.concat([
+            CandleFrame.coerce(_slice)
+            for _slice in md.iter_slices(product_id, start, end, base)
+        ]).sorted()
+        event_log.debug('%s: %i candles @ %s', product_id, len(candles),
+                        base)
+
+        with BulkIngester(index) as ingester:
+            for granularity in granularities:
+                # Buckets cut off by the window edges are left out
+                frame = candles if granularity == base else resample(
+                    candles,
+                    granularity,
+                    source_granularity=base,
+                    start=TimeSlice.to_epoch(start),
+                    end=TimeSlice.to_epoch(end))
+                ingester.ingest(product_id, granularity, frame)
+                event_log.debug('%s @ %s DONE...', product_id, granularity)
+        event_log.debug('%s ingest metrics: %s', product_id,
+                        ingester.metrics)
@@ -1,6 +1,7 @@
 import sys
 import random
 import logging
+import time
 
 from datetime import datetime
 
@@ -8,8 +9,20 @@ from api.cbexchange import Coinbase
 from api.coinbase.exceptions import *
 from api.exchange.base import Exchange
 from api.exchange.candle import Candle
+from api.exchange.fetchplan import plan_fetch
 from api.exchange.timeslice import TimeSlice
 from api.logs.setuplogger import logger
+from data.backfill import Task
+from data.cache import CandleCache
+from data.coverage import CoverageMap
+from data.frame import CandleFrame
+from data.ingest import doc_id
+from data.merge import merge_frames
+from data.query import CandleQuery
+from data.resample import default_origin
+from data.resample import parse_granularity
+from data.resample import resample
+from data.store import CandleStore
 
 
 class MarketData():
@@ -19,10 +32,21 @@ class MarketData():
     ----------
     ex : Exchange
         An Exchange object that conforms to the Exchange base type.
+    store : CandleStore, optional
+        A local candle store that can be read instead of the network and
+        that `sync` writes fetched candles into.
+    cache : CandleCache, optional
+        An in-memory cache that `candles` and `fetch` answer repeated and
+        overlapping ranges from, fetching only the uncached edges.
     """
-    def __init__(self, ex: Exchange) -> None:
+    def __init__(self,
+                 ex: Exchange,
+                 store: CandleStore = None,
+                 cache: CandleCache = None) -> None:
         self.__validate(ex, Exchange)
         self._exchange = ex
+        self._store = store
+        self._cache = cache
         self._event_log = logging.getLogger('root.{}'.format(
             self.__class__.__name__))
         self._event_log.debug('Initializing...')
@@ -31,11 +55,15 @@ class MarketData():
         """Determines available and valid granularities in active exchange"""
         return self._exchange.available_granularity()
 
+    def max_candles(self) -> int:
+        """The active exchange's candle limit per request"""
+        return self._exchange.max_candles()
+
     def available_trade_pairs(self) -> list:
         """Determines which currencies are available in active exchange"""
         return self._exchange.valid_product_ids()
 
-    def candles(self, product_id, start, end, granularity):
+    def candles(self, product_id, start, end, granularity, local=False):
         """Return a pack of `Candle`'s based on numerous criteria
 
         Keyword arguments:
@@ -43,7 +71,23 @@ class MarketData():
         start -- must be a valid ISO 8601 timestamp
         end -- must be a valid ISO 8601 timestamp
         granularity -- must be a valid granularity in the current exchange
+        local -- read from the local store instead of the network. Local
+                 candles are sorted oldest first and `end` is exclusive.
+
+        With a cache, candles come newest first like the exchange's, but
+        without the candles Coinbase sometimes adds before `start`.
         '"""
+        if local:
+            return self.stored(product_id, start, end,
+                               granularity).to_dicts()
+        if self._cache is not None:
+            _granularity = int(granularity)
+            _start = self.__epoch(start)
+            _end = self.__epoch(end) // _granularity * _granularity
+            frame = self.__download(product_id, _start, _end + _granularity,
+                                    _granularity)
+            return frame[::-1].to_dicts()
+
         try:
             data = self._exchange.candles(product_id, start, end, granularity)
         except ExchangeError as err:
@@ -70,10 +114,13 @@ class MarketData():
             for _candle in _candles:
                 yield {
                     'index': {
-                        '_index': index
+                        '_index': index,
+                        '_id': doc_id(product_id, granularity,
+                                      _candle['time'])
                     },
                     'time': _candle['time'],
                     'product_id': product_id,
+                    'granularity': int(granularity),
                     'high': _candle['high'],
                     'low': _candle['low'],
                     'open': _candle['open'],
@@ -86,6 +133,27 @@ class MarketData():
                 raise InvalidArgument(msg)
             failed_attempts = failed_attempts + 1
 
+    @staticmethod
+    def es_frame_generator(index, product_id, candles, granularity):
+        """Yields the same documents as `es_candle_generator` for candles
+        that are already in memory, such as locally resampled frames.
+        """
+        for _candle in CandleFrame.coerce(candles).to_dicts():
+            yield {
+                'index': {
+                    '_index': index,
+                    '_id': doc_id(product_id, granularity, _candle['time'])
+                },
+                'time': _candle['time'],
+                'product_id': product_id,
+                'granularity': int(granularity),
+                'high': _candle['high'],
+                'low': _candle['low'],
+                'open': _candle['open'],
+                'close': _candle['close'],
+                'volume': _candle['volume']
+            }
+
     @staticmethod
     def package_candles(data):
         """Takes in raw candle data and returns a list of Candle objects"""
@@ -95,23 +163,131 @@ class MarketData():
             box.append(_candle)
         return box
 
-    def slices(self, product_id: str, start: datetime, end: datetime,
-               granularity: int) -> list:
-        """Returns a list of time sliced candle data based on time range and granularity"""
-        time_slice = TimeSlice.time_slice(start,
-                                          end,
-                                          granularity,
-                                          iso8601=True)
-        slices = []
+    def stored(self, product_id, start, end, granularity) -> CandleFrame:
+        """Returns candles from the local store as a zero-copy CandleFrame
+
+        Keyword arguments:
+        product_id -- a product_id held in the local store
+        start -- datetime, ISO 8601 timestamp or seconds since epoch
+        end -- datetime, ISO 8601 timestamp or seconds since epoch (exclusive)
+        granularity -- a granularity held in the local store
+        """
+        if self._store is None:
+            raise InvalidArgument('MarketData was created without a store')
+        return self._store.range(product_id, granularity,
+                                 self.__epoch(start), self.__epoch(end))
+
+    def query(self, block_size=1024) -> CandleQuery:
+        """Returns a CandleQuery over the local store for range,
+        aggregation, last-N and aligned queries without the network
+        """
+        if self._store is None:
+            raise InvalidArgument('MarketData was created without a store')
+        return CandleQuery(self._store, block_size)
+
+    def plan(self, resolution, start, end, latency=0.0, workers=1) -> list:
+        """Plans the cheapest way to get candles at `resolution` without
+        sending a request. See `api.exchange.fetchplan.plan_fetch`.
+
+        Keyword arguments:
+        resolution -- seconds or a string such as '1h' or '4h'
+        start -- datetime, ISO 8601 timestamp or seconds since epoch
+        end -- datetime, ISO 8601 timestamp or seconds since epoch
+        latency -- average seconds per request, for the time estimate
+        workers -- requests in flight at once, for the time estimate
+
+        Returns:
+        [FetchPlan, ...] cheapest first
+        """
+        limiter = getattr(self._exchange, 'rate_limiter', None)
+        rate, burst = (limiter.rate, limiter.burst) if limiter else (3, 0)
+        target = parse_granularity(resolution)
+        try:
+            return plan_fetch(target, self.__epoch(start), self.__epoch(end),
+                              self.available_granularity(),
+                              self.max_candles(), rate, burst, latency,
+                              workers, default_origin(target))
+        except ValueError as err:
+            raise InvalidArgument(str(err))
+
+    def fetch(self, product_id, start, end, resolution) -> CandleFrame:
+        """Returns candles at any resolution using the cheapest `plan`.
+
+        The chosen exchange granularity is downloaded window by window and,
+        if it differs from `resolution`, resampled locally.
+        """
+        fetch_plan = self.plan(resolution, start, end)[0]
+        self._event_log.debug('%s: %s', product_id, fetch_plan)
+        frame = self.__download(product_id, fetch_plan.start, fetch_plan.end,
+                                fetch_plan.granularity)
+        if fetch_plan.resample:
+            # Buckets not fully inside the downloaded range are dropped
+            frame = resample(frame,
+                             fetch_plan.target,
+                             fetch_plan.granularity,
+                             start=fetch_plan.start,
+                             end=fetch_plan.end)
+        return frame
+
+    def slices(self,
+               product_id: str,
+               start: datetime,
+               end: datetime,
+               granularity: int,
+               checkpoint=None) -> list:
+        """Returns a list of time sliced candle data based on time range and
+        granularity
+        """
+        return list(
+            self.iter_slices(product_id, start, end, granularity,
+                             checkpoint))
+
+    def frame(self, product_id, start, end, granularity,
+              checkpoint=None) -> CandleFrame:
+        """Returns `slices` as one ascending, de-duplicated CandleFrame
+        clipped to [start, end). See `data.merge.merge_frames`.
+        """
+        return merge_frames(
+            self.iter_slices(product_id, start, end, granularity,
+                             checkpoint), self.__epoch(start),
+            self.__epoch(end))
+
+    def iter_slices(self,
+                    product_id: str,
+                    start: datetime,
+                    end: datetime,
+                    granularity: int,
+                    checkpoint=None):
+        """Yields time sliced candle data as each window is fetched.
+
+        This is the streaming form of `slices`; consumers such as file
+        exporters can write every window before the next one is requested.
+        Windows are generated lazily by `TimeSlice.iter_slices`, aligned to
+        granularity boundaries and sized by the exchange's `max_candles`.
+
+        If a `Checkpoint` is given, windows it has already finished are
+        skipped, and a window is journaled as done once the consumer asks
+        for the next one, i.e. after it has been processed. Failed windows
+        are journaled before the error is raised.
+        """
+        time_slice = TimeSlice.iter_slices(start, end, granularity,
+                                           max_candles=self.max_candles())
         slice_count = 0
         failed_attempts = 0
 
         for _start, _end in time_slice:
             slice_count = slice_count + 1
+            task = Task(product_id, int(granularity), self.__epoch(_start),
+                        self.__epoch(_end) + int(granularity))
+            if checkpoint is not None and checkpoint.is_done(task):
+                continue
 
             try:
-                _candles = self.candles(product_id, _start, _end, granularity)
+                _candles = self.candles(product_id, _start.isoformat(),
+                                        _end.isoformat(), granularity)
             except ExchangeError as err:
+                if checkpoint is not None:
+                    checkpoint.mark_failed(task, err)
                 raise err
 
             success = len(_candles) > 0
@@ -119,19 +295,161 @@ class MarketData():
                 'Candles pulled successfully: {}'.format(success))
 
             if success:
-                slices.append(_candles)
                 s = 'Candles pulled: %i\nSample candle: %s'
                 self._event_log.debug(s, len(_candles), _candles[0])
-            else:
+                yield _candles
+            if checkpoint is not None:
+                checkpoint.mark_done(task, len(_candles))
+            if not success:
                 if failed_attempts > 2:
-                    return slices
+                    return
                 failed_attempts = failed_attempts + 1
 
+    def iter_raw_slices(self, product_id, start, end, granularity):
+        """Yields `(Task, bytes)` with the undecoded response of every
+        request window, for decoding in a `data.transform.TransformPool`.
+
+        The exchange's `candles` must accept `raw=True`, as
+        `Coinbase.candles` does. Task ends are exclusive; the response may
+        still contain candles outside of them.
+        """
+        granularity = int(granularity)
+        for first, last in TimeSlice.epoch_slices(
+                self.__epoch(start), self.__epoch(end), granularity,
+                self.max_candles()).tolist():
+            task = Task(product_id, granularity, first, last + granularity)
+            try:
+                payload = self._exchange.candles(product_id,
+                                                 TimeSlice.format_iso(first),
+                                                 TimeSlice.format_iso(last),
+                                                 granularity,
+                                                 raw=True)
+            except ExchangeError as err:
+                self._event_log.exception(err)
+                raise err
+            yield task, payload
+
+    def sync(self, product_id: str, start: datetime, end: datetime,
+             granularity: int, coverage: CoverageMap, times=None) -> list:
+        """Incrementally fetches candle data, skipping ranges already covered.
+
+        Only the sub-ranges of [start, end) that are missing from `coverage`
+        are requested. If `times` is given, holes inside the stored data are
+        requested again as well. Every window that is fetched successfully
+        is recorded in `coverage`, which is saved after each window, so an
+        interrupted sync resumes at the first window it had not finished.
+
+        Unlike `slices`, empty windows do not stop the sync; they are simply
+        recorded as covered. Buckets without a candle become holes, and a
+        hole that is empty again when re-requested is confirmed empty and
+        not requested again. Buckets that have not closed yet are skipped.
+        If MarketData has a store, fetched candles are written to it and its
+        candle times are used to find holes.
+
+        Keyword arguments:
+        product_id -- must be a valid product_id in the current exchange
+        start -- a datetime.datetime object (naive datetimes are UTC)
+        end -- a datetime.datetime object (naive datetimes are UTC)
+        granularity -- must be a valid granularity in the current exchange
+        coverage -- a CoverageMap holding the ranges fetched so far
+        times -- optional sorted bucket start times of the stored candles
+                 (defaults to the times held in the store, if any)
+
+        Returns:
+        a list of candle slices, like `slices`
+        """
+        granularity = int(granularity)
+        window = granularity * self.max_candles()
+        if times is None and self._store is not None:
+            times = self._store.times(product_id, granularity)
+        _start = self.__epoch(start)
+        _start = _start - _start % granularity
+        _end = self.__epoch(end)
+        _end = min(_end, int(time.time()) // granularity * granularity)
+
+        ranges = coverage.missing(product_id, granularity, _start, _end)
+        if times is not None:
+            holes = coverage.holes(product_id, granularity, times, _start,
+                                   _end)
+            ranges = sorted(ranges + holes)
+        self._event_log.debug('%s @ %s: %i ranges to sync', product_id,
+                              granularity, len(ranges))
+
+        slices = []
+        for r_start, r_end in ranges:
+            for w_start in range(r_start, r_end, window):
+                w_end = min(w_start + window, r_end)
+                frame = self.window(product_id, w_start, w_end,
+                                    granularity)
+                if len(frame) and self._store is not None:
+                    self._store.write(product_id, granularity, frame)
+                coverage.record(product_id, granularity, w_start, w_end,
+                                frame.time.tolist())
+                coverage.save()
+                if len(frame):
+                    slices.append(frame.to_dicts())
+
         return slices
 
+    def window(self, product_id, start: int, end: int,
+               granularity: int) -> CandleFrame:
+        """Fetches a single request window as a sorted CandleFrame.
+
+        Candles outside of [start, end) (Coinbase may return buckets before
+        `start`, and includes the bucket at `end`) are dropped, so adjacent
+        windows never share a candle.
+
+        Keyword arguments:
+        product_id -- must be a valid product_id in the current exchange
+        start -- seconds since epoch
+        end -- seconds since epoch (exclusive)
+        granularity -- must be a valid granularity in the current exchange
+        """
+        try:
+            data = self._exchange.candles(product_id,
+                                          TimeSlice.format_iso(start),
+                                          TimeSlice.format_iso(end),
+                                          granularity)
+        except ExchangeError as err:
+            self._event_log.exception(err)
+            raise err
+        frame = CandleFrame.from_rows(data)
+        return frame.sorted().between(start, end)
+
+    def cache_info(self) -> dict:
+        """Hit, miss and eviction counters of the cache, if there is one"""
+        return self._cache.stats() if self._cache is not None else {}
+
+    def __download(self, product_id, start, end, granularity) -> CandleFrame:
+        """Fetches [start, end) window by window through the cache"""
+        start = start - start % granularity
+        end = -(-end // granularity) * granularity
+        if self._cache is not None:
+            return self._cache.get(
+                product_id, granularity, start, end,
+                lambda s, e: self.__fetch_range(product_id, s, e, granularity))
+        return self.__fetch_range(product_id, start, end, granularity)
+
+    def __fetch_range(self, product_id, start, end, granularity):
+        frames = []
+        for first, last in TimeSlice.epoch_slices(
+                start, end, granularity, self.max_candles()).tolist():
+            frames.append(
+                self.window(product_id, first, last + granularity,
+                            granularity))
+        return merge_frames(frames)
+
     def ticker(self, product_id):
         return self._exchange.ticker(product_id)
 
+    @staticmethod
+    def __epoch(value) -> int:
+        """Converts a datetime, ISO 8601 string or number into integer
+        seconds since epoch. Naive values are treated as UTC, which is how
+        Coinbase reads them.
+        """
+        return TimeSlice.to_epoch(value)
+
     @staticmethod
     def __validate(type1, type2):
         """Raises ExchangeError if the types are not equivalent"""
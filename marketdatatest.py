@@ -0,0 +1,38 @@
+import unittest
+
+from api.cbpaper import PaperCoinbase
+from api.coinbase.constants import CBConst
+from data.resample import MONDAY
+from marketdata import MarketData
+
+DAY = 86400
+WEEK = 7 * DAY
+
+
+class TestMarketData(unittest.TestCase):
+    def setUp(self):
+        self.ex = PaperCoinbase()
+        # One trade of size 1 at noon of every day for eight weeks
+        for day in range(56):
+            self.ex.feed({
+                'type': 'match',
+                'product_id': 'BTC-USD',
+                'price': str(100 + day),
+                'size': '1',
+                'side': CBConst.sell,
+                'time': day * DAY + DAY / 2
+            })
+        self.md = MarketData(self.ex)
+
+    def test_weekly_fetch_starts_on_monday(self):
+        frame = self.md.fetch('BTC-USD', 10 * DAY, 50 * DAY, '1w')
+        self.assertEqual(len(frame), 7)
+        self.assertEqual(((frame.time - MONDAY) % WEEK).tolist(),
+                         [0] * len(frame))
+        # Every week is whole: seven daily candles
+        self.assertEqual(frame.volume.tolist(), [7.0] * len(frame))
+        self.assertEqual(int(frame.time[0]), MONDAY)
+
+
+if __name__ == '__main__':
+    unittest.main()